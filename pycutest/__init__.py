@@ -4,8 +4,11 @@ __version__ = '1.8.1'
 # Define submodules to expose on wildcard imports
 __all__ = []
 
-from .build_interface import import_problem, clear_cache, all_cached_problems
-__all__ += ['import_problem', 'clear_cache', 'all_cached_problems']
+from .build_interface import import_problem, build_problems, clear_cache, all_cached_problems
+__all__ += ['import_problem', 'build_problems', 'clear_cache', 'all_cached_problems']
+
+from .cache_manager import cache_stats, prune_cache, compact_cache, export_cache, import_cache
+__all__ += ['cache_stats', 'prune_cache', 'compact_cache', 'export_cache', 'import_cache']
 
 from .sifdecode_extras import print_available_sif_params, problem_properties, find_problems
 __all__ += ['print_available_sif_params', 'problem_properties', 'find_problems']
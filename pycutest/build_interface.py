@@ -3,22 +3,59 @@
 """
 Main routines for building and managing interfaces
 """
-import os, shutil, sys
+import os, re, shutil
 import subprocess
 import importlib
+import importlib.machinery
+import importlib.util
+import itertools
+import tempfile
+import types
+import contextlib
+import fcntl
+import threading
+import hashlib
+import json
+import tarfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from glob import glob
 
 from .system_paths import get_cache_path, get_sifdecoder_path, get_mastsif_path
-from .c_interface import itf_c_source
-from .install_scripts import get_setup_script
+from .install_scripts import get_fortran_flags, get_temp_suffix, get_core_key, get_toolchain_info, get_interface_module_name, \
+    compile_core_object, link_interface_module
 from .python_interface import get_init_script
 from .problem_class import CUTEstProblem
 
-__all__ = ['import_problem', 'clear_cache', 'all_cached_problems']
+__all__ = ['import_problem', 'build_problems', 'clear_cache', 'all_cached_problems']
 
 # The cache is treated as its own Python module:
 CACHE_SUBFOLDER = 'pycutest_cache_holder'
 
+# Precompiled C interface shared by all problems (inside CACHE_SUBFOLDER):
+CORE_SUBFOLDER = '_pycutest_core'
+
+# Every cache entry records what it was built from in this file:
+MANIFEST_FILE = 'manifest.json'
+
+# ... and the time it was last imported as the modification time of this file:
+ACCESS_FILE = '.last_access'
+
+# Compacted entries optionally keep their Fortran sources in this archive:
+SOURCES_ARCHIVE = 'sources.tar.gz'
+
+# SIF file hashes, recomputed only if the file changes (see get_sif_hash)
+_sifHashes = {}
+
+# Advisory file locks only exclude other processes reliably, so threads of one process
+# building the same entry are serialised with these locks (one per cache entry folder)
+_threadLocks = {}
+_threadLocksLock = threading.Lock()
+
+# Private copies of interface modules are never unloaded, so terminated copies are kept
+# in a pool (one per problem module) and set up again for later independent instances
+_privateModulesLock = threading.Lock()
+
 def params_to_string(params):
     # Convert a dictionary of SIF parameters to a sensible string representation (used for folder names)
     keys = sorted(list(params.keys()))
@@ -34,6 +71,21 @@ def params_to_string(params):
     return param_str
 
 
+def options_to_string(sifOptions=None, efirst=False, lfirst=False, nvfirst=False):
+    # Short hash of the build options other than SIF parameters (used for folder names), '' for the default options
+    if not sifOptions and not (efirst or lfirst or nvfirst):
+        return ''
+    options = [[str(opt) for opt in sifOptions or []], bool(efirst), bool(lfirst), bool(nvfirst)]
+    return hashlib.sha256(json.dumps(options).encode()).hexdigest()[:8]
+
+
+def get_cache_entry_name(destination, sifOptions=None, efirst=False, lfirst=False, nvfirst=False):
+    # Name of a problem in the cache (without SIF parameters), so that problems built with different
+    # sifOptions or ordering flags are kept in separate folders and imported as separate modules
+    options_str = options_to_string(sifOptions, efirst, lfirst, nvfirst)
+    return '%s__%s' % (destination, options_str) if options_str else destination
+
+
 def get_problem_directory(problemName, sifParams=None, saved_with_param_name=True):
     # Get the folder where a problem is/will be saved
     cache_path = get_cache_path()
@@ -43,82 +95,265 @@ def get_problem_directory(problemName, sifParams=None, saved_with_param_name=Tru
         return os.path.join(cache_path, CACHE_SUBFOLDER, problemName)
 
 
-def is_cached(cachedName, sifParams=None):
+def get_core_directory():
+    # Get the folder where the precompiled C interface for the current toolchain is/will be saved
+    return os.path.join(get_cache_path(), CACHE_SUBFOLDER, CORE_SUBFOLDER, get_core_key())
+
+
+def get_sif_hash(sifFile):
+    # Hash of a SIF file (recomputed only if its size or modification time changes), or None if it cannot be read
+    try:
+        st = os.stat(sifFile)
+        stamp = (st.st_size, st.st_mtime_ns)
+        if _sifHashes.get(sifFile, (None, None))[0] != stamp:
+            with open(sifFile, 'rb') as f:
+                _sifHashes[sifFile] = (stamp, hashlib.sha256(f.read()).hexdigest())
+        return _sifHashes[sifFile][1]
+    except OSError:
+        return None  # sifdecode will report the missing file
+
+
+def get_cache_manifest(problemName, sifParams=None, sifOptions=None, efirst=False, lfirst=False, nvfirst=False):
+    """
+    Describe everything the build of a problem interface depends on and derive its cache key.
+    The key is a hash of the SIF file contents, the SIF parameters and options, the ordering flags
+    and the toolchain (compilers, flags, CUTEst library), so any change to these gives a different key.
+    Returns the manifest as a dictionary, with the key stored under ``'key'``.
+
+    Keyword arguments:
+
+    * *problemName* -- CUTEst problem name
+    * *sifParams* -- parameters passed to sifdecode
+    * *sifOptions* -- additional options passed to sifdecode
+    * *efirst* -- order equation constraints first
+    * *lfirst* -- order linear constraints first
+    * *nvfirst* -- order nonlinear variables before linear variables
+    """
+    from pycutest import __version__
+
+    sifFile = os.path.join(get_mastsif_path(), problemName + '.SIF')
+    sifHash = get_sif_hash(sifFile)
+
+    manifest = {
+        'problemName': problemName,
+        'sifHash': sifHash,
+        # Parameters are keyed exactly as sifdecode receives them
+        'sifParams': None if sifParams is None else dict((str(k), str(v)) for (k, v) in sifParams.items()),
+        'sifOptions': None if sifOptions is None else [str(opt) for opt in sifOptions],
+        'efirst': bool(efirst),
+        'lfirst': bool(lfirst),
+        'nvfirst': bool(nvfirst),
+        'toolchain': get_toolchain_info(),
+        'initScriptHash': hashlib.sha256(get_init_script(problemName, efirst, lfirst, nvfirst, sifParams, sifOptions).encode()).hexdigest(),
+        'pycutestVersion': __version__,
+    }
+    manifest['key'] = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+    # Informative only, not part of the key
+    manifest['sifFile'] = sifFile
+    return manifest
+
+
+def read_manifest(problemDir):
+    # Manifest of a cache entry as a dictionary, or None if it is missing or unreadable
+    try:
+        with open(os.path.join(problemDir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(problemDir, manifest):
+    # Written last, after a successful build, so an entry without a manifest is never considered up to date
+    manifest = dict(manifest, created=time.time())
+    tmpFile = os.path.join(problemDir, MANIFEST_FILE + get_temp_suffix())
+    with open(tmpFile, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmpFile, os.path.join(problemDir, MANIFEST_FILE))
+
+
+def touch_cache_entry(problemDir):
+    # Record that a cache entry has just been used (for least recently used eviction, see prune_cache)
+    try:
+        with open(os.path.join(problemDir, ACCESS_FILE), 'a'):
+            pass
+        os.utime(os.path.join(problemDir, ACCESS_FILE))
+    except OSError:
+        pass  # e.g. read-only cache, not worth failing an import for
+
+
+def is_cached(cachedName, sifParams=None, cacheKey=None):
     """
     Return ``True`` if a problem is in cache.
+    If *cacheKey* is given, the entry must also have been built with this key
+    (see :func:`get_cache_manifest`), otherwise it is considered stale.
 
     Keyword arguments:
 
     * *cachedName* -- cache entry name
+    * *sifParams* -- sif parameters used for compilation
+    * *cacheKey* -- required cache key (default ``None``, i.e. any entry will do)
     """
     problemDir = get_problem_directory(cachedName, sifParams=sifParams)
-    return os.path.isdir(problemDir)
+    if not os.path.isdir(problemDir):
+        return False
+    if cacheKey is None:
+        return True
+    manifest = read_manifest(problemDir)
+    return manifest is not None and manifest.get('key') == cacheKey
+
+
+@contextlib.contextmanager
+def cache_lock(problemDir):
+    """
+    Context manager holding an exclusive lock on a cache entry, so that it is built, replaced
+    or removed by one process (and thread) at a time. Other users of the same entry wait.
+    The lock is an advisory lock (:func:`fcntl.flock`) on a hidden file next to the entry's folder.
+    The file is removed when the lock is released, so no lock files are left in the cache.
+    Locks must not be nested.
+
+    Keyword arguments:
+
+    * *problemDir* -- folder of the cache entry
+    """
+    with _threadLocksLock:
+        threadLock = _threadLocks.setdefault(problemDir, threading.Lock())
+    with threadLock:
+        lockFile = os.path.join(os.path.dirname(problemDir), '.%s.lock' % os.path.basename(problemDir))
+        while True:
+            f = open(lockFile, 'a')
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            # The lock is only valid if its previous holder has not removed the file in the meantime
+            try:
+                st = os.stat(lockFile)
+                fst = os.fstat(f.fileno())
+                if (st.st_dev, st.st_ino) == (fst.st_dev, fst.st_ino):
+                    break
+            except FileNotFoundError:
+                pass
+            f.close()  # releases the lock on the removed file, try again with a new one
+        try:
+            yield
+        finally:
+            # Remove the file while still holding the lock, waiting users then lock a new file
+            try:
+                os.remove(lockFile)
+            except OSError:
+                pass
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            f.close()
 
 
 def clear_cache(problemName, sifParams=None):
     """
-    Deletes a saved problem.
+    Deletes a saved problem (built with any sifOptions and ordering flags).
 
     :param problemName: problem name
     :param sifParams: sif parameters used for compilation
     """
-    if not is_cached(problemName, sifParams=sifParams):
-        return  # nothing to do
-
     problemDir = get_problem_directory(problemName, sifParams=sifParams)
-    # print('Problem dir = %s' % problemDir)
-
-    # See if a directory with problem's name exists
-    if os.path.isdir(problemDir):
-        # It exists, delete it.
-        shutil.rmtree(problemDir, True)
-    elif os.path.isfile(problemDir):
-        # It is a file, delete it.
-        os.remove(problemDir)
-
-
-def prepare_cache(cachedName, sifParams=None):
+    # Folders of the same problem built with other options, see get_cache_entry_name
+    variant = re.compile('^%s__[0-9a-f]{8}%s$' % (re.escape(problemName), re.escape(os.path.basename(problemDir)[len(problemName):])))
+    problemDirs = [problemDir] + [os.path.join(os.path.dirname(problemDir), dir) for dir in cache_entry_names() if variant.match(dir)]
+    problemDirs = [problemDir for problemDir in problemDirs if os.path.exists(problemDir)]
+
+    for problemDir in problemDirs:
+        with cache_lock(problemDir):
+            # See if a directory with problem's name exists
+            if os.path.isdir(problemDir):
+                # It exists, delete it.
+                shutil.rmtree(problemDir, True)
+            elif os.path.isfile(problemDir):
+                # It is a file, delete it.
+                os.remove(problemDir)
+
+
+def prepare_cache_holder():
     """
-    Prepares a cache entry.
-    If an entry already exists it is deleted first.
-
-    Keyword arguments:
-
-    * *cachedName* -- cache entry name
+    Prepares the folder holding all cache entries (a Python package).
     """
 
     # The directory with test function entries
     pycutestDir = os.path.join(get_cache_path(), CACHE_SUBFOLDER)
 
-    # The problem's cache entry
-    problemDir = get_problem_directory(cachedName, sifParams=sifParams)
-
     # See if a folder named pycutest exists in the cache path.
     if not os.path.isdir(pycutestDir):
         # Create it. If this fails, give up. The user should delete manualy the
         # offending file which prevents the creation of a directory.
-        os.mkdir(pycutestDir)
+        os.makedirs(pycutestDir, exist_ok=True)
 
     # See in pycutestDir if there is an __init__.py file.
     initfile=os.path.join(pycutestDir, '__init__.py')
     if not os.path.isfile(initfile):
-        # Create it
-        f=open(initfile, 'w+')
+        # Create it (other processes may be doing the same, so never show them a partial file)
+        tmpFile = initfile + get_temp_suffix()
+        f=open(tmpFile, 'w+')
         f.write("#PyCUTEst cache initialization file\n")
         f.close()
+        os.replace(tmpFile, initfile)
+    return
 
-    # Remove old entry
-    clear_cache(cachedName)
 
-    # Create folder with problem's name
-    os.mkdir(problemDir)
-    return
+def get_build_directory(problemDir):
+    # Temporary folder in which a cache entry is built before it is moved into place
+    return os.path.join(os.path.dirname(problemDir), '.%s%s' % (os.path.basename(problemDir), get_temp_suffix()))
 
 
-def decode_and_compile_problem(problemName, destination=None, sifParams=None, sifOptions=None, quiet=True):
+def prepare_cache(cachedName, sifParams=None):
+    """
+    Prepares an empty temporary folder for building a cache entry and returns its path.
+    The entry itself is only replaced once the build is complete (see :func:`install_cache_entry`).
+    Must be called while holding the entry's :func:`cache_lock`.
+
+    Keyword arguments:
+
+    * *cachedName* -- cache entry name
+    * *sifParams* -- sif parameters used for compilation
+    """
+
+    # The problem's cache entry
+    problemDir = get_problem_directory(cachedName, sifParams=sifParams)
+
+    # Make sure the folder holding all cache entries exists
+    prepare_cache_holder()
+
+    # Remove leftovers of interrupted builds of this entry (nobody else can be building it now)
+    prefix = '.%s.' % os.path.basename(problemDir)
+    for name in os.listdir(os.path.dirname(problemDir)):
+        if name.startswith(prefix) and name.endswith('.tmp'):
+            shutil.rmtree(os.path.join(os.path.dirname(problemDir), name), True)
+
+    # Create the build folder
+    buildDir = get_build_directory(problemDir)
+    os.mkdir(buildDir)
+    return buildDir
+
+
+def install_cache_entry(buildDir, problemDir):
+    """
+    Moves a completely built cache entry into place, replacing any previous entry.
+    Must be called while holding the entry's :func:`cache_lock`.
+
+    Keyword arguments:
+
+    * *buildDir* -- folder the entry was built in
+    * *problemDir* -- folder of the cache entry
+    """
+    if os.path.isdir(problemDir):
+        # A folder cannot be renamed over a non-empty folder, so move the old entry out of the way first
+        oldDir = buildDir + '.old.tmp'
+        os.rename(problemDir, oldDir)
+        os.rename(buildDir, problemDir)
+        shutil.rmtree(oldDir, True)
+    else:
+        os.rename(buildDir, problemDir)
+
+
+def decode_and_compile_problem(problemName, destination=None, sifParams=None, sifOptions=None, quiet=True, jobs=None,
+                               buildDir=None):
     """
     Call sifdecode on given problem and compile the resulting .f files.
-    Use gfortran with ``-fPIC`` and ``-O2`` options for compiling.
+    Use gfortran with :data:`FORTRAN_FLAGS` (``-fPIC -O2``, and ``-fdefault-integer-8`` for 64-bit integers) for compiling,
+    running up to *jobs* compilations at once.
     Collect the resulting object file names and return them.
     This function is OS dependent. Currently works only for Linux and MacOS.
 
@@ -133,6 +368,8 @@ def decode_and_compile_problem(problemName, destination=None, sifParams=None, si
       ``-param key=str(value)`` to the sifdecode's command line options.
     * *sifOptions* -- additional options passed to sifdecode given in the form of a list of strings.
     * *quiet* -- supress output (default ``True``)
+    * *jobs* -- maximum number of concurrent gfortran calls (default ``None``, i.e. the number of processors)
+    * *buildDir* -- folder to build in (default ``None``, i.e. the problem's cache entry)
 
     *destination* must not contain dots because it is a part of a Python module name.
     """
@@ -141,15 +378,8 @@ def decode_and_compile_problem(problemName, destination=None, sifParams=None, si
     if destination is None:
         destination=problemName
 
-    # The problem's cache entry
-    problemDir = get_problem_directory(destination, sifParams=sifParams)
-
-    # Remember current work directory and go to cache
-    try:
-        fromDir = os.getcwd()
-    except FileNotFoundError:
-        fromDir = None
-    os.chdir(problemDir)
+    # The problem's cache entry (or the temporary folder it is built in)
+    problemDir = buildDir if buildDir is not None else get_problem_directory(destination, sifParams=sifParams)
 
     # Additional args
     args=[]
@@ -158,8 +388,6 @@ def decode_and_compile_problem(problemName, destination=None, sifParams=None, si
     if sifParams is not None:
         for (key, value) in sifParams.items():
             if type(key) is not str:
-                if fromDir is not None:
-                    os.chdir(fromDir) # Go back to original work directory
                 raise Exception("sifParams keys must be strings")
             args+=['-param', key+"="+str(value)]
 
@@ -167,8 +395,6 @@ def decode_and_compile_problem(problemName, destination=None, sifParams=None, si
     if sifOptions is not None:
         for opt in sifOptions:
             if type(opt) is not str:
-                if fromDir is not None:
-                    os.chdir(fromDir) # Go back to original work directory
                 raise Exception("sifOptions must consist of strings")
             args+=[str(opt)]
 
@@ -178,7 +404,7 @@ def decode_and_compile_problem(problemName, destination=None, sifParams=None, si
         # Start sifdecode
         p = subprocess.Popen(
             [get_sifdecoder_path()] + args + [os.path.join(get_mastsif_path(), problemName + '.SIF')],
-            universal_newlines=True,
+            universal_newlines=True, cwd=problemDir,
             stdout=subprocess.PIPE, stderr=subprocess.STDOUT
         )
 
@@ -205,46 +431,42 @@ def decode_and_compile_problem(problemName, destination=None, sifParams=None, si
         if not spawnOK or not quiet:
             print(l)
     if not spawnOK:
-        clear_cache(problemName, sifParams=sifParams)
-        if fromDir is not None:
-            os.chdir(fromDir) # Go back to original work directory
         raise RuntimeError('SIFDECODE failed, check output printed above')
     if param_error is not None:
-        clear_cache(problemName, sifParams=sifParams)
-        if fromDir is not None:
-            os.chdir(fromDir) # Go back to original work directory
         raise RuntimeError('SIFDECODE error: %s' % param_error)
 
     # Collect all .f files
-    filelist=glob('*.f')
+    filelist=sorted([os.path.basename(f) for f in glob(os.path.join(problemDir, '*.f'))])
 
-    # Compile FORTRAN files
-    for filename in filelist:
-        cmd=['gfortran', '-fPIC', '-O2', '-c', filename]
-        if not quiet:
+    # Compile FORTRAN files (independent of each other, so several can be compiled at once)
+    fortranFlags=get_fortran_flags()
+    cmds=[['gfortran'] + fortranFlags + ['-c', filename] for filename in filelist]
+    if not quiet:
+        for cmd in cmds:
             for s in cmd:
                 print(s, end=' ')
             print()
-        if subprocess.call(cmd)!=0:
-            if fromDir is not None:
-                os.chdir(fromDir) # Go back to original work directory
+    if jobs is None:
+        jobs=os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(cmds)))) as executor:
+        retcodes=list(executor.map(lambda cmd: subprocess.call(cmd, cwd=problemDir), cmds))
+    for filename, retcode in zip(filelist, retcodes):
+        if retcode!=0:
             raise RuntimeError("gfortran call failed for "+filename)
 
     # Collect list of all object files (.o)
-    objFileList=glob('*.o')
-
-    # Go back to original work directory
-    if fromDir is not None:
-        os.chdir(fromDir)
+    objFileList=sorted([os.path.basename(f) for f in glob(os.path.join(problemDir, '*.o'))])
 
     return objFileList
 
 
 def compile_and_install_interface(problemName, destination=None, sifParams=None, sifOptions=None,
-                                efirst=False, lfirst=False, nvfirst=False, quiet=True):
+                                efirst=False, lfirst=False, nvfirst=False, quiet=True, buildDir=None):
     """
     Compiles and installs the binary interface module.
-    Uses distutils to achieve this.
+    Calls the C compiler and linker directly with the flags Python was built with.
+    The generic C part of the interface is compiled only once and shared by all problems,
+    so that only the problem's own object files need to be linked here.
     Assumes :func:`decodeAndCompile` successfully completed its task.
     This function is OS dependent. Currently works only for Linux and MacOS.
 
@@ -258,11 +480,12 @@ def compile_and_install_interface(problemName, destination=None, sifParams=None,
       are converted to strings using :func:`str` and every parameter contributes::
       ``-param key=str(value)`` to the sifdecode's command line options.
     * *sifOptions* -- additional options passed to sifdecode given in the form of a list of strings.
-    * *efirst* -- order equation constraints first (default ``True``)
-    * *lfirst* -- order linear constraints first (default ``True``)
+    * *efirst* -- order equation constraints first (default ``False``)
+    * *lfirst* -- order linear constraints first (default ``False``)
     * *nvfirst* -- order nonlinear variables before linear variables
           (default ``False``)
     * *quiet* -- supress output (default ``True``)
+    * *buildDir* -- folder to build in (default ``None``, i.e. the problem's cache entry)
 
     *destination* must not contain dots because it is a part of a Python module name.
     """
@@ -271,52 +494,161 @@ def compile_and_install_interface(problemName, destination=None, sifParams=None,
     if destination is None:
         destination=problemName
 
-    # The problem's cache entry
-    problemDir = get_problem_directory(destination, sifParams=sifParams)
+    # The problem's cache entry (or the temporary folder it is built in)
+    problemDir = buildDir if buildDir is not None else get_problem_directory(destination, sifParams=sifParams)
 
-    # Remember current work directory and go to cache
-    fromDir=os.getcwd()
-    os.chdir(problemDir)
+    # Get the precompiled C interface (compile it if this is the first problem built with this toolchain)
+    coreObject = compile_core_object(get_core_directory(), quiet=quiet)
 
-    # Prepare C source of the interface
-    # modulePath = os.path.split(__file__)[0]
-    f = open('cutestitf.c', 'w')
-    f.write(itf_c_source)
-    f.close()
+    # Link the interface module (one link step, no setup.py)
+    objFileList = [os.path.basename(f) for f in glob(os.path.join(problemDir, '*.o'))]
+    link_interface_module(problemDir, objFileList, coreObject, quiet=quiet)
 
-    # Prepare a setup script file
-    f = open('setup.py', 'w+')
-    f.write(get_setup_script())
+    # Create __init__.py
+    f=open(os.path.join(problemDir, '__init__.py'), 'w+')
+    f.write(get_init_script(problemName, efirst, lfirst, nvfirst, sifParams, sifOptions))
     f.close()
+    return
 
-    # Prepare -q option for setup.py
-    if quiet:
-        quietopt=['-q']
-    else:
-        quietopt=[]
 
-    # Call 'python setup.py build'
-    if subprocess.call([sys.executable, 'setup.py']+quietopt+['build'])!=0:
-        os.chdir(fromDir) # Go back to original work directory
-        raise RuntimeError("Failed to build the Python interface module")
+def compact_cache_entry(problemDir, archive_sources=False):
+    """
+    Removes everything from a cache entry which is not needed to import the problem
+    (Fortran sources, object files and any leftovers of older build procedures).
+    Returns the number of bytes freed.
 
-    # Call 'python setup.py build_ext --inplace'
-    if subprocess.call([sys.executable, 'setup.py']+quietopt+['build_ext', '--inplace'])!=0:
-        os.chdir(fromDir) # Go back to original work directory
-        raise RuntimeError("Failed to install the Python interface module")
+    Keyword arguments:
 
-    # Create __init__.py
-    f=open('__init__.py', 'w+')
-    f.write(get_init_script(problemName, efirst, lfirst, nvfirst, sifParams, sifOptions))
-    f.close()
+    * *problemDir* -- folder of the cache entry
+    * *archive_sources* -- keep the Fortran sources in a compressed archive (default ``False``)
+    """
+    runtimeFiles = ['__init__.py', '__pycache__', 'OUTSDIF.d', get_interface_module_name(),
+                    MANIFEST_FILE, ACCESS_FILE, SOURCES_ARCHIVE]
+
+    # Archive the sources first, so they are never lost if archiving fails
+    sources = sorted(glob(os.path.join(problemDir, '*.f')))
+    if archive_sources and len(sources) > 0:
+        archive = os.path.join(problemDir, SOURCES_ARCHIVE)
+        tmpArchive = archive + get_temp_suffix()
+        with tarfile.open(tmpArchive, 'w:gz') as tar:
+            for source in sources:
+                tar.add(source, arcname=os.path.basename(source))
+        os.replace(tmpArchive, archive)
+
+    freed = 0
+    for name in os.listdir(problemDir):
+        if name in runtimeFiles:
+            continue
+        path = os.path.join(problemDir, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            for root, dirs, files in os.walk(path):
+                freed += sum([os.lstat(os.path.join(root, f)).st_size for f in files])
+            shutil.rmtree(path, True)
+        else:
+            freed += os.lstat(path).st_size
+            os.remove(path)
+    return freed
 
-    # Go back to original work directory
-    os.chdir(fromDir)
-    return
+
+def build_problem(problemName, destination=None, sifParams=None, sifOptions=None,
+                  efirst=False, lfirst=False, nvfirst=False, quiet=True, jobs=None, compact=False, archive_sources=False):
+    """
+    Decodes and compiles a problem interface into the cache, unless an up to date entry is already cached.
+
+    Keyword arguments are the same as for :func:`import_problem`.
+    Returns ``True`` if the problem was (re)built and ``False`` if it was already cached.
+    """
+
+    # Default destination, kept apart from builds with other options
+    if destination is None:
+        destination = problemName
+    destination = get_cache_entry_name(destination, sifOptions, efirst, lfirst, nvfirst)
+
+    # Entries built from a different SIF file or with another toolchain are stale
+    manifest = get_cache_manifest(problemName, sifParams, sifOptions, efirst, lfirst, nvfirst)
+    if is_cached(destination, sifParams=sifParams, cacheKey=manifest['key']):
+        return False
+
+    # Build in a temporary folder and move it into place when complete, while holding the entry's lock.
+    # Concurrent requests for the same entry wait for the lock, and then find the entry built.
+    problemDir = get_problem_directory(destination, sifParams=sifParams)
+    prepare_cache_holder()
+    with cache_lock(problemDir):
+        if is_cached(destination, sifParams=sifParams, cacheKey=manifest['key']):
+            return False
+
+        buildDir = prepare_cache(destination, sifParams=sifParams)
+        try:
+            objList = decode_and_compile_problem(problemName, destination, sifParams, sifOptions, quiet, jobs,
+                                                 buildDir=buildDir)
+            compile_and_install_interface(problemName, destination, sifParams, sifOptions, efirst, lfirst, nvfirst, quiet,
+                                          buildDir=buildDir)
+            write_manifest(buildDir, manifest)
+            touch_cache_entry(buildDir)
+            if compact:
+                compact_cache_entry(buildDir, archive_sources=archive_sources)
+            install_cache_entry(buildDir, problemDir)
+        except:
+            shutil.rmtree(buildDir, True)
+            raise
+    return True
+
+
+def load_private_module(module):
+    """
+    Loads a private copy of a problem interface module. Each copy of the binary module has its own
+    CUTEst workspace (all global state of the C interface and the statically linked CUTEst library),
+    so several independent instances of the same problem can be used at once.
+    Returns a module-like object with the interface functions of the copy and a setup() function for it.
+    Its terminate() function returns the copy to a pool, from which it is reused by the next call.
+
+    Keyword arguments:
+
+    * *module* -- the problem's module in the cache (as imported by :func:`import_problem`)
+    """
+    # A copy which is no longer used (see terminate() below) is set up again instead of loading another one
+    with _privateModulesLock:
+        pool = module.__dict__.setdefault('_privateModules', [])
+        if pool:
+            return pool.pop()
+
+    itfFile = module._pycutestitf.__file__
+
+    # The dynamic loader only loads a shared library once per path, so load a temporary copy of it.
+    # The copy is no longer needed once it is loaded.
+    tmpDir = tempfile.mkdtemp(prefix='pycutest-')
+    try:
+        tmpFile = os.path.join(tmpDir, os.path.basename(itfFile))
+        shutil.copyfile(itfFile, tmpFile)
+        loader = importlib.machinery.ExtensionFileLoader(module._pycutestitf.__name__, tmpFile)
+        spec = importlib.util.spec_from_file_location(module._pycutestitf.__name__, tmpFile, loader=loader)
+        itf = importlib.util.module_from_spec(spec)
+        loader.exec_module(itf)
+    finally:
+        shutil.rmtree(tmpDir, True)
+
+    private = types.ModuleType(module.__name__, module.__doc__)
+    for (name, value) in vars(itf).items():
+        if not name.startswith('_'):
+            setattr(private, name, value)
+    private._pycutestitf = itf
+    private.setup = lambda: module.setup(itf)
+
+    def terminate():
+        itf.terminate()
+        with _privateModulesLock:
+            pool.append(private)
+    private.terminate = terminate
+    return private
+
+
+# Counter used to name private problem instances
+_privateInstances = itertools.count(1)
 
 
 def import_problem(problemName, destination=None, sifParams=None, sifOptions=None,
-                   efirst=False, lfirst=False, nvfirst=False, quiet=True, drop_fixed_variables=True):
+                   efirst=False, lfirst=False, nvfirst=False, quiet=True, drop_fixed_variables=True, jobs=None,
+                   compact=False, archive_sources=False, new_instance=False):
     """
     Prepares a problem interface module, imports and initializes it.
 
@@ -324,11 +656,15 @@ def import_problem(problemName, destination=None, sifParams=None, sifOptions=Non
     :param destination: the name under which the compiled problem interface is stored in the cache (default = ``problemName``)
     :param sifParams: SIF file parameters to use (as dict, keys must be strings)
     :param sifOptions: additional options passed to sifdecode given in the form of a list of strings.
-    :param efirst: order equation constraints first (default ``True``)
-    :param lfirst: order linear constraints first (default ``True``)
+    :param efirst: order equation constraints first (default ``False``)
+    :param lfirst: order linear constraints first (default ``False``)
     :param nvfirst: order nonlinear variables before linear variables (default ``False``)
     :param quiet: suppress output (default ``True``)
     :param drop_fixed_variables: in the resulting problem object, are fixed variables hidden from the user (default ``True``)
+    :param jobs: maximum number of Fortran files compiled at once when building the problem (default ``None``, i.e. the number of processors)
+    :param compact: after building the problem, remove all files not needed at runtime from its cache folder (default ``False``)
+    :param archive_sources: when compacting, keep the Fortran sources in a compressed archive ``sources.tar.gz`` (default ``False``)
+    :param new_instance: give the problem its own CUTEst workspace, independent of all other instances of the same problem, e.g. with its own evaluation counters (default ``False``, i.e. all imports of a problem share one instance). Each independent instance loads its own copy of the compiled problem, which stays in memory when the instance is deleted and is reused by the next independent instance
     :return: a reference to the Python interface class for this problem (class ``pycutest.CUTEstProblem``)
     """
 
@@ -337,20 +673,23 @@ def import_problem(problemName, destination=None, sifParams=None, sifOptions=Non
         destination = problemName
 
     # Build it
-    if not is_cached(destination, sifParams=sifParams):
-        prepare_cache(destination, sifParams=sifParams)
-        objList = decode_and_compile_problem(problemName, destination, sifParams, sifOptions, quiet)
-        compile_and_install_interface(problemName, destination, sifParams, sifOptions, efirst, lfirst, nvfirst, quiet)
+    build_problem(problemName, destination, sifParams, sifOptions, efirst, lfirst, nvfirst, quiet, jobs, compact, archive_sources)
 
+    # Problems built with other sifOptions or ordering flags are separate modules
+    destination = get_cache_entry_name(destination, sifOptions, efirst, lfirst, nvfirst)
     if sifParams is not None:
         problemDir = '%s_%s' % (destination, params_to_string(sifParams))
     else:
         problemDir = destination
+    touch_cache_entry(get_problem_directory(destination, sifParams=sifParams))
+
     # Import the module CACHE_SUBFOLDER.problemDir, and return a wrapper
     try:
-        return CUTEstProblem(importlib.import_module('%s.%s' % (CACHE_SUBFOLDER, problemDir)),
-                             problemDir,
-                             drop_fixed_variables=drop_fixed_variables)
+        module = importlib.import_module('%s.%s' % (CACHE_SUBFOLDER, problemDir))
+        if new_instance:
+            return CUTEstProblem(load_private_module(module), '%s#%d' % (problemDir, next(_privateInstances)),
+                                 drop_fixed_variables=drop_fixed_variables, shared=False)
+        return CUTEstProblem(module, problemDir, drop_fixed_variables=drop_fixed_variables)
     except ImportError as error:
         try: # check if cache folder is on python path
             importlib.import_module(CACHE_SUBFOLDER)
@@ -360,39 +699,105 @@ def import_problem(problemName, destination=None, sifParams=None, sifOptions=Non
             raise error
 
 
-def all_cached_problems():
+def build_problems(problems, workers=None, sifOptions=None, efirst=False, lfirst=False, nvfirst=False, quiet=True, jobs=1,
+                   compact=False, archive_sources=False):
     """
-    Return a list of all cached problems.
+    Builds many problems in parallel, without importing them.
 
-    :return: list of (problemName, sifParams) tuples, where sifParams is a dict
+    Each problem is decoded and compiled in a separate worker process. A failed build does not
+    stop the remaining builds, and problems which are already cached are not rebuilt.
+
+    .. code-block:: python
+
+        # Build ROSENBR and two versions of ARGLALE using 4 worker processes
+        results = pycutest.build_problems(['ROSENBR', ('ARGLALE', {'N':10}), ('ARGLALE', {'N':100})], workers=4)
+        failed = [(name, sifParams) for (name, sifParams, error) in results if error is not None]
+
+    :param problems: list of problems to build, each given as a problem name or a (problemName, sifParams) tuple
+    :param workers: number of worker processes (default = ``None``, i.e. the number of processors)
+    :param sifOptions: additional options passed to sifdecode for every problem, given in the form of a list of strings.
+    :param efirst: order equation constraints first (default ``False``)
+    :param lfirst: order linear constraints first (default ``False``)
+    :param nvfirst: order nonlinear variables before linear variables (default ``False``)
+    :param quiet: suppress output (default ``True``)
+    :param jobs: maximum number of Fortran files compiled at once by each worker (default ``1``)
+    :param compact: after building each problem, remove all files not needed at runtime from its cache folder (default ``False``)
+    :param archive_sources: when compacting, keep the Fortran sources in a compressed archive ``sources.tar.gz`` (default ``False``)
+    :return: list of (problemName, sifParams, error) tuples in the same order as problems, where error is ``None`` if the build succeeded and an error message otherwise
     """
-    all_probs = []
+
+    # Normalise problem list to (problemName, sifParams) tuples
+    todo = []
+    for problem in problems:
+        if isinstance(problem, str):
+            todo.append((problem, None))
+        else:
+            problemName, sifParams = problem
+            todo.append((problemName, sifParams))
+
+    # Create the cache holder up front, so that workers do not race to create it
+    prepare_cache_holder()
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(build_problem, problemName, None, sifParams, sifOptions, efirst, lfirst, nvfirst, quiet, jobs,
+                                   compact, archive_sources)
+                   for (problemName, sifParams) in todo]
+        for (problemName, sifParams), future in zip(todo, futures):
+            try:
+                future.result()
+                error = None
+            except Exception as e:
+                error = '%s: %s' % (type(e).__name__, str(e))
+            results.append((problemName, sifParams, error))
+    return results
+
+
+def cache_entry_names():
+    # Names of all problem folders in the cache (skips __pycache__, the precompiled C interface and unfinished builds)
     problem_loc = os.path.join(get_cache_path(), CACHE_SUBFOLDER)
-    for dir in [name for name in os.listdir(problem_loc) if os.path.isdir(os.path.join(problem_loc, name))]:
-        if '__pycache__' in dir:
-            continue  # skip
-        # Parse folder name (assumes no underscore in problem name)
-        if '_' in dir:
-            vals = dir.split('_')
-            problemName = vals[0]
-            sifParams = {}
-            for i in range(len(vals)):
-                found_value = False
-                for split_idx in range(len(vals)):
-                    if found_value:
-                        break  # end this search
-                    var = vals[i][:split_idx]
-                    val = vals[i][split_idx:]
+    if not os.path.isdir(problem_loc):
+        return []
+    return [name for name in sorted(os.listdir(problem_loc))
+            if os.path.isdir(os.path.join(problem_loc, name)) and not name.startswith('_') and not name.startswith('.')]
+
+
+def parse_cache_entry_name(dir):
+    # Recover (problemName, sifParams) from a problem folder name, see get_problem_directory
+    # Drop the hash of the build options, see get_cache_entry_name
+    if '__' in dir:
+        (problemName, options) = dir.split('__', 1)
+        dir = problemName + options[8:]
+    # Parse folder name (assumes no underscore in problem name)
+    if '_' in dir:
+        vals = dir.split('_')
+        problemName = vals[0]
+        sifParams = {}
+        for i in range(len(vals)):
+            found_value = False
+            for split_idx in range(len(vals)):
+                if found_value:
+                    break  # end this search
+                var = vals[i][:split_idx]
+                val = vals[i][split_idx:]
+                try:
                     try:
-                        try:
-                            val = int(val)
-                        except ValueError:
-                            val = float(val)
-                        sifParams[var] = val
-                        found_value = True
+                        val = int(val)
                     except ValueError:
-                        continue  # next split_idx
-            all_probs.append((problemName, sifParams))
-        else:
-            all_probs.append((dir, None))  # no sifParams
-    return all_probs
+                        val = float(val)
+                    sifParams[var] = val
+                    found_value = True
+                except ValueError:
+                    continue  # next split_idx
+        return problemName, sifParams
+    else:
+        return dir, None  # no sifParams
+
+
+def all_cached_problems():
+    """
+    Return a list of all cached problems.
+
+    :return: list of (problemName, sifParams) tuples, where sifParams is a dict
+    """
+    return [parse_cache_entry_name(dir) for dir in cache_entry_names()]
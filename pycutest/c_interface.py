@@ -34,6 +34,17 @@ itf_c_source = r"""
 #include <numpy/arrayobject.h>
 #include <math.h>
 #include <stdio.h>
+#include <string.h>
+
+/* CUTEst integers are 64-bit if CUTEst was built with 64-bit integers (INTEGER_64, see cutest.h).
+   Integers passed to CUTEst and all index arrays (NPY_INTEGER) are of the same type. */
+#ifdef INTEGER_64
+typedef npy_int64 npy_integer;
+#define NPY_INTEGER NPY_INT64
+#else
+typedef npy_int npy_integer;
+#define NPY_INTEGER NPY_INT
+#endif
 
 
 /* Module function prototypes */
@@ -42,41 +53,72 @@ static PyObject *cutest_setup(PyObject *self, PyObject *args);
 static PyObject *cutest_varnames(PyObject *self, PyObject *args);
 static PyObject *cutest_connames(PyObject *self, PyObject *args);
 static PyObject *cutest_objcons(PyObject *self, PyObject *args);
-static PyObject *cutest_obj(PyObject *self, PyObject *args);
-static PyObject *cutest_grad(PyObject *self, PyObject *args);
-static PyObject *cutest_cons(PyObject *self, PyObject *args);
+static PyObject *cutest_objcons_batch(PyObject *self, PyObject *args);
+static PyObject *cutest_obj(PyObject *self, PyObject *args, PyObject *kwargs);
+static PyObject *cutest_obj_batch(PyObject *self, PyObject *args);
+static PyObject *cutest_grad(PyObject *self, PyObject *args, PyObject *kwargs);
+static PyObject *cutest_cons(PyObject *self, PyObject *args, PyObject *kwargs);
+static PyObject *cutest_cons_batch(PyObject *self, PyObject *args);
 static PyObject *cutest_lag(PyObject *self, PyObject *args);
 static PyObject *cutest_lagjac(PyObject *self, PyObject *args);
-static PyObject *cutest_jprod(PyObject *self, PyObject *args);
-static PyObject *cutest_hess(PyObject *self, PyObject *args);
-static PyObject *cutest_ihess(PyObject *self, PyObject *args);
-static PyObject *cutest_hprod(PyObject *self, PyObject *args);
+static PyObject *cutest_jprod(PyObject *self, PyObject *args, PyObject *kwargs);
+static PyObject *cutest_jprod_many(PyObject *self, PyObject *args);
+static PyObject *cutest_hess(PyObject *self, PyObject *args, PyObject *kwargs);
+static PyObject *cutest_ihess(PyObject *self, PyObject *args, PyObject *kwargs);
+static PyObject *cutest_hprod(PyObject *self, PyObject *args, PyObject *kwargs);
+static PyObject *cutest_hprod_many(PyObject *self, PyObject *args);
 static PyObject *cutest_gradhess(PyObject *self, PyObject *args);
 static PyObject *cutest_sobj(PyObject *self, PyObject *args);
 static PyObject *cutest_sgrad(PyObject *self, PyObject *args);
 static PyObject *cutest_scons(PyObject *self, PyObject *args);
 static PyObject *cutest_slagjac(PyObject *self, PyObject *args);
-static PyObject *cutest_sphess(PyObject *self, PyObject *args);
-static PyObject *cutest_isphess(PyObject *self, PyObject *args);
-static PyObject *cutest_gradsphess(PyObject *self, PyObject *args);
+static PyObject *cutest_sphess(PyObject *self, PyObject *args, PyObject *kwargs);
+static PyObject *cutest_isphess(PyObject *self, PyObject *args, PyObject *kwargs);
+static PyObject *cutest_gradsphess(PyObject *self, PyObject *args, PyObject *kwargs);
+static PyObject *cutest_jacobian_structure(PyObject *self, PyObject *args);
+static PyObject *cutest_hessian_structure(PyObject *self, PyObject *args);
+static PyObject *cutest_scons_values(PyObject *self, PyObject *args, PyObject *kwargs);
+static PyObject *cutest_sphess_values(PyObject *self, PyObject *args, PyObject *kwargs);
 static PyObject *cutest_report(PyObject *self, PyObject *args);
 static PyObject *cutest_terminate(PyObject *self, PyObject *args);
+static PyObject *cutest_compress(PyObject *self, PyObject *args);
 
 /* Module global variables */
 #define STR_LEN 10
-static npy_int status = 0;              /* output status */
-static npy_int CUTEst_nvar = 0;         /* number of variables */
-static npy_int CUTEst_ncon = 0;         /* number of constraints */
-static npy_int CUTEst_nnzj = 0;         /* nnz in Jacobian */
-static npy_int CUTEst_nnzh = 0;         /* nnz in upper triangular Hessian */
+#define FNAME_LEN 4096
+static npy_integer status = 0;              /* output status */
+static npy_integer CUTEst_nvar = 0;         /* number of variables */
+static npy_integer CUTEst_ncon = 0;         /* number of constraints */
+static npy_integer CUTEst_nnzj = 0;         /* nnz in Jacobian */
+static npy_integer CUTEst_nnzh = 0;         /* nnz in upper triangular Hessian */
 static char CUTEst_probName[STR_LEN+1]; /* problem name */
 static char setupCalled = 0;            /* Flag to indicate if setup was called */
 static char dataFileOpen = 0;           /* Flag to indicate if OUTSDIF is open */
 
-static npy_int funit = 42;              /* FORTRAN unit number for OUTSDIF.d */
-static npy_int iout = 6;                /* FORTRAN unit number for error output */
-static npy_int io_buffer = 11;          /* FORTRAN unit number for internal input/output */
-static char  fName[] = "OUTSDIF.d";     /* Data file name */
+static npy_integer funit = 42;              /* FORTRAN unit number for OUTSDIF.d */
+static npy_integer iout = 6;                /* FORTRAN unit number for error output */
+static npy_integer io_buffer = 11;          /* FORTRAN unit number for internal input/output */
+static char  fName[FNAME_LEN+1] = "OUTSDIF.d"; /* Data file name (full path or relative to the working directory) */
+
+/* Lock serialising the CUTEst calls of this module. Each loaded copy of the module has its own
+   CUTEst workspace and lock, so different problems (and independent instances) are evaluated
+   concurrently, while calls to the same workspace wait for each other. */
+static PyThread_type_lock cutestLock = NULL;
+
+/* Call a CUTEst tool with the GIL released (the call must not touch any Python objects). */
+#define CUTEST_CALL(...) do { \
+        Py_BEGIN_ALLOW_THREADS \
+        PyThread_acquire_lock(cutestLock, WAIT_LOCK); \
+        __VA_ARGS__; \
+        PyThread_release_lock(cutestLock); \
+        Py_END_ALLOW_THREADS \
+    } while (0)
+
+/* Scratch buffers receiving the indices CUTEst returns along with sparse values, when only the values are
+   needed (see sphess_values() and scons_values()). Allocated on first use and freed by terminate(),
+   both while holding cutestLock. */
+static npy_integer *workHi = NULL, *workHj = NULL;   /* nnzh elements (Hessian) */
+static npy_integer *workJi = NULL, *workJfi = NULL;  /* nnzj elements (Jacobian) */
 
 /* Logical constants for FORTRAN calls */
 static logical somethingFalse = FALSE_, somethingTrue = TRUE_;
@@ -86,7 +128,7 @@ static logical somethingFalse = FALSE_, somethingTrue = TRUE_;
 
 /* Open data file, return 0 on error. */
 int open_datafile(void) {
-    npy_int  ioErr;					/* Exit flag from OPEN and CLOSE */
+    npy_integer  ioErr;					/* Exit flag from OPEN and CLOSE */
 
     ioErr = 0;
     if (! dataFileOpen)
@@ -99,9 +141,23 @@ int open_datafile(void) {
     return 1;
 }
 
+/* Set data file name, return 0 on error. */
+int set_datafile(const char *name) {
+    if (strlen(name)>FNAME_LEN) {
+        PyErr_SetString(PyExc_Exception, "Data file name is too long");
+        return 0;
+    }
+    if (dataFileOpen && strcmp(name, fName)!=0) {
+        PyErr_SetString(PyExc_Exception, "Another data file is already open");
+        return 0;
+    }
+    strcpy(fName, name);
+    return 1;
+}
+
 /* Close data file, return 0 on error. */
 int close_datafile(void) {
-    npy_int ioErr;					/* Exit flag from OPEN and CLOSE */
+    npy_integer ioErr;					/* Exit flag from OPEN and CLOSE */
     ioErr = 0;
     FORTRAN_close((integer *)&funit, (integer *)&ioErr);
     if (ioErr) {
@@ -121,6 +177,85 @@ int check_setup(void) {
     return 1;
 }
 
+/* Check if X is a C contiguous 2D double array with nvar columns, return 0 if it is not. */
+int check_batch(PyArrayObject *X) {
+    if (!(PyArray_Check(X) && PyArray_TYPE(X)==NPY_DOUBLE && PyArray_NDIM(X)==2 && PyArray_DIM(X, 1)==CUTEst_nvar && PyArray_IS_C_CONTIGUOUS(X))) {
+        PyErr_SetString(PyExc_Exception, "Argument 1 must be a C contiguous 2D double array with nvar columns");
+        return 0;
+    }
+    return 1;
+}
+
+/* Check if P is a FORTRAN contiguous 2D double array with nrows rows (one vector per column),
+   return 0 if it is not. */
+int check_columns(PyArrayObject *P, npy_integer nrows, int argNum, const char *rowsName) {
+    if (!(PyArray_Check(P) && PyArray_TYPE(P)==NPY_DOUBLE && PyArray_NDIM(P)==2 && PyArray_DIM(P, 0)==nrows && PyArray_IS_F_CONTIGUOUS(P))) {
+        PyErr_Format(PyExc_Exception, "Argument %d must be a FORTRAN contiguous 2D double array with %s rows", argNum, rowsName);
+        return 0;
+    }
+    return 1;
+}
+
+/* Return the array a result is written to: out (as a new reference) if it is given, otherwise a newly
+   allocated array (a FORTRAN style array if fortran is nonzero). Return NULL on error. */
+PyArrayObject *output_array(PyObject *out, int nd, npy_intp *dims, int fortran) {
+    PyArrayObject *Mout;
+    int i;
+
+    if (out==NULL || out==Py_None) {
+        if (fortran)
+            return (PyArrayObject *)PyArray_New(&PyArray_Type, nd, dims, NPY_DOUBLE, NULL, NULL, 0, NPY_ARRAY_F_CONTIGUOUS, NULL);
+        else
+            return (PyArrayObject *)PyArray_SimpleNew(nd, dims, NPY_DOUBLE);
+    }
+
+    /* Check if out is a writeable double array of correct shape and memory layout */
+    Mout=(PyArrayObject *)out;
+    if (!(PyArray_Check(out) && PyArray_TYPE(Mout)==NPY_DOUBLE && PyArray_NDIM(Mout)==nd && PyArray_ISWRITEABLE(Mout) &&
+            (fortran ? PyArray_IS_F_CONTIGUOUS(Mout) : PyArray_IS_C_CONTIGUOUS(Mout)))) {
+        PyErr_Format(PyExc_Exception, "Output array must be a writeable %dD double array (%s contiguous)", nd, fortran ? "FORTRAN" : "C");
+        return NULL;
+    }
+    for(i=0; i<nd; i++) {
+        if (PyArray_DIM(Mout, i)!=dims[i]) {
+            PyErr_Format(PyExc_Exception, "Output array has wrong shape (dimension %d must be %zd)", i, (Py_ssize_t)dims[i]);
+            return NULL;
+        }
+    }
+    Py_INCREF(out);
+    return Mout;
+}
+
+/* Free the scratch buffers */
+void free_workspace(void) {
+    free(workHi);
+    free(workHj);
+    free(workJi);
+    free(workJfi);
+    workHi=workHj=workJi=workJfi=NULL;
+}
+
+/* Allocate a pair of scratch buffers with n elements unless already allocated, return 0 on error.
+   Called with cutestLock held and the GIL released, so it must not touch any Python objects. */
+int alloc_workspace(npy_integer **wi, npy_integer **wj, npy_integer n) {
+    size_t len;
+
+    if (*wi!=NULL && *wj!=NULL)
+        return 1;
+    len=n>0 ? (size_t)n : 1;
+    free(*wi);
+    free(*wj);
+    *wi=(npy_integer *)malloc(len*sizeof(npy_integer));
+    *wj=(npy_integer *)malloc(len*sizeof(npy_integer));
+    if (!(*wi && *wj)) {
+        free(*wi);
+        free(*wj);
+        *wi=*wj=NULL;
+        return 0;
+    }
+    return 1;
+}
+
 /* Trim trailing spaces from a string starting at index n. */
 void trim_string(char *s, int n) {
     int i;
@@ -143,108 +278,141 @@ PyObject *decRefDict(PyObject *dict) {
     return dict;
 }
 
-/* Extract sparse gradient in form of NumPy arrays */
-void extract_sparse_gradient(npy_int nnzg, npy_int *si, npy_double *sv, PyArrayObject **Mgi, PyArrayObject **Mgv) {
-    npy_double *gv;
-    npy_int *gi, i;
-    npy_intp dims[1];
+/* Shrink a 1D NumPy array to its first n elements, return 0 on error. */
+int shrink_array(PyArrayObject *M, npy_intp n) {
+    PyArray_Dims shape;
+    PyObject *res;
+
+    if (PyArray_DIM(M, 0)==n)
+        return 1;
+    shape.ptr=&n;
+    shape.len=1;
+    res=PyArray_Resize(M, &shape, 0, NPY_CORDER);
+    if (res==NULL)
+        return 0;
+    Py_DECREF(res);
+    return 1;
+}
 
-    /* Alocate and fill objective gradient data,
-       convert indices from FORTRAN to C. */
-    dims[0]=nnzg;
-    *Mgi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INT);
-    *Mgv=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
-    gi=(npy_int *)PyArray_DATA(*Mgi);
-    gv=(npy_double *)PyArray_DATA(*Mgv);
-    for(i=0;i<nnzg;i++) {
-        gi[i]=si[i]-1;
-        gv[i]=sv[i];
+/* Finish a sparse gradient written by CUTEst to NumPy arrays of length nvar:
+   convert indices from FORTRAN to C and shrink the arrays to the nnzg nonzeros.
+   Return 0 on error (the arrays are released). */
+int finish_sparse_gradient(npy_integer nnzg, PyArrayObject *Mgi, PyArrayObject *Mgv) {
+    npy_integer *gi, i;
+
+    gi=(npy_integer *)PyArray_DATA(Mgi);
+    for(i=0;i<nnzg;i++)
+        gi[i]--;
+    if (!shrink_array(Mgi, nnzg) || !shrink_array(Mgv, nnzg)) {
+        Py_DECREF(Mgi);
+        Py_DECREF(Mgv);
+        return 0;
     }
+    return 1;
 }
 
-/* Extract sparse gradient and Jacobian in form of NumPy arrays */
-void extract_sparse_gradient_jacobian(npy_int nnzjplusno, npy_int *sji, npy_int *sjfi, npy_double *sjv,
-        PyArrayObject **Mgi, PyArrayObject **Mgv, PyArrayObject **MJi, PyArrayObject **MJfi, PyArrayObject **MJv) {
+/* Finish a sparse gradient and Jacobian written by CUTEst to NumPy arrays of length nnzj+nvar:
+   move the gradient (function index 0) to new arrays, compact the Jacobian in place,
+   convert indices from FORTRAN to C and shrink the arrays.
+   Return 0 on error (all arrays are released). */
+int finish_sparse_gradient_jacobian(npy_integer nnzjplusno, PyArrayObject *MJi, PyArrayObject *MJfi, PyArrayObject *MJv,
+        PyArrayObject **Mgi, PyArrayObject **Mgv) {
     npy_double *gv, *Jv;
-    npy_int *gi, *Ji, *Jfi, nnzg, i, jg, jj;
+    npy_integer *gi, *Ji, *Jfi, nnzg, i, jg, jj;
     npy_intp dims[1];
 
+    Ji=(npy_integer *)PyArray_DATA(MJi);
+    Jfi=(npy_integer *)PyArray_DATA(MJfi);
+    Jv=(npy_double *)PyArray_DATA(MJv);
+
     /* Get number of nonzeros in gradient vector */
     nnzg=0;
     for(i=0;i<nnzjplusno;i++) {
-        if (sjfi[i]==0)
+        if (Jfi[i]==0)
             nnzg++;
     }
 
-    /* Alocate and fill objective/Lagrangian gradient data and Jacobian data,
-       convert indices from FORTRAN to C. */
     dims[0]=nnzg;
-    *Mgi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INT);
+    *Mgi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
     *Mgv=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
-    gi=(npy_int *)PyArray_DATA(*Mgi);
+    gi=(npy_integer *)PyArray_DATA(*Mgi);
     gv=(npy_double *)PyArray_DATA(*Mgv);
-    dims[0]=nnzjplusno-nnzg;
-    *MJi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INT);
-    *MJfi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INT);
-    *MJv=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
-    Ji=(npy_int *)PyArray_DATA(*MJi);
-    Jfi=(npy_int *)PyArray_DATA(*MJfi);
-    Jv=(npy_double *)PyArray_DATA(*MJv);
     jg=0;
     jj=0;
     for(i=0;i<nnzjplusno;i++) {
-        if (sjfi[i]==0) {
-            gi[jg]=sji[i]-1;
-            gv[jg]=sjv[i];
+        if (Jfi[i]==0) {
+            gi[jg]=Ji[i]-1;
+            gv[jg]=Jv[i];
             jg++;
         } else {
-            Ji[jj]=sji[i]-1;
-            Jfi[jj]=sjfi[i]-1;
-            Jv[jj]=sjv[i];
+            Ji[jj]=Ji[i]-1;
+            Jfi[jj]=Jfi[i]-1;
+            Jv[jj]=Jv[i];
             jj++;
         }
     }
+
+    if (!shrink_array(MJi, jj) || !shrink_array(MJfi, jj) || !shrink_array(MJv, jj)) {
+        Py_DECREF(*Mgi);
+        Py_DECREF(*Mgv);
+        Py_DECREF(MJi);
+        Py_DECREF(MJfi);
+        Py_DECREF(MJv);
+        return 0;
+    }
+    return 1;
 }
 
-/* Extract sparse Hessian in form of NumPy arrays
-   from sparse ijv format of Hessian's upper triangle + diagonal.
-   Add elements to lower triangle. */
-void extract_sparse_hessian(npy_int nnzho, npy_int *si, npy_int *sj, npy_double *sv,
-                    PyArrayObject **MHi, PyArrayObject **MHj, PyArrayObject **MHv) {
-    npy_int *Hi, *Hj, nnzdiag, i, j;
+/* Finish a sparse Hessian written by CUTEst to the first nnzho elements of NumPy arrays
+   (upper triangle + diagonal) and convert indices from FORTRAN to C.
+   If upper is set, move elements below the diagonal to the upper triangle. Otherwise add
+   elements to the lower triangle after the first nnzho elements (the arrays must have room
+   for 2*nnzho elements). Shrink the arrays to the number of elements.
+   Return 0 on error (the arrays are released). */
+int finish_sparse_hessian(npy_integer nnzho, int upper, PyArrayObject *MHi, PyArrayObject *MHj, PyArrayObject *MHv) {
+    npy_integer *Hi, *Hj, i, tmp;
+    npy_intp j;
     npy_double *Hv;
-    npy_intp dims[1];
 
-
-    /* Get number of nonzeros on the diagonal */
-    nnzdiag=0;
+    Hi=(npy_integer *)PyArray_DATA(MHi);
+    Hj=(npy_integer *)PyArray_DATA(MHj);
+    Hv=(npy_double *)PyArray_DATA(MHv);
+    j=nnzho;
     for(i=0;i<nnzho;i++) {
-        if (si[i]==sj[i])
-            nnzdiag++;
-    }
-
-    /* Alocate and fill objective/Lagrangian gradient data and Jacobian data,
-       convert indices from FORTRAN to C, fill lower triangle. */
-    dims[0]=2*nnzho-nnzdiag; /* Do not duplicate diagonal elements */
-    *MHi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INT);
-    *MHj=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INT);
-    *MHv=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
-    Hi=(npy_int *)PyArray_DATA(*MHi);
-    Hj=(npy_int *)PyArray_DATA(*MHj);
-    Hv=(npy_double *)PyArray_DATA(*MHv);
-    j=0;
-    for(i=0;i<nnzho;i++) {
-        Hi[j]=si[i]-1;
-        Hj[j]=sj[i]-1;
-        Hv[j]=sv[i];
-        j++;
-        if (si[i]!=sj[i]) {
-            Hi[j]=sj[i]-1;
-            Hj[j]=si[i]-1;
-            Hv[j]=sv[i];
+        Hi[i]--;
+        Hj[i]--;
+        if (upper) {
+            if (Hi[i]>Hj[i]) {
+                tmp=Hi[i];
+                Hi[i]=Hj[i];
+                Hj[i]=tmp;
+            }
+        } else if (Hi[i]!=Hj[i]) {
+            /* Do not duplicate diagonal elements */
+            Hi[j]=Hj[i];
+            Hj[j]=Hi[i];
+            Hv[j]=Hv[i];
             j++;
         }
     }
+
+    if (!shrink_array(MHi, j) || !shrink_array(MHj, j) || !shrink_array(MHv, j)) {
+        Py_DECREF(MHi);
+        Py_DECREF(MHj);
+        Py_DECREF(MHv);
+        return 0;
+    }
+    return 1;
+}
+
+/* Allocate NumPy arrays CUTEst writes a sparse Hessian to, with room for the lower triangle unless upper is set */
+void new_sparse_hessian(int upper, PyArrayObject **MHi, PyArrayObject **MHj, PyArrayObject **MHv) {
+    npy_intp dims[1];
+
+    dims[0]=upper ? CUTEst_nnzh : 2*(npy_intp)CUTEst_nnzh;
+    *MHi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+    *MHj=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+    *MHv=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
 }
 
 
@@ -253,7 +421,11 @@ void extract_sparse_hessian(npy_int nnzho, npy_int *si, npy_int *sj, npy_double
 PyDoc_STRVAR(cutest_dims_doc,
 "Returns the dimension of the problem and the number of constraints.\n"
 "\n"
-"(n, m)=dims()\n"
+"(n, m)=dims(datafile)\n"
+"\n"
+"Input\n"
+"datafile -- path of the problem data file OUTSDIF.d. If not given, OUTSDIF.d\n"
+"            is looked up in the working directory.\n"
 "\n"
 "Output\n"
 "n -- number of variables\n"
@@ -261,29 +433,38 @@ PyDoc_STRVAR(cutest_dims_doc,
 "\n"
 "This function is not supposed to be called by the user. It is called by the\n"
 "__init__.py script when the test function interface is loaded.\n"
-"If you decide to call it anyway, the working directory at the time of call\n"
-"must be the one where the file OUTSIF.d can be found.\n"
 "\n"
 "CUTEst tools used: CUTEST_cdimen\n"
 );
 
 static PyObject *cutest_dims(PyObject *self, PyObject *args) {
-    if (PyObject_Length(args)!=0)
-        PyErr_SetString(PyExc_Exception, "dims() takes no arguments");
+    char *name;
+
+    if (PyObject_Length(args)!=0 && PyObject_Length(args)!=1) {
+        PyErr_SetString(PyExc_Exception, "dims() takes 0 or 1 arguments");
+        return NULL;
+    }
+
+    if (PyObject_Length(args)==1) {
+        if (!PyArg_ParseTuple(args, "s", &name))
+            return NULL;
+        if (!set_datafile(name))
+            return NULL;
+    }
 
     if (!open_datafile())
         return NULL;
 
     CUTEST_cdimen((integer *)&status, (integer *)&funit, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon);
 
-    return Py_BuildValue("ii", CUTEst_nvar, CUTEst_ncon);
+    return Py_BuildValue("nn", (Py_ssize_t)CUTEst_nvar, (Py_ssize_t)CUTEst_ncon);
 }
 
 
 PyDoc_STRVAR(cutest_setup_doc,
 "Sets up the problem.\n"
 "\n"
-"data=setup(efirst, lfirst, nvfirst)\n"
+"data=setup(efirst, lfirst, nvfirst, datafile)\n"
 "\n"
 "Input\n"
 "efirst  -- if True, equation constraints are ordered before inequations.\n"
@@ -292,6 +473,8 @@ PyDoc_STRVAR(cutest_setup_doc,
 "           Defaults to False.\n"
 "nvfirst -- if True, nonlinear variables are ordered before linear ones.\n"
 "           Defaults to False.\n"
+"datafile -- path of the problem data file OUTSDIF.d. If not given, the file\n"
+"            given to dims() or OUTSDIF.d in the working directory is used.\n"
 "\n"
 "Setting both efirst and lfirst to True results in the following ordering:\n"
 "linear equations, followed by linear inequations, nonlinear equations,\n"
@@ -329,8 +512,6 @@ PyDoc_STRVAR(cutest_setup_doc,
 "\n"
 "This function is not supposed to be called by the user. It is called by the\n"
 "__init__.py script when the test function interface is loaded.\n"
-"If you decide to call it anyway, the working directory at the time of call\n"
-"must be the one where the file OUTSIF.d can be found.\n"
 "\n"
 "CUTEst tools used: CUTEST_cdimen, CUTEST_csetup, CUTEST_usetup, CUTEST_cvartype, CUTEST_uvartype, \n"
 "                  CUTEST_cdimsh, CUTEST_udimsh, CUTEST_cdimsj, CUTEST_probname\n"
@@ -343,20 +524,23 @@ static PyObject *cutest_setup(PyObject *self, PyObject *args) {
     PyArrayObject *Mx, *Mbl, *Mbu, *Mv=NULL, *Mcl=NULL, *Mcu=NULL, *Meq=NULL, *Mlinear=NULL;
     PyArrayObject *Mvt;
     doublereal *x, *bl, *bu, *v=NULL, *cl=NULL, *cu=NULL;
-    npy_int *vartypes;
+    npy_integer *vartypes;
     npy_bool *equatn=NULL, *linear=NULL;
     npy_intp dims[1];
+    char *name=NULL;
     int i;
 
-    if (PyObject_Length(args)!=0 && PyObject_Length(args)!=3) {
-        PyErr_SetString(PyExc_Exception, "setup() takes 0 or 3 arguments");
+    if (PyObject_Length(args)!=0 && PyObject_Length(args)!=3 && PyObject_Length(args)!=4) {
+        PyErr_SetString(PyExc_Exception, "setup() takes 0, 3 or 4 arguments");
         return NULL;
     }
 
-    if (PyObject_Length(args)==3) {
-        if (!PyArg_ParseTuple(args, "iii", &eFirst, &lFirst, &nvFirst)) {
+    if (PyObject_Length(args)>=3) {
+        if (!PyArg_ParseTuple(args, "iii|s", &eFirst, &lFirst, &nvFirst, &name)) {
             return NULL;
         }
+        if (name!=NULL && !set_datafile(name))
+            return NULL;
 
         efirst = eFirst  ? TRUE_ : FALSE_;
         lfirst = lFirst  ? TRUE_ : FALSE_;
@@ -373,7 +557,7 @@ static PyObject *cutest_setup(PyObject *self, PyObject *args) {
     Mx=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
     Mbl=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
     Mbu=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
-    Mvt=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INT);
+    Mvt=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
     if (CUTEst_ncon>0) {
         dims[0]=CUTEst_ncon;
         Mv=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
@@ -384,7 +568,7 @@ static PyObject *cutest_setup(PyObject *self, PyObject *args) {
     }
 
     /* Get internal data buffers */
-    /* Assume that npy_double is equivalent to double and npy_int is equivalent to integer */
+    /* Assume that npy_double is equivalent to double and npy_integer is equivalent to integer */
     x = (npy_double *)PyArray_DATA(Mx);
     bl = (npy_double *)PyArray_DATA(Mbl);
     bu = (npy_double *)PyArray_DATA(Mbu);
@@ -397,7 +581,7 @@ static PyObject *cutest_setup(PyObject *self, PyObject *args) {
         equatn = (npy_bool *)malloc(CUTEst_ncon*sizeof(npy_bool));
         linear = (npy_bool *)malloc(CUTEst_ncon*sizeof(npy_bool));
     }
-    vartypes=(npy_int *)malloc(CUTEst_nvar*sizeof(npy_int));
+    vartypes=(npy_integer *)malloc(CUTEst_nvar*sizeof(npy_integer));
 
     if (CUTEst_ncon > 0)
         CUTEST_csetup((integer *)&status, (integer *)&funit, (integer *)&iout, (integer *)&io_buffer, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, bl, bu,
@@ -423,7 +607,7 @@ static PyObject *cutest_setup(PyObject *self, PyObject *args) {
 
     /* Copy variable types to NumPy integer arrays and free temporary storage */
     for(i=0; i<CUTEst_nvar; i++) {
-        *((npy_int*)PyArray_GETPTR1(Mvt, i))=vartypes[i];
+        *((npy_integer*)PyArray_GETPTR1(Mvt, i))=vartypes[i];
     }
     free(vartypes);
 
@@ -443,16 +627,16 @@ static PyObject *cutest_setup(PyObject *self, PyObject *args) {
     close_datafile();
 
     dict=PyDict_New();
-    PyDict_SetItemString(dict, "n", PyLong_FromLong((long)CUTEst_nvar));
-    PyDict_SetItemString(dict, "m", PyLong_FromLong((long)CUTEst_ncon));
-    PyDict_SetItemString(dict, "nnzh", PyLong_FromLong((long)CUTEst_nnzh));
+    PyDict_SetItemString(dict, "n", PyLong_FromSsize_t((Py_ssize_t)CUTEst_nvar));
+    PyDict_SetItemString(dict, "m", PyLong_FromSsize_t((Py_ssize_t)CUTEst_ncon));
+    PyDict_SetItemString(dict, "nnzh", PyLong_FromSsize_t((Py_ssize_t)CUTEst_nnzh));
     PyDict_SetItemString(dict, "x", (PyObject *)Mx);
     PyDict_SetItemString(dict, "bl", (PyObject *)Mbl);
     PyDict_SetItemString(dict, "bu", (PyObject *)Mbu);
     PyDict_SetItemString(dict, "name", PyUnicode_FromString(CUTEst_probName));
     PyDict_SetItemString(dict, "vartype", (PyObject *)Mvt);
     if (CUTEst_ncon > 0) {
-        PyDict_SetItemString(dict, "nnzj", PyLong_FromLong((long)CUTEst_nnzj));
+        PyDict_SetItemString(dict, "nnzj", PyLong_FromSsize_t((Py_ssize_t)CUTEst_nnzj));
         PyDict_SetItemString(dict, "v", (PyObject*)Mv);
         PyDict_SetItemString(dict, "cl", (PyObject*)Mcl);
         PyDict_SetItemString(dict, "cu", (PyObject*)Mcu);
@@ -498,7 +682,7 @@ static PyObject *cutest_varnames(PyObject *self, PyObject *args) {
     Fvnames=(char *)malloc(CUTEst_nvar*STR_LEN*sizeof(char));
     list=PyList_New(0);
 
-    CUTEST_varnames((integer *)&status, (integer *)&CUTEst_nvar, Fvnames);
+    CUTEST_CALL(CUTEST_varnames((integer *)&status, (integer *)&CUTEst_nvar, Fvnames));
 
     for(i=0;i<CUTEst_nvar;i++) {
         ptr=Fvnames+i*STR_LEN;
@@ -552,7 +736,7 @@ static PyObject *cutest_connames(PyObject *self, PyObject *args) {
 
         Fcnames=(char *)malloc(CUTEst_ncon*STR_LEN*sizeof(char));
 
-        CUTEST_connames((integer *)&status, (integer *)&CUTEst_ncon, Fcnames);
+        CUTEST_CALL(CUTEST_connames((integer *)&status, (integer *)&CUTEst_ncon, Fcnames));
 
         for(i=0;i<CUTEst_ncon;i++) {
             ptr=Fcnames+i*STR_LEN;
@@ -609,12 +793,60 @@ static PyObject *cutest_objcons(PyObject *self, PyObject *args) {
     Mc=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
     c=(npy_double *)PyArray_DATA(Mc);
 
-    CUTEST_cfn((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, &f, c);
+    CUTEST_CALL(CUTEST_cfn((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, &f, c));
 
     return Py_BuildValue("dN", f, Mc);
 }
 
 
+PyDoc_STRVAR(cutest_objcons_batch_doc,
+"Returns the values of objective and constraints at many points.\n"
+"\n"
+"(f, C)=objcons_batch(X)\n"
+"\n"
+"Input\n"
+"X -- C contiguous 2D array of shape (k, n), each row holding the values\n"
+"     of variables at one point\n"
+"\n"
+"Output\n"
+"f -- 1D array of length k holding the values of the function at the rows of X\n"
+"C -- 2D array of shape (k, m) holding the values of constraints at the rows of X\n"
+"\n"
+"CUTEst tools used: CUTEST_cfn\n"
+);
+
+static PyObject *cutest_objcons_batch(PyObject *self, PyObject *args) {
+    PyArrayObject *arg1, *Mf, *Mc;
+    doublereal *X, *f, *c;
+    npy_intp dims[2];
+    npy_intp i, k;
+
+    if (!check_setup())
+        return NULL;
+
+    if (!PyArg_ParseTuple(args, "O", &arg1))
+        return NULL;
+
+    if (!check_batch(arg1))
+        return NULL;
+
+    X=(npy_double *)PyArray_DATA(arg1);
+    k=PyArray_DIM(arg1, 0);
+    dims[0]=k;
+    dims[1]=CUTEst_ncon;
+    Mf=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
+    f=(npy_double *)PyArray_DATA(Mf);
+    Mc=(PyArrayObject *)PyArray_SimpleNew(2, dims, NPY_DOUBLE);
+    c=(npy_double *)PyArray_DATA(Mc);
+
+    /* Evaluate all points with a single release of the GIL */
+    CUTEST_CALL(for(i=0; i<k; i++)
+        CUTEST_cfn((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, X+i*CUTEst_nvar, f+i, c+i*CUTEst_ncon));
+
+    return Py_BuildValue("NN", Mf, Mc);
+}
+
+
 PyDoc_STRVAR(cutest_obj_doc,
 "Returns the value of objective and its gradient at x.\n"
 "\n"
@@ -624,6 +856,7 @@ PyDoc_STRVAR(cutest_obj_doc,
 "Input\n"
 "x        -- 1D array of length n with the values of variables\n"
 "gradFlag -- if given the function returns f and g; can be anything\n"
+"out      -- keyword argument, 1D array of length n the gradient is written to\n"
 "\n"
 "Output\n"
 "f -- float holding the value of the function at x\n"
@@ -632,18 +865,20 @@ PyDoc_STRVAR(cutest_obj_doc,
 "CUTEst tools used: CUTEST_uofg, CUTEST_cofg\n"
 );
 
-static PyObject *cutest_obj(PyObject *self, PyObject *args) {
+static PyObject *cutest_obj(PyObject *self, PyObject *args, PyObject *kwargs) {
     PyArrayObject *arg1;
     PyObject *arg2;
+    PyObject *out=NULL;
     PyArrayObject *Mg=NULL;
     doublereal *x, *g=NULL;
     doublereal f;
     npy_intp dims[1];
+    static char *kwlist[] = {"", "", "out", NULL};
 
     if (!check_setup())
         return NULL;
 
-    if (!PyArg_ParseTuple(args, "O|O", &arg1, &arg2))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O$O", kwlist, &arg1, &arg2, &out))
         return NULL;
 
     /* Check if x is double and of correct length and shape */
@@ -655,30 +890,103 @@ static PyObject *cutest_obj(PyObject *self, PyObject *args) {
     x=(npy_double *)PyArray_DATA(arg1);
     if (PyObject_Length(args)>1) {
         dims[0]=CUTEst_nvar;
-        Mg=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
+        if ((Mg=output_array(out, 1, dims, 0))==NULL)
+            return NULL;
         g=(npy_double *)PyArray_DATA(Mg);
     }
 
     if (CUTEst_ncon == 0) {
         if (PyObject_Length(args)==1) {
-            CUTEST_uofg((integer *)&status, (integer *)&CUTEst_nvar, x, &f, NULL, &somethingFalse);
+            CUTEST_CALL(CUTEST_uofg((integer *)&status, (integer *)&CUTEst_nvar, x, &f, NULL, &somethingFalse));
             return Py_BuildValue("d", f);
         } else {
-            CUTEST_uofg((integer *)&status, (integer *)&CUTEst_nvar, x, &f, g, &somethingTrue);
+            CUTEST_CALL(CUTEST_uofg((integer *)&status, (integer *)&CUTEst_nvar, x, &f, g, &somethingTrue));
             return Py_BuildValue("dN", f, Mg);
         }
     } else {
         if (PyObject_Length(args)==1) {
-            CUTEST_cofg((integer *)&status, (integer *)&CUTEst_nvar, x, &f, NULL, &somethingFalse);
+            CUTEST_CALL(CUTEST_cofg((integer *)&status, (integer *)&CUTEst_nvar, x, &f, NULL, &somethingFalse));
             return Py_BuildValue("d", f);
         } else {
-            CUTEST_cofg((integer *)&status, (integer *)&CUTEst_nvar, x, &f, g, &somethingTrue);
+            CUTEST_CALL(CUTEST_cofg((integer *)&status, (integer *)&CUTEst_nvar, x, &f, g, &somethingTrue));
             return Py_BuildValue("dN", f, Mg);
         }
     }
 }
 
 
+PyDoc_STRVAR(cutest_obj_batch_doc,
+"Returns the values of objective and its gradient at many points.\n"
+"\n"
+"f=obj_batch(X)\n"
+"(f, G)=obj_batch(X, gradFlag)\n"
+"\n"
+"Input\n"
+"X        -- C contiguous 2D array of shape (k, n), each row holding the values\n"
+"            of variables at one point\n"
+"gradFlag -- if given the function returns f and G; can be anything\n"
+"\n"
+"Output\n"
+"f -- 1D array of length k holding the values of the function at the rows of X\n"
+"G -- 2D array of shape (k, n) holding the gradients of f at the rows of X\n"
+"\n"
+"CUTEst tools used: CUTEST_uofg, CUTEST_cofg\n"
+);
+
+static PyObject *cutest_obj_batch(PyObject *self, PyObject *args) {
+    PyArrayObject *arg1;
+    PyObject *arg2;
+    PyArrayObject *Mf, *Mg=NULL;
+    doublereal *X, *f, *g=NULL;
+    npy_intp dims[2];
+    npy_intp i, k;
+
+    if (!check_setup())
+        return NULL;
+
+    if (!PyArg_ParseTuple(args, "O|O", &arg1, &arg2))
+        return NULL;
+
+    if (!check_batch(arg1))
+        return NULL;
+
+    X=(npy_double *)PyArray_DATA(arg1);
+    k=PyArray_DIM(arg1, 0);
+    dims[0]=k;
+    Mf=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
+    f=(npy_double *)PyArray_DATA(Mf);
+    if (PyObject_Length(args)>1) {
+        dims[1]=CUTEst_nvar;
+        Mg=(PyArrayObject *)PyArray_SimpleNew(2, dims, NPY_DOUBLE);
+        g=(npy_double *)PyArray_DATA(Mg);
+    }
+
+    /* Evaluate all points with a single release of the GIL */
+    if (CUTEst_ncon == 0) {
+        if (PyObject_Length(args)==1) {
+            CUTEST_CALL(for(i=0; i<k; i++)
+                CUTEST_uofg((integer *)&status, (integer *)&CUTEst_nvar, X+i*CUTEst_nvar, f+i, NULL, &somethingFalse));
+        } else {
+            CUTEST_CALL(for(i=0; i<k; i++)
+                CUTEST_uofg((integer *)&status, (integer *)&CUTEst_nvar, X+i*CUTEst_nvar, f+i, g+i*CUTEst_nvar, &somethingTrue));
+        }
+    } else {
+        if (PyObject_Length(args)==1) {
+            CUTEST_CALL(for(i=0; i<k; i++)
+                CUTEST_cofg((integer *)&status, (integer *)&CUTEst_nvar, X+i*CUTEst_nvar, f+i, NULL, &somethingFalse));
+        } else {
+            CUTEST_CALL(for(i=0; i<k; i++)
+                CUTEST_cofg((integer *)&status, (integer *)&CUTEst_nvar, X+i*CUTEst_nvar, f+i, g+i*CUTEst_nvar, &somethingTrue));
+        }
+    }
+
+    if (PyObject_Length(args)==1)
+        return (PyObject *)Mf;
+    else
+        return Py_BuildValue("NN", Mf, Mg);
+}
+
+
 PyDoc_STRVAR(cutest_grad_doc,
 "Returns the gradient of the objective or gradient of the i-th constraint at x.\n"
 "\n"
@@ -688,6 +996,7 @@ PyDoc_STRVAR(cutest_grad_doc,
 "Input\n"
 "x -- 1D array of length n with the values of variables\n"
 "i -- integer index of constraint (between 0 and m-1)\n"
+"out -- keyword argument, 1D array of length n the gradient is written to\n"
 "\n"
 "Output\n"
 "g -- 1D array of length n holding the value of the gradient at x\n"
@@ -695,18 +1004,20 @@ PyDoc_STRVAR(cutest_grad_doc,
 "CUTEst tools used: CUTEST_ugr, CUTEST_cigr\n"
 );
 
-static PyObject *cutest_grad(PyObject *self, PyObject *args) {
+static PyObject *cutest_grad(PyObject *self, PyObject *args, PyObject *kwargs) {
     PyArrayObject *arg1;
+    PyObject *out=NULL;
     PyArrayObject *Mg=NULL;
     doublereal *x, *g=NULL;
     int index;
-    npy_int icon;
+    npy_integer icon;
     npy_intp dims[1];
+    static char *kwlist[] = {"", "", "out", NULL};
 
     if (!check_setup())
         return NULL;
 
-    if (!PyArg_ParseTuple(args, "O|i", &arg1, &index))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|i$O", kwlist, &arg1, &index, &out))
         return NULL;
 
     /* Check if x is double and of correct length and shape */
@@ -728,14 +1039,15 @@ static PyObject *cutest_grad(PyObject *self, PyObject *args) {
 
     x=(npy_double *)PyArray_DATA(arg1);
     dims[0]=CUTEst_nvar;
-    Mg=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
+    if ((Mg=output_array(out, 1, dims, 0))==NULL)
+        return NULL;
     g=(npy_double *)PyArray_DATA(Mg);
 
     if (CUTEst_ncon == 0) {
-        CUTEST_ugr((integer *)&status, (integer *)&CUTEst_nvar, x, g);
+        CUTEST_CALL(CUTEST_ugr((integer *)&status, (integer *)&CUTEst_nvar, x, g));
         return Py_BuildValue("N", Mg);
     } else {
-        CUTEST_cigr((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&icon, x, g);
+        CUTEST_CALL(CUTEST_cigr((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&icon, x, g));
         return Py_BuildValue("N", Mg);
     }
 }
@@ -750,8 +1062,11 @@ PyDoc_STRVAR(cutest_cons_doc,
 "(ci, Ji)=cons(x, True, i) -- i-th constraint and its gradient\n"
 "\n"
 "Input\n"
-"x -- 1D array of length n with the values of variables\n"
-"i -- integer index of constraint (between 0 and m-1)\n"
+"x    -- 1D array of length n with the values of variables\n"
+"i    -- integer index of constraint (between 0 and m-1)\n"
+"out  -- keyword argument, 1D array of length m the constraints are written to\n"
+"jout -- keyword argument, FORTRAN contiguous 2D array the Jacobian (or 1D array\n"
+"        the gradient of i-th constraint) is written to\n"
 "\n"
 "Output\n"
 "c  -- 1D array of length m holding the values of constraints at x\n"
@@ -763,20 +1078,21 @@ PyDoc_STRVAR(cutest_cons_doc,
 "CUTEst tools used: CUTEST_ccfg, CUTEST_ccifg\n"
 );
 
-static PyObject *cutest_cons(PyObject *self, PyObject *args) {
+static PyObject *cutest_cons(PyObject *self, PyObject *args, PyObject *kwargs) {
     PyArrayObject *arg1, *Mc, *MJ;
-    PyObject *arg2;
+    PyObject *arg2, *out=NULL, *jout=NULL;
     doublereal *x, *c, *J;
     int derivs, index, wantSingle;
-    npy_int icon;
-    npy_int zero = 0;
+    npy_integer icon;
+    npy_integer zero = 0;
     npy_intp dims[2];
+    static char *kwlist[] = {"", "", "", "out", "jout", NULL};
 
     if (!check_setup())
         return NULL;
 
     arg2=NULL;
-    if (!PyArg_ParseTuple(args, "O|Oi", &arg1, &arg2, &index))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|Oi$OO", kwlist, &arg1, &arg2, &index, &out, &jout))
         return NULL;
 
     /* Check if x is double and of correct length and shape */
@@ -807,13 +1123,17 @@ static PyObject *cutest_cons(PyObject *self, PyObject *args) {
     x=(npy_double *)PyArray_DATA(arg1);
     if (!wantSingle) {
         dims[0]=CUTEst_ncon;
-        Mc=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
+        if ((Mc=output_array(out, 1, dims, 0))==NULL)
+            return NULL;
         c=(npy_double *)PyArray_DATA(Mc);
         if (derivs) {
             dims[0]=CUTEst_ncon;
             dims[1]=CUTEst_nvar;
-            /* Create a FORTRAN style array (first index stride is 1) */
-            MJ=(PyArrayObject *)PyArray_New(&PyArray_Type, 2, dims, NPY_DOUBLE, NULL, NULL, 0, NPY_ARRAY_F_CONTIGUOUS, NULL);
+            /* Use a FORTRAN style array (first index stride is 1) */
+            if ((MJ=output_array(jout, 2, dims, 1))==NULL) {
+                Py_DECREF(Mc);
+                return NULL;
+            }
             J=(npy_double *)PyArray_DATA(MJ);
         }
     } else {
@@ -822,34 +1142,84 @@ static PyObject *cutest_cons(PyObject *self, PyObject *args) {
         c=(npy_double *)PyArray_DATA(Mc);
         if (derivs) {
             dims[0]=CUTEst_nvar;
-            MJ=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
+            if ((MJ=output_array(jout, 1, dims, 0))==NULL) {
+                Py_DECREF(Mc);
+                return NULL;
+            }
             J=(npy_double *)PyArray_DATA(MJ);
         }
     }
 
     if (!wantSingle) {
         if (!derivs) {
-            CUTEST_ccfg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, c,
-                    &somethingFalse, (integer *)&zero, (integer *)&zero, NULL, &somethingFalse);
+            CUTEST_CALL(CUTEST_ccfg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, c,
+                    &somethingFalse, (integer *)&zero, (integer *)&zero, NULL, &somethingFalse));
             return (PyObject *)Mc;
         } else {
-            CUTEST_ccfg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, c,
+            CUTEST_CALL(CUTEST_ccfg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, c,
                     &somethingFalse, (integer *)&CUTEst_ncon, (integer *)&CUTEst_nvar, J,
-                    &somethingTrue);
+                    &somethingTrue));
             return Py_BuildValue("NN", Mc, MJ);
         }
     } else {
         if (!derivs) {
-            CUTEST_ccifg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&icon, x, c, NULL, &somethingFalse);
+            CUTEST_CALL(CUTEST_ccifg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&icon, x, c, NULL, &somethingFalse));
             return (PyObject *)Mc;
         } else {
-            CUTEST_ccifg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&icon, x, c, J, &somethingTrue);
+            CUTEST_CALL(CUTEST_ccifg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&icon, x, c, J, &somethingTrue));
             return Py_BuildValue("NN", Mc, MJ);
         }
     }
 }
 
 
+PyDoc_STRVAR(cutest_cons_batch_doc,
+"Returns the values of constraints at many points.\n"
+"\n"
+"C=cons_batch(X)\n"
+"\n"
+"Input\n"
+"X -- C contiguous 2D array of shape (k, n), each row holding the values\n"
+"     of variables at one point\n"
+"\n"
+"Output\n"
+"C -- 2D array of shape (k, m) holding the values of constraints at the rows of X\n"
+"\n"
+"CUTEst tools used: CUTEST_ccfg\n"
+);
+
+static PyObject *cutest_cons_batch(PyObject *self, PyObject *args) {
+    PyArrayObject *arg1, *Mc;
+    doublereal *X, *c;
+    npy_integer zero = 0;
+    npy_intp dims[2];
+    npy_intp i, k;
+
+    if (!check_setup())
+        return NULL;
+
+    if (!PyArg_ParseTuple(args, "O", &arg1))
+        return NULL;
+
+    if (!check_batch(arg1))
+        return NULL;
+
+    X=(npy_double *)PyArray_DATA(arg1);
+    k=PyArray_DIM(arg1, 0);
+    dims[0]=k;
+    dims[1]=CUTEst_ncon;
+    Mc=(PyArrayObject *)PyArray_SimpleNew(2, dims, NPY_DOUBLE);
+    c=(npy_double *)PyArray_DATA(Mc);
+
+    /* Evaluate all points with a single release of the GIL */
+    CUTEST_CALL(for(i=0; i<k; i++)
+        CUTEST_ccfg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, X+i*CUTEst_nvar, c+i*CUTEst_ncon,
+                &somethingFalse, (integer *)&zero, (integer *)&zero, NULL, &somethingFalse));
+
+    return (PyObject *)Mc;
+}
+
+
 PyDoc_STRVAR(cutest_lag_doc,
 "Returns the Lagrangian function value and its gradient if requested at x.\n"
 "The gradient is the gradient with respect to the problem variables (has n components).\n"
@@ -903,10 +1273,10 @@ static PyObject *cutest_lag(PyObject *self, PyObject *args) {
     }
 
     if (PyObject_Length(args)==2) {
-        CUTEST_clfg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, &f, NULL, &somethingFalse);
+        CUTEST_CALL(CUTEST_clfg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, &f, NULL, &somethingFalse));
         return Py_BuildValue("d", f);
     } else {
-        CUTEST_clfg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, &f, g, &somethingTrue);
+        CUTEST_CALL(CUTEST_clfg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, &f, g, &somethingTrue));
         return Py_BuildValue("dN", f, Mg);
     }
 }
@@ -974,11 +1344,11 @@ static PyObject *cutest_lagjac(PyObject *self, PyObject *args) {
     J=(npy_double *)PyArray_DATA(MJ);
 
     if (!lagrangian) {
-        CUTEST_cgr((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, NULL, &somethingFalse,
-            g, &somethingFalse, (integer *)&CUTEst_ncon, (integer *)&CUTEst_nvar, J);
+        CUTEST_CALL(CUTEST_cgr((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, NULL, &somethingFalse,
+            g, &somethingFalse, (integer *)&CUTEst_ncon, (integer *)&CUTEst_nvar, J));
     } else {
-        CUTEST_cgr((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, &somethingTrue,
-            g, &somethingFalse, (integer *)&CUTEst_ncon, (integer *)&CUTEst_nvar, J);
+        CUTEST_CALL(CUTEST_cgr((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, &somethingTrue,
+            g, &somethingFalse, (integer *)&CUTEst_ncon, (integer *)&CUTEst_nvar, J));
     }
 
     return Py_BuildValue("NN", Mg, MJ);
@@ -998,6 +1368,7 @@ PyDoc_STRVAR(cutest_jprod_doc,
 "             1D array of length n (m) if transpose if False (True)\n"
 "x         -- 1D array of length n holding the values of variables used in the\n"
 "             evaluation of the constraints Jacobian\n"
+"out       -- keyword argument, 1D array the result is written to\n"
 "\n"
 "Output\n"
 "r  -- 1D array of length m if transpose=False (or n if transpose=True)\n"
@@ -1006,18 +1377,19 @@ PyDoc_STRVAR(cutest_jprod_doc,
 "CUTEst tools used: CUTEST_cjprod\n"
 );
 
-static PyObject *cutest_jprod(PyObject *self, PyObject *args) {
+static PyObject *cutest_jprod(PyObject *self, PyObject *args, PyObject *kwargs) {
     PyArrayObject *arg2, *arg3, *Mr;
-    PyObject *arg1;
+    PyObject *arg1, *out=NULL;
     doublereal *p, *x, *r;
     int transpose;
     npy_intp dims[1];
+    static char *kwlist[] = {"", "", "", "out", NULL};
 
     if (!check_setup())
         return NULL;
 
     arg3=NULL;
-    if (!PyArg_ParseTuple(args, "OO|O", &arg1, &arg2, &arg3))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|O$O", kwlist, &arg1, &arg2, &arg3, &out))
         return NULL;
 
     /* Check if arg1 is True */
@@ -1062,24 +1434,25 @@ static PyObject *cutest_jprod(PyObject *self, PyObject *args) {
     } else {
         dims[0]=CUTEst_nvar;
     }
-    Mr=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
+    if ((Mr=output_array(out, 1, dims, 0))==NULL)
+        return NULL;
     r=(npy_double *)PyArray_DATA(Mr);
 
     if (!transpose) {
         if (arg3==NULL) {
-            CUTEST_cjprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, &somethingTrue,
-                    &somethingFalse, NULL, p, (integer *)&CUTEst_nvar, r, (integer *)&CUTEst_ncon);
+            CUTEST_CALL(CUTEST_cjprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, &somethingTrue,
+                    &somethingFalse, NULL, p, (integer *)&CUTEst_nvar, r, (integer *)&CUTEst_ncon));
         } else {
-            CUTEST_cjprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, &somethingFalse,
-                    &somethingFalse, x, p, (integer *)&CUTEst_nvar, r, (integer *)&CUTEst_ncon);
+            CUTEST_CALL(CUTEST_cjprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, &somethingFalse,
+                    &somethingFalse, x, p, (integer *)&CUTEst_nvar, r, (integer *)&CUTEst_ncon));
         }
     } else {
         if (arg3==NULL) {
-            CUTEST_cjprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, &somethingTrue,
-                    &somethingTrue, NULL, p, (integer *)&CUTEst_ncon, r, (integer *)&CUTEst_nvar);
+            CUTEST_CALL(CUTEST_cjprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, &somethingTrue,
+                    &somethingTrue, NULL, p, (integer *)&CUTEst_ncon, r, (integer *)&CUTEst_nvar));
         } else {
-            CUTEST_cjprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, &somethingFalse,
-                    &somethingTrue, x, p, (integer *)&CUTEst_ncon, r, (integer *)&CUTEst_nvar);
+            CUTEST_CALL(CUTEST_cjprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, &somethingFalse,
+                    &somethingTrue, x, p, (integer *)&CUTEst_ncon, r, (integer *)&CUTEst_nvar));
         }
     }
 
@@ -1087,6 +1460,88 @@ static PyObject *cutest_jprod(PyObject *self, PyObject *args) {
 }
 
 
+PyDoc_STRVAR(cutest_jprod_many_doc,
+"Returns the products of constraints Jacobian at x with many vectors.\n"
+"\n"
+"R=jprod_many(transpose, P)    -- use the last computed Jacobian\n"
+"R=jprod_many(transpose, P, x) -- evaluate the Jacobian at x\n"
+"\n"
+"Works like jprod, but the Jacobian is evaluated only once (for the first\n"
+"column of P) and reused for the remaining columns.\n"
+"\n"
+"Input\n"
+"transpose -- boolean flag indicating that the Jacobian should be transposed\n"
+"             before the products are computed\n"
+"P         -- FORTRAN contiguous 2D array with n rows (m rows if transpose is True),\n"
+"             one vector per column\n"
+"x         -- 1D array of length n holding the values of variables used in the\n"
+"             evaluation of the constraints Jacobian\n"
+"\n"
+"Output\n"
+"R -- FORTRAN contiguous 2D array with m rows (n rows if transpose is True),\n"
+"     the products of the Jacobian (or its transpose) with the columns of P\n"
+"\n"
+"CUTEst tools used: CUTEST_cjprod\n"
+);
+
+static PyObject *cutest_jprod_many(PyObject *self, PyObject *args) {
+    PyArrayObject *arg2, *arg3, *MR;
+    PyObject *arg1;
+    doublereal *P, *x=NULL, *R;
+    logical *gotj, *jtrans;
+    npy_integer lp, lr;
+    npy_intp dims[2];
+    npy_intp j, k;
+
+    if (!check_setup())
+        return NULL;
+
+    arg3=NULL;
+    if (!PyArg_ParseTuple(args, "OO|O", &arg1, &arg2, &arg3))
+        return NULL;
+
+    /* Check if arg1 is True */
+    if (arg1==Py_True) {
+        jtrans=&somethingTrue;
+        lp=CUTEst_ncon;
+        lr=CUTEst_nvar;
+        if (!check_columns(arg2, CUTEst_ncon, 2, "ncon (J is transposed)"))
+            return NULL;
+    } else {
+        jtrans=&somethingFalse;
+        lp=CUTEst_nvar;
+        lr=CUTEst_ncon;
+        if (!check_columns(arg2, CUTEst_nvar, 2, "nvar (J is not transposed)"))
+            return NULL;
+    }
+
+    /* Check if x is double and of correct length and shape. */
+    if (arg3!=NULL && !(PyArray_Check(arg3) && PyArray_ISFLOAT(arg3) && PyArray_TYPE(arg3)==NPY_DOUBLE && PyArray_NDIM(arg3)==1 && PyArray_DIM(arg3, 0)==CUTEst_nvar)) {
+        PyErr_SetString(PyExc_Exception, "Argument 3 must be a 1D double array of length nvar");
+        return NULL;
+    }
+
+    P=(npy_double *)PyArray_DATA(arg2);
+    k=PyArray_DIM(arg2, 1);
+    if (arg3!=NULL)
+        x=(npy_double *)PyArray_DATA(arg3);
+    dims[0]=lr;
+    dims[1]=k;
+    /* Create a FORTRAN style array (first index stride is 1) */
+    MR=(PyArrayObject *)PyArray_New(&PyArray_Type, 2, dims, NPY_DOUBLE, NULL, NULL, 0, NPY_ARRAY_F_CONTIGUOUS, NULL);
+    R=(npy_double *)PyArray_DATA(MR);
+
+    /* Evaluate the Jacobian for the first product only (unless the last one is used), reuse it afterwards */
+    CUTEST_CALL(for(j=0; j<k; j++) {
+        gotj=(arg3==NULL || j>0) ? &somethingTrue : &somethingFalse;
+        CUTEST_cjprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, gotj,
+                jtrans, x, P+j*lp, (integer *)&lp, R+j*lr, (integer *)&lr);
+    });
+
+    return (PyObject *)MR;
+}
+
+
 PyDoc_STRVAR(cutest_hess_doc,
 "Returns the Hessian of the objective (for unconstrained problems) or the\n"
 "Hessian of the Lagrangian (for constrained problems) at x.\n"
@@ -1103,6 +1558,7 @@ PyDoc_STRVAR(cutest_hess_doc,
 "Input\n"
 "x         -- 1D array of length n holding the values of variables\n"
 "v         -- 1D array of length m holding the values of Lagrange multipliers\n"
+"out -- keyword argument, FORTRAN contiguous 2D array the Hessian is written to\n"
 "\n"
 "Output\n"
 "H  -- 2D array with n rows of n columns holding the Hessian at x (or (x, v))\n"
@@ -1110,16 +1566,18 @@ PyDoc_STRVAR(cutest_hess_doc,
 "CUTEst tools used: CUTEST_cdh, CUTEST_udh\n"
 );
 
-static PyObject *cutest_hess(PyObject *self, PyObject *args) {
+static PyObject *cutest_hess(PyObject *self, PyObject *args, PyObject *kwargs) {
     PyArrayObject *arg1, *arg2, *MH;
     doublereal *x, *v=NULL, *H;
+    PyObject *out=NULL;
     npy_intp dims[2];
+    static char *kwlist[] = {"", "", "out", NULL};
 
     if (!check_setup())
         return NULL;
 
     arg2=NULL;
-    if (!PyArg_ParseTuple(args, "O|O", &arg1, &arg2))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O$O", kwlist, &arg1, &arg2, &out))
         return NULL;
 
     /* Check if x is double and of correct dimension */
@@ -1146,14 +1604,15 @@ static PyObject *cutest_hess(PyObject *self, PyObject *args) {
         v=(npy_double *)PyArray_DATA(arg2);
     dims[0]=CUTEst_nvar;
     dims[1]=CUTEst_nvar;
-    /* Create a FORTRAN style array (first index stride is 1) */
-    MH=(PyArrayObject *)PyArray_New(&PyArray_Type, 2, dims, NPY_DOUBLE, NULL, NULL, 0, NPY_ARRAY_F_CONTIGUOUS, NULL);
+    /* Use a FORTRAN style array (first index stride is 1) */
+    if ((MH=output_array(out, 2, dims, 1))==NULL)
+        return NULL;
     H=(npy_double *)PyArray_DATA(MH);
 
     if (CUTEst_ncon>0) {
-        CUTEST_cdh((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, (integer *)&CUTEst_nvar, H);
+        CUTEST_CALL(CUTEST_cdh((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, (integer *)&CUTEst_nvar, H));
     } else {
-        CUTEST_udh((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&CUTEst_nvar, H);
+        CUTEST_CALL(CUTEST_udh((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&CUTEst_nvar, H));
     }
 
     return (PyObject *)MH;
@@ -1171,6 +1630,7 @@ PyDoc_STRVAR(cutest_ihess_doc,
 "Input\n"
 "x -- 1D array of length n holding the values of variables\n"
 "i -- integer holding the index of the constraint (between 0 and m-1)\n"
+"out -- keyword argument, FORTRAN contiguous 2D array the Hessian is written to\n"
 "\n"
 "Output\n"
 "H  -- 2D array with n rows of n columns holding the Hessian at x\n"
@@ -1178,17 +1638,19 @@ PyDoc_STRVAR(cutest_ihess_doc,
 "CUTEst tools used: CUTEST_cidh, CUTEST_udh\n"
 );
 
-static PyObject *cutest_ihess(PyObject *self, PyObject *args) {
+static PyObject *cutest_ihess(PyObject *self, PyObject *args, PyObject *kwargs) {
     PyArrayObject *arg1, *MH;
     doublereal *x, *H;
+    PyObject *out=NULL;
     npy_intp dims[2];
+    static char *kwlist[] = {"", "", "out", NULL};
     int i;
-    npy_int icon;
+    npy_integer icon;
 
     if (!check_setup())
         return NULL;
 
-    if (!PyArg_ParseTuple(args, "O|i", &arg1, &i))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|i$O", kwlist, &arg1, &i, &out))
         return NULL;
 
     if (PyObject_Length(args)>1) {
@@ -1210,14 +1672,15 @@ static PyObject *cutest_ihess(PyObject *self, PyObject *args) {
     x=(npy_double *)PyArray_DATA(arg1);
     dims[0]=CUTEst_nvar;
     dims[1]=CUTEst_nvar;
-    /* Create a FORTRAN style array (first index stride is 1) */
-    MH=(PyArrayObject *)PyArray_New(&PyArray_Type, 2, dims, NPY_DOUBLE, NULL, NULL, 0, NPY_ARRAY_F_CONTIGUOUS, NULL);
+    /* Use a FORTRAN style array (first index stride is 1) */
+    if ((MH=output_array(out, 2, dims, 1))==NULL)
+        return NULL;
     H=(npy_double *)PyArray_DATA(MH);
 
     if (CUTEst_ncon>0) {
-        CUTEST_cidh((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&icon, (integer *)&CUTEst_nvar, H);
+        CUTEST_CALL(CUTEST_cidh((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&icon, (integer *)&CUTEst_nvar, H));
     } else {
-        CUTEST_udh((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&CUTEst_nvar, H);
+        CUTEST_CALL(CUTEST_udh((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&CUTEst_nvar, H));
     }
 
     return (PyObject *)MH;
@@ -1241,6 +1704,7 @@ PyDoc_STRVAR(cutest_hprod_doc,
 "p -- 1D array of length n holding the components of the vector\n"
 "x -- 1D array of length n holding the values of variables\n"
 "v -- 1D array of length m holding the values of Lagrange multipliers\n"
+"out -- keyword argument, 1D array of length n the result is written to\n"
 "\n"
 "Output\n"
 "r  -- 1D array of length n holding the result\n"
@@ -1248,16 +1712,18 @@ PyDoc_STRVAR(cutest_hprod_doc,
 "CUTEst tools used: CUTEST_chprod, CUTEST_uhprod\n"
 );
 
-static PyObject *cutest_hprod(PyObject *self, PyObject *args) {
+static PyObject *cutest_hprod(PyObject *self, PyObject *args, PyObject *kwargs) {
     PyArrayObject *arg1, *arg2, *arg3, *Mr;
     doublereal *p, *x=NULL, *v=NULL, *r;
+    PyObject *out=NULL;
     npy_intp dims[1];
+    static char *kwlist[] = {"", "", "", "out", NULL};
 
     if (!check_setup())
         return NULL;
 
     arg2=arg3=NULL;
-    if (!PyArg_ParseTuple(args, "O|OO", &arg1, &arg2, &arg3))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|OO$O", kwlist, &arg1, &arg2, &arg3, &out))
         return NULL;
 
     if (CUTEst_ncon>0) {
@@ -1296,25 +1762,120 @@ static PyObject *cutest_hprod(PyObject *self, PyObject *args) {
     if (arg3!=NULL)
         v=(npy_double *)PyArray_DATA(arg3);
     dims[0]=CUTEst_nvar;
-    Mr=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
+    if ((Mr=output_array(out, 1, dims, 0))==NULL)
+        return NULL;
     r=(npy_double *)PyArray_DATA(Mr);
 
     if (CUTEst_ncon>0) {
         if (arg2==NULL)
-            CUTEST_chprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, &somethingTrue, NULL, NULL, p, r);
+            CUTEST_CALL(CUTEST_chprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, &somethingTrue, NULL, NULL, p, r));
         else
-            CUTEST_chprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, &somethingFalse, x, v, p, r);
+            CUTEST_CALL(CUTEST_chprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, &somethingFalse, x, v, p, r));
     } else {
         if (arg2==NULL)
-            CUTEST_uhprod((integer *)&status, (integer *)&CUTEst_nvar, &somethingTrue, NULL, p, r);
+            CUTEST_CALL(CUTEST_uhprod((integer *)&status, (integer *)&CUTEst_nvar, &somethingTrue, NULL, p, r));
         else
-            CUTEST_uhprod((integer *)&status, (integer *)&CUTEst_nvar, &somethingFalse, x, p, r);
+            CUTEST_CALL(CUTEST_uhprod((integer *)&status, (integer *)&CUTEst_nvar, &somethingFalse, x, p, r));
     }
 
     return (PyObject *)Mr;
 }
 
 
+PyDoc_STRVAR(cutest_hprod_many_doc,
+"Returns the products of Hessian at x with many vectors.\n"
+"\n"
+"R=hprod_many(P)       -- use the last computed Hessian\n"
+"R=hprod_many(P, x)    -- unconstrained problems\n"
+"R=hprod_many(P, x, v) -- constrained problems\n"
+"\n"
+"Works like hprod, but the Hessian is evaluated only once (for the first\n"
+"column of P) and reused for the remaining columns.\n"
+"\n"
+"Input\n"
+"P -- FORTRAN contiguous 2D array with n rows, one vector per column\n"
+"x -- 1D array of length n holding the values of variables used in the evaluation of\n"
+"     the Hessian of the objective or the Lagrangian\n"
+"v -- 1D array of length m holding the values of Lagrange multipliers used in the\n"
+"     evaluation of the Hessian of the Lagrangian\n"
+"\n"
+"Output\n"
+"R -- FORTRAN contiguous 2D array with n rows, the products of the Hessian with the columns of P\n"
+"\n"
+"CUTEst tools used: CUTEST_chprod, CUTEST_uhprod\n"
+);
+
+static PyObject *cutest_hprod_many(PyObject *self, PyObject *args) {
+    PyArrayObject *arg1, *arg2, *arg3, *MR;
+    doublereal *P, *x=NULL, *v=NULL, *R;
+    logical *goth;
+    npy_intp dims[2];
+    npy_intp j, k;
+
+    if (!check_setup())
+        return NULL;
+
+    arg2=arg3=NULL;
+    if (!PyArg_ParseTuple(args, "O|OO", &arg1, &arg2, &arg3))
+        return NULL;
+
+    if (CUTEst_ncon>0) {
+        if (PyObject_Length(args)==2) {
+            PyErr_SetString(PyExc_Exception, "Need 1 or 3 arguments for constrained problems");
+            return NULL;
+        }
+    } else {
+        if (PyObject_Length(args)==3) {
+            PyErr_SetString(PyExc_Exception, "Need 1 or 2 arguments for unconstrained problems");
+            return NULL;
+        }
+    }
+
+    if (!check_columns(arg1, CUTEst_nvar, 1, "nvar"))
+        return NULL;
+
+    /* Check if x is double and of correct dimension */
+    if (arg2!=NULL && !(PyArray_Check(arg2) && PyArray_ISFLOAT(arg2) && PyArray_TYPE(arg2)==NPY_DOUBLE && PyArray_NDIM(arg2)==1 && PyArray_DIM(arg2, 0)==CUTEst_nvar)) {
+        PyErr_SetString(PyExc_Exception, "Argument 2 must be a 1D double array of length nvar");
+        return NULL;
+    }
+
+    /* Check if v is double and of correct dimension */
+    if (arg3!=NULL && !(PyArray_Check(arg3) && PyArray_ISFLOAT(arg3) && PyArray_TYPE(arg3)==NPY_DOUBLE && PyArray_NDIM(arg3)==1 && PyArray_DIM(arg3, 0)==CUTEst_ncon)) {
+        PyErr_SetString(PyExc_Exception, "Argument 3 must be a 1D double array of length ncon");
+        return NULL;
+    }
+
+    P=(npy_double *)PyArray_DATA(arg1);
+    k=PyArray_DIM(arg1, 1);
+    if (arg2!=NULL)
+        x=(npy_double *)PyArray_DATA(arg2);
+    if (arg3!=NULL)
+        v=(npy_double *)PyArray_DATA(arg3);
+    dims[0]=CUTEst_nvar;
+    dims[1]=k;
+    /* Create a FORTRAN style array (first index stride is 1) */
+    MR=(PyArrayObject *)PyArray_New(&PyArray_Type, 2, dims, NPY_DOUBLE, NULL, NULL, 0, NPY_ARRAY_F_CONTIGUOUS, NULL);
+    R=(npy_double *)PyArray_DATA(MR);
+
+    /* Evaluate the Hessian for the first product only (unless the last one is used), reuse it afterwards */
+    if (CUTEst_ncon>0) {
+        CUTEST_CALL(for(j=0; j<k; j++) {
+            goth=(arg2==NULL || j>0) ? &somethingTrue : &somethingFalse;
+            CUTEST_chprod((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, goth, x, v,
+                    P+j*CUTEst_nvar, R+j*CUTEst_nvar);
+        });
+    } else {
+        CUTEST_CALL(for(j=0; j<k; j++) {
+            goth=(arg2==NULL || j>0) ? &somethingTrue : &somethingFalse;
+            CUTEST_uhprod((integer *)&status, (integer *)&CUTEst_nvar, goth, x, P+j*CUTEst_nvar, R+j*CUTEst_nvar);
+        });
+    }
+
+    return (PyObject *)MR;
+}
+
+
 PyDoc_STRVAR(cutest_gradhess_doc,
 "Returns the Hessian of the Lagrangian, the Jacobian of constraints, and the\n"
 "gradient of the objective or the gradient of the Lagrangian at x.\n"
@@ -1410,11 +1971,11 @@ static PyObject *cutest_gradhess(PyObject *self, PyObject *args) {
     J=(npy_double *)PyArray_DATA(MJ);
 
     if (CUTEst_ncon>0) {
-        CUTEST_cgrdh((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, (logical *)&grlagf,
-                g, &somethingFalse, (integer *)&CUTEst_ncon, (integer *)&CUTEst_nvar, J, (integer *)&CUTEst_nvar, H);
+        CUTEST_CALL(CUTEST_cgrdh((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, (logical *)&grlagf,
+                g, &somethingFalse, (integer *)&CUTEst_ncon, (integer *)&CUTEst_nvar, J, (integer *)&CUTEst_nvar, H));
         return Py_BuildValue("NNN", Mg, MJ, MH);
     } else {
-        CUTEST_ugrdh((integer *)&status, (integer *)&CUTEst_nvar, x, g, (integer *)&CUTEst_nvar, H);
+        CUTEST_CALL(CUTEST_ugrdh((integer *)&status, (integer *)&CUTEst_nvar, x, g, (integer *)&CUTEst_nvar, H));
         return Py_BuildValue("NN", Mg, MH);
     }
 }
@@ -1443,10 +2004,10 @@ PyDoc_STRVAR(cutest_sobj_doc,
 static PyObject *cutest_sobj(PyObject *self, PyObject *args) {
     PyArrayObject *arg1, *Mgi, *Mgv;
     PyObject *arg2;
-    doublereal *x, *sv;
+    doublereal *x;
     doublereal f;
-    npy_int *si;
-    npy_int nnzg, nzero=0;
+    npy_integer nnzg, nzero=0;
+    npy_intp dims[1];
 
     if (!check_setup())
         return NULL;
@@ -1467,18 +2028,18 @@ static PyObject *cutest_sobj(PyObject *self, PyObject *args) {
 
     x=(npy_double *)PyArray_DATA(arg1);
     if (PyObject_Length(args)==1) {
-        CUTEST_cofsg((integer *)&status, (integer *)&CUTEst_nvar, x, &f, (integer *)&nnzg, (integer *)&nzero, NULL, NULL, &somethingFalse);
+        CUTEST_CALL(CUTEST_cofsg((integer *)&status, (integer *)&CUTEst_nvar, x, &f, (integer *)&nnzg, (integer *)&nzero, NULL, NULL, &somethingFalse));
         return Py_BuildValue("d", f);
     } else {
-        si=(npy_int *)malloc(CUTEst_nvar*sizeof(npy_int));
-        sv=(npy_double *)malloc(CUTEst_nvar*sizeof(npy_double));
-
-        CUTEST_cofsg((integer *)&status, (integer *)&CUTEst_nvar, x, &f, (integer *)&nnzg, (integer *)&CUTEst_nvar, sv, (integer *)si, &somethingTrue);
+        dims[0]=CUTEst_nvar;
+        Mgi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+        Mgv=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
 
-        extract_sparse_gradient(nnzg, si, sv, (PyArrayObject **)&Mgi, (PyArrayObject **)&Mgv);
+        CUTEST_CALL(CUTEST_cofsg((integer *)&status, (integer *)&CUTEst_nvar, x, &f, (integer *)&nnzg, (integer *)&CUTEst_nvar,
+                (npy_double *)PyArray_DATA(Mgv), (integer *)PyArray_DATA(Mgi), &somethingTrue));
 
-        free(si);
-        free(sv);
+        if (!finish_sparse_gradient(nnzg, Mgi, Mgv))
+            return NULL;
 
         return Py_BuildValue("dNN", f, Mgi, Mgv);
     }
@@ -1506,10 +2067,10 @@ PyDoc_STRVAR(cutest_sgrad_doc,
 
 static PyObject *cutest_sgrad(PyObject *self, PyObject *args) {
     PyArrayObject *arg1, *Mgi, *Mgv;
-    doublereal *x, *sv;
+    doublereal *x;
     int index;
-    npy_int *si;
-    npy_int icon, nnzg;
+    npy_integer icon, nnzg;
+    npy_intp dims[1];
 
     if (!check_setup())
         return NULL;
@@ -1540,15 +2101,15 @@ static PyObject *cutest_sgrad(PyObject *self, PyObject *args) {
     }
 
     x=(npy_double *)PyArray_DATA(arg1);
-    si=(npy_int *)malloc(CUTEst_nvar*sizeof(npy_int));
-    sv=(npy_double *)malloc(CUTEst_nvar*sizeof(npy_double));
-
-    CUTEST_cisgr((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&icon, x, (integer *)&nnzg, (integer *)&CUTEst_nvar, sv, (integer *)si);
+    dims[0]=CUTEst_nvar;
+    Mgi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+    Mgv=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
 
-    extract_sparse_gradient(nnzg, si, sv, (PyArrayObject **)&Mgi, (PyArrayObject **)&Mgv);
+    CUTEST_CALL(CUTEST_cisgr((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&icon, x, (integer *)&nnzg, (integer *)&CUTEst_nvar,
+            (npy_double *)PyArray_DATA(Mgv), (integer *)PyArray_DATA(Mgi)));
 
-    free(si);
-    free(sv);
+    if (!finish_sparse_gradient(nnzg, Mgi, Mgv))
+        return NULL;
 
     return Py_BuildValue("NN", Mgi, Mgv);
 }
@@ -1588,16 +2149,16 @@ PyDoc_STRVAR(cutest_scons_doc,
 
 static PyObject *cutest_scons(PyObject *self, PyObject *args) {
     PyArrayObject *arg1, *Mc, *MJi, *MJfi, *MJv, *Mgi, *Mgv;
-    doublereal *c, *Jv, *gv, *x, *sv;
-    npy_int *Ji, *Jfi, *gi, *si;
-    npy_int index, nnzsgc, lj;
-    int i;
+    doublereal *c, *Jv, *gv, *x;
+    npy_integer *Ji, *Jfi, *gi;
+    npy_integer index, nnzsgc, lj, i;
+    int icon;
     npy_intp dims[1];
 
     if (!check_setup())
         return NULL;
 
-    if (!PyArg_ParseTuple(args, "O|i", &arg1, &i))
+    if (!PyArg_ParseTuple(args, "O|i", &arg1, &icon))
         return NULL;
 
     /* Check if x is double and of correct dimension */
@@ -1607,29 +2168,29 @@ static PyObject *cutest_scons(PyObject *self, PyObject *args) {
     }
 
     if (PyObject_Length(args)==2) {
-        if (i<0 || i>=CUTEst_ncon) {
+        if (icon<0 || icon>=CUTEst_ncon) {
             PyErr_SetString(PyExc_Exception, "Argument 2 must be an integer between 0 and ncon-1");
             return NULL;
         }
-        index=i+1;
+        index=icon+1;
     }
 
     if (PyObject_Length(args)==1) {
         x=(npy_double *)PyArray_DATA(arg1);
         dims[0]=CUTEst_nnzj;
-        MJi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INT);
-        MJfi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INT);
+        MJi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+        MJfi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
         MJv=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
-        Ji=(npy_int *)PyArray_DATA(MJi);
-        Jfi=(npy_int *)PyArray_DATA(MJfi);
+        Ji=(npy_integer *)PyArray_DATA(MJi);
+        Jfi=(npy_integer *)PyArray_DATA(MJfi);
         Jv=(npy_double *)PyArray_DATA(MJv);
         dims[0]=CUTEst_ncon;
         Mc=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
         c=(npy_double *)PyArray_DATA(Mc);
         lj=CUTEst_nnzj;
 
-        CUTEST_ccfsg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, c, (integer *)&CUTEst_nnzj,
-              (integer *)&lj, Jv, (integer *)Ji, (integer *)Jfi, &somethingTrue);
+        CUTEST_CALL(CUTEST_ccfsg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, c, (integer *)&CUTEst_nnzj,
+              (integer *)&lj, Jv, (integer *)Ji, (integer *)Jfi, &somethingTrue));
 
         /* Convert FORTRAN indices to C indices */
         for(i=0;i<CUTEst_nnzj;i++) {
@@ -1640,26 +2201,23 @@ static PyObject *cutest_scons(PyObject *self, PyObject *args) {
         return Py_BuildValue("NNNN", Mc, MJi, MJfi, MJv);
     } else {
         x=(npy_double *)PyArray_DATA(arg1);
-        si=(npy_int *)malloc(CUTEst_nvar*sizeof(npy_int));
-        sv=(npy_double *)malloc(CUTEst_nvar*sizeof(npy_double));
         dims[0]=1;
         Mc=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
         c=(npy_double *)PyArray_DATA(Mc);
 
-        CUTEST_ccifsg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&index, x, c, (integer *)&nnzsgc, (integer *)&CUTEst_nvar, sv, (integer *)si, &somethingTrue);
-
-        /* Allocate and copy results, convert indices from FORTRAN to C, free storage */
-        dims[0]=nnzsgc;
-        Mgi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INT);
+        dims[0]=CUTEst_nvar;
+        Mgi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
         Mgv=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
-        gi=(npy_int *)PyArray_DATA(Mgi);
+        gi=(npy_integer *)PyArray_DATA(Mgi);
         gv=(npy_double *)PyArray_DATA(Mgv);
-        for (i=0;i<nnzsgc;i++) {
-            gi[i]=si[i]-1;
-            gv[i]=sv[i];
+
+        CUTEST_CALL(CUTEST_ccifsg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&index, x, c, (integer *)&nnzsgc, (integer *)&CUTEst_nvar, gv, (integer *)gi, &somethingTrue));
+
+        /* Convert indices from FORTRAN to C */
+        if (!finish_sparse_gradient(nnzsgc, Mgi, Mgv)) {
+            Py_DECREF(Mc);
+            return NULL;
         }
-        free(si);
-        free(sv);
 
         return Py_BuildValue("NNN", Mc, Mgi, Mgv);
     }
@@ -1697,9 +2255,9 @@ PyDoc_STRVAR(cutest_slagjac_doc,
 
 static PyObject *cutest_slagjac(PyObject *self, PyObject *args) {
     PyArrayObject *arg1, *arg2, *Mgi, *Mgv, *MJi, *MJfi, *MJv;
-    doublereal *x, *v=NULL, *sv;
-    npy_int *si, *sfi;
-    npy_int nnzjplusn, nnzjplusno;
+    doublereal *x, *v=NULL;
+    npy_integer nnzjplusn, nnzjplusno;
+    npy_intp dims[1];
     int lagrangian;
 
     if (!check_setup())
@@ -1730,25 +2288,22 @@ static PyObject *cutest_slagjac(PyObject *self, PyObject *args) {
     if (lagrangian)
         v=(npy_double *)PyArray_DATA(arg2);
     nnzjplusn=CUTEst_nnzj+CUTEst_nvar;
-    si=(npy_int *)malloc(nnzjplusn*sizeof(npy_int));
-    sfi=(npy_int *)malloc(nnzjplusn*sizeof(npy_int));
-    sv=(npy_double *)malloc(nnzjplusn*sizeof(npy_double));
+    dims[0]=nnzjplusn;
+    MJi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+    MJfi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+    MJv=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
 
     /* Must use different variable for output NNZJ and input LCJAC */
     if (!lagrangian) {
-        CUTEST_csgr((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, NULL, &somethingFalse,
-                (integer *)&nnzjplusno, (integer *)&nnzjplusn, sv, (integer *)si, (integer *)sfi);
+        CUTEST_CALL(CUTEST_csgr((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, NULL, &somethingFalse,
+                (integer *)&nnzjplusno, (integer *)&nnzjplusn, (npy_double *)PyArray_DATA(MJv), (integer *)PyArray_DATA(MJi), (integer *)PyArray_DATA(MJfi)));
     } else {
-        CUTEST_csgr((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, &somethingTrue,
-                (integer *)&nnzjplusno, (integer *)&nnzjplusn, sv, (integer *)si, (integer *)sfi);
+        CUTEST_CALL(CUTEST_csgr((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, &somethingTrue,
+                (integer *)&nnzjplusno, (integer *)&nnzjplusn, (npy_double *)PyArray_DATA(MJv), (integer *)PyArray_DATA(MJi), (integer *)PyArray_DATA(MJfi)));
     }
 
-    extract_sparse_gradient_jacobian(nnzjplusno, si, sfi, sv, (PyArrayObject **)&Mgi, (PyArrayObject **)&Mgv, (PyArrayObject **)&MJi, (PyArrayObject **)&MJfi, (PyArrayObject **)&MJv);
-
-    /* Free temporary storage */
-    free(si);
-    free(sfi);
-    free(sv);
+    if (!finish_sparse_gradient_jacobian(nnzjplusno, MJi, MJfi, MJv, (PyArrayObject **)&Mgi, (PyArrayObject **)&Mgv))
+        return NULL;
 
     return Py_BuildValue("NNNNN", Mgi, Mgv, MJi, MJfi, MJv);
 }
@@ -1764,6 +2319,7 @@ PyDoc_STRVAR(cutest_sphess_doc,
 "Input\n"
 "x -- 1D array of length n with the values of variables\n"
 "v -- 1D array of length m with the values of Lagrange multipliers\n"
+"upper -- keyword argument, if True only the upper triangle of the Hessian is returned\n"
 "\n"
 "Output\n"
 "Hi -- 1D array of integers holding the row indices (0 .. n-1)\n"
@@ -1783,16 +2339,18 @@ PyDoc_STRVAR(cutest_sphess_doc,
 "CUTEst tools used: CUTEST_csh, CUTEST_ush\n"
 );
 
-static PyObject *cutest_sphess(PyObject *self, PyObject *args) {
+static PyObject *cutest_sphess(PyObject *self, PyObject *args, PyObject *kwargs) {
     PyArrayObject *arg1, *arg2, *MHi, *MHj, *MHv;
-    doublereal *x, *v=NULL, *sv;
-    npy_int *si, *sj, nnzho;
+    doublereal *x, *v=NULL;
+    npy_integer nnzho;
+    int upper=0;
+    static char *kwlist[] = {"", "", "upper", NULL};
 
     if (!check_setup())
         return NULL;
 
     arg2=NULL;
-    if (!PyArg_ParseTuple(args, "O|O", &arg1, &arg2))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O$p", kwlist, &arg1, &arg2, &upper))
         return NULL;
 
     /* Check if x is double and of correct dimension */
@@ -1817,24 +2375,18 @@ static PyObject *cutest_sphess(PyObject *self, PyObject *args) {
     x=(npy_double *)PyArray_DATA(arg1);
     if (CUTEst_ncon>0)
         v=(npy_double *)PyArray_DATA(arg2);
-    si=(npy_int *)malloc(CUTEst_nnzh*sizeof(npy_int));
-    sj=(npy_int *)malloc(CUTEst_nnzh*sizeof(npy_int));
-    sv=(npy_double *)malloc(CUTEst_nnzh*sizeof(npy_double));
+    new_sparse_hessian(upper, &MHi, &MHj, &MHv);
 
     if (CUTEst_ncon>0) {
-        CUTEST_csh((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, (integer *)&nnzho, (integer *)&CUTEst_nnzh,
-            sv, (integer *)si, (integer *)sj);
+        CUTEST_CALL(CUTEST_csh((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, (integer *)&nnzho, (integer *)&CUTEst_nnzh,
+            (npy_double *)PyArray_DATA(MHv), (integer *)PyArray_DATA(MHi), (integer *)PyArray_DATA(MHj)));
     } else {
-        CUTEST_ush((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&nnzho, (integer *)&CUTEst_nnzh,
-            sv, (integer *)si, (integer *)sj);
+        CUTEST_CALL(CUTEST_ush((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&nnzho, (integer *)&CUTEst_nnzh,
+            (npy_double *)PyArray_DATA(MHv), (integer *)PyArray_DATA(MHi), (integer *)PyArray_DATA(MHj)));
     }
 
-    extract_sparse_hessian(nnzho, si, sj, sv, (PyArrayObject **)&MHi, (PyArrayObject **)&MHj, (PyArrayObject **)&MHv);
-
-    /* Free temporary storage */
-    free(si);
-    free(sj);
-    free(sv);
+    if (!finish_sparse_hessian(nnzho, upper, MHi, MHj, MHv))
+        return NULL;
 
     return Py_BuildValue("NNN", MHi, MHj, MHv);
 }
@@ -1850,6 +2402,7 @@ PyDoc_STRVAR(cutest_isphess_doc,
 "Input\n"
 "x -- 1D array of length n with the values of variables\n"
 "i -- integer holding the index of constraint (between 0 and m-1)\n"
+"upper -- keyword argument, if True only the upper triangle of the Hessian is returned\n"
 "\n"
 "Output\n"
 "Hi -- 1D array of integers holding the row indices (0 .. n-1)\n"
@@ -1868,16 +2421,18 @@ PyDoc_STRVAR(cutest_isphess_doc,
 "CUTEst tools used: CUTEST_cish, CUTEST_ush\n"
 );
 
-static PyObject *cutest_isphess(PyObject *self, PyObject *args) {
+static PyObject *cutest_isphess(PyObject *self, PyObject *args, PyObject *kwargs) {
     PyArrayObject *arg1, *MHi, *MHj, *MHv;
-    doublereal *x, *sv;
-    npy_int *si, *sj, nnzho, i;
-    npy_int icon;
+    doublereal *x;
+    npy_integer nnzho;
+    npy_integer icon;
+    int i, upper=0;
+    static char *kwlist[] = {"", "", "upper", NULL};
 
     if (!check_setup())
         return NULL;
 
-    if (!PyArg_ParseTuple(args, "O|i", &arg1, &i))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|i$p", kwlist, &arg1, &i, &upper))
         return NULL;
 
     if (PyObject_Length(args)>1) {
@@ -1897,22 +2452,18 @@ static PyObject *cutest_isphess(PyObject *self, PyObject *args) {
     }
 
     x=(npy_double *)PyArray_DATA(arg1);
-    si=(npy_int *)malloc(CUTEst_nnzh*sizeof(npy_int));
-    sj=(npy_int *)malloc(CUTEst_nnzh*sizeof(npy_int));
-    sv=(npy_double *)malloc(CUTEst_nnzh*sizeof(npy_double));
+    new_sparse_hessian(upper, &MHi, &MHj, &MHv);
 
     if (CUTEst_ncon>0) {
-        CUTEST_cish((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&icon, (integer *)&nnzho, (integer *)&CUTEst_nnzh, sv, (integer *)si, (integer *)sj);
+        CUTEST_CALL(CUTEST_cish((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&icon, (integer *)&nnzho, (integer *)&CUTEst_nnzh,
+            (npy_double *)PyArray_DATA(MHv), (integer *)PyArray_DATA(MHi), (integer *)PyArray_DATA(MHj)));
     } else {
-        CUTEST_ush((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&nnzho, (integer *)&CUTEst_nnzh, sv, (integer *)si, (integer *)sj);
+        CUTEST_CALL(CUTEST_ush((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&nnzho, (integer *)&CUTEst_nnzh,
+            (npy_double *)PyArray_DATA(MHv), (integer *)PyArray_DATA(MHi), (integer *)PyArray_DATA(MHj)));
     }
 
-    extract_sparse_hessian(nnzho, si, sj, sv, (PyArrayObject **)&MHi, (PyArrayObject **)&MHj, (PyArrayObject **)&MHv);
-
-    /* Free temporary storage */
-    free(si);
-    free(sj);
-    free(sv);
+    if (!finish_sparse_hessian(nnzho, upper, MHi, MHj, MHv))
+        return NULL;
 
     return Py_BuildValue("NNN", MHi, MHj, MHv);
 }
@@ -1931,6 +2482,7 @@ PyDoc_STRVAR(cutest_gradsphess_doc,
 "v     -- 1D array of length m holding the values of Lagrange multipliers\n"
 "gradl -- boolean flag. If False the gradient of the objective is returned, \n"
 "         if True the gradient of the Lagrangian is returned. Default is False.\n"
+"upper -- keyword argument, if True only the upper triangle of the Hessian is returned\n"
 "\n"
 "Output\n"
 "g   -- 1D array of length n with the gradient of objective or Lagrangian\n"
@@ -1962,20 +2514,22 @@ PyDoc_STRVAR(cutest_gradsphess_doc,
 "CUTEst tools used: CUTEST_csgrsh, CUTEST_ugrsh\n"
 );
 
-static PyObject *cutest_gradsphess(PyObject *self, PyObject *args) {
+static PyObject *cutest_gradsphess(PyObject *self, PyObject *args, PyObject *kwargs) {
     PyArrayObject *arg1, *arg2, *Mg=NULL, *Mgi, *Mgv, *MJi, *MJfi, *MJv, *MHi, *MHj, *MHv;
     PyObject *arg3;
-    doublereal *x, *v, *g, *sv, *sjv;
-    npy_int lagrangian;
-    npy_int *si, *sj, *sji, *sjfi, nnzho, nnzjplusn, nnzjplusno;
+    doublereal *x, *v, *g, *Jv, *Hv;
+    npy_integer lagrangian;
+    npy_integer *Ji, *Jfi, *Hi, *Hj, nnzho, nnzjplusn, nnzjplusno;
     npy_intp dims[1];
+    int upper=0;
+    static char *kwlist[] = {"", "", "", "upper", NULL};
 
     if (!check_setup())
         return NULL;
 
     arg2=NULL;
     arg3=NULL;
-    if (!PyArg_ParseTuple(args, "O|OO", &arg1, &arg2, &arg3))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|OO$p", kwlist, &arg1, &arg2, &arg3, &upper))
         return NULL;
 
     /* Check bool argument */
@@ -2005,47 +2559,58 @@ static PyObject *cutest_gradsphess(PyObject *self, PyObject *args) {
     }
 
     x=(npy_double *)PyArray_DATA(arg1);
-    si=(npy_int *)malloc(CUTEst_nnzh*sizeof(npy_int));
-    sj=(npy_int *)malloc(CUTEst_nnzh*sizeof(npy_int));
-    sv=(npy_double *)malloc(CUTEst_nnzh*sizeof(npy_double));
+    new_sparse_hessian(upper, &MHi, &MHj, &MHv);
+    Hi=(npy_integer *)PyArray_DATA(MHi);
+    Hj=(npy_integer *)PyArray_DATA(MHj);
+    Hv=(npy_double *)PyArray_DATA(MHv);
 
     if (CUTEst_ncon>0) {
         v=(npy_double *)PyArray_DATA(arg2);
         nnzjplusn=CUTEst_nnzj+CUTEst_nvar;
-        sji=(npy_int *)malloc(nnzjplusn*sizeof(npy_int));
-        sjfi=(npy_int *)malloc(nnzjplusn*sizeof(npy_int));
-        sjv=(npy_double *)malloc(nnzjplusn*sizeof(npy_double));
+        dims[0]=nnzjplusn;
+        MJi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+        MJfi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+        MJv=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
+        Ji=(npy_integer *)PyArray_DATA(MJi);
+        Jfi=(npy_integer *)PyArray_DATA(MJfi);
+        Jv=(npy_double *)PyArray_DATA(MJv);
 
         if (lagrangian) {
-            CUTEST_csgrsh((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, &somethingTrue,
-                    (integer *)&nnzjplusno, (integer *)&nnzjplusn, sjv, (integer *)sji, (integer *)sjfi,
-                    (integer *)&nnzho, (integer *)&CUTEst_nnzh, sv, (integer *)si, (integer *)sj);
+            CUTEST_CALL(CUTEST_csgrsh((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, &somethingTrue,
+                    (integer *)&nnzjplusno, (integer *)&nnzjplusn, Jv, (integer *)Ji, (integer *)Jfi,
+                    (integer *)&nnzho, (integer *)&CUTEst_nnzh, Hv, (integer *)Hi, (integer *)Hj));
         } else {
-            CUTEST_csgrsh((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, &somethingFalse,
-                    (integer *)&nnzjplusno, (integer *)&nnzjplusn, sjv, (integer *)sji, (integer *)sjfi,
-                    (integer *)&nnzho, (integer *)&CUTEst_nnzh, sv, (integer *)si, (integer *)sj);
+            CUTEST_CALL(CUTEST_csgrsh((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, &somethingFalse,
+                    (integer *)&nnzjplusno, (integer *)&nnzjplusn, Jv, (integer *)Ji, (integer *)Jfi,
+                    (integer *)&nnzho, (integer *)&CUTEst_nnzh, Hv, (integer *)Hi, (integer *)Hj));
         }
 
-        extract_sparse_gradient_jacobian(nnzjplusno, sji, sjfi, sjv, (PyArrayObject **)&Mgi, (PyArrayObject **)&Mgv, (PyArrayObject **)&MJi, (PyArrayObject **)&MJfi, (PyArrayObject **)&MJv);
-
-        /* Free temporary storage - Jacobian */
-        free(sji);
-        free(sjfi);
-        free(sjv);
+        if (!finish_sparse_gradient_jacobian(nnzjplusno, MJi, MJfi, MJv, (PyArrayObject **)&Mgi, (PyArrayObject **)&Mgv)) {
+            Py_DECREF(MHi);
+            Py_DECREF(MHj);
+            Py_DECREF(MHv);
+            return NULL;
+        }
+        if (!finish_sparse_hessian(nnzho, upper, MHi, MHj, MHv)) {
+            Py_DECREF(Mgi);
+            Py_DECREF(Mgv);
+            Py_DECREF(MJi);
+            Py_DECREF(MJfi);
+            Py_DECREF(MJv);
+            return NULL;
+        }
     } else {
         dims[0]=CUTEst_nvar;
         Mg=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
         g=(npy_double *)PyArray_DATA(Mg);
 
-        CUTEST_ugrsh((integer *)&status, (integer *)&CUTEst_nvar, x, g, (integer *)&nnzho, (integer *)&CUTEst_nnzh, sv, (integer *)si, (integer *)sj);
-    }
-
-    extract_sparse_hessian(nnzho, si, sj, sv, (PyArrayObject **)&MHi, (PyArrayObject **)&MHj, (PyArrayObject **)&MHv);
+        CUTEST_CALL(CUTEST_ugrsh((integer *)&status, (integer *)&CUTEst_nvar, x, g, (integer *)&nnzho, (integer *)&CUTEst_nnzh, Hv, (integer *)Hi, (integer *)Hj));
 
-    /* Free temporary storage - Hessian */
-    free(si);
-    free(sj);
-    free(sv);
+        if (!finish_sparse_hessian(nnzho, upper, MHi, MHj, MHv)) {
+            Py_DECREF(Mg);
+            return NULL;
+        }
+    }
 
     if (CUTEst_ncon>0) {
         return Py_BuildValue("NNNNNNNN", Mgi, Mgv, MJi, MJfi, MJv, MHi, MHj, MHv);
@@ -2055,6 +2620,281 @@ static PyObject *cutest_gradsphess(PyObject *self, PyObject *args) {
 }
 
 
+PyDoc_STRVAR(cutest_jacobian_structure_doc,
+"Returns the sparsity pattern of the Jacobian of constraints.\n"
+"\n"
+"(Jvi, Jfi)=jacobian_structure()\n"
+"\n"
+"Output\n"
+"Jvi -- 1D array of length nnzj holding the column indices (0 .. n-1)\n"
+"       of nozero elements in sparse Jacobian of constraints\n"
+"Jfi -- 1D array of length nnzj holding the row indices (0 .. m-1)\n"
+"       of nozero elements in sparse Jacobian of constraints\n"
+"\n"
+"The elements are in the same order as the values returned by scons_values().\n"
+"Works only for constrained problems.\n"
+"\n"
+"This function is not supposed to be called by the user. It is called by the\n"
+"wrapper function jacobian_structure().\n"
+"\n"
+"CUTEst tools used: CUTEST_csjp\n"
+);
+
+static PyObject *cutest_jacobian_structure(PyObject *self, PyObject *args) {
+    PyArrayObject *MJi, *MJfi;
+    npy_integer *Ji, *Jfi, nnzjo, i;
+    npy_intp dims[1];
+
+    if (!check_setup())
+        return NULL;
+
+    if (PyObject_Length(args)!=0) {
+        PyErr_SetString(PyExc_Exception, "jacobian_structure() takes no arguments");
+        return NULL;
+    }
+
+    if (CUTEst_ncon==0) {
+        PyErr_SetString(PyExc_Exception, "jacobian_structure() works only for constrained problems");
+        return NULL;
+    }
+
+    dims[0]=CUTEst_nnzj;
+    MJi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+    MJfi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+    Ji=(npy_integer *)PyArray_DATA(MJi);
+    Jfi=(npy_integer *)PyArray_DATA(MJfi);
+
+    CUTEST_CALL(CUTEST_csjp((integer *)&status, (integer *)&nnzjo, (integer *)&CUTEst_nnzj, (integer *)Ji, (integer *)Jfi));
+
+    /* Convert FORTRAN indices to C indices */
+    for(i=0;i<CUTEst_nnzj;i++) {
+        Ji[i]--;
+        Jfi[i]--;
+    }
+
+    return Py_BuildValue("NN", MJi, MJfi);
+}
+
+
+PyDoc_STRVAR(cutest_hessian_structure_doc,
+"Returns the sparsity pattern of the upper triangle of the Hessian of the\n"
+"objective (unconstrained problems) or the Lagrangian (constrained problems).\n"
+"\n"
+"(Hi, Hj)=hessian_structure()\n"
+"\n"
+"Output\n"
+"Hi -- 1D array of length nnzh holding the row indices (0 .. n-1)\n"
+"      of nozero elements in the upper triangle of the sparse Hessian\n"
+"Hj -- 1D array of length nnzh holding the column indices (0 .. n-1)\n"
+"      of nozero elements in the upper triangle of the sparse Hessian\n"
+"\n"
+"Hi[k]<=Hj[k] for all elements. The elements are in the same order as the\n"
+"values returned by sphess_values().\n"
+"\n"
+"This function is not supposed to be called by the user. It is called by the\n"
+"wrapper function hessian_structure().\n"
+"\n"
+"CUTEst tools used: CUTEST_cshp, CUTEST_ushp\n"
+);
+
+static PyObject *cutest_hessian_structure(PyObject *self, PyObject *args) {
+    PyArrayObject *MHi, *MHj;
+    npy_integer *Hi, *Hj, nnzho, tmp, i;
+    npy_intp dims[1];
+
+    if (!check_setup())
+        return NULL;
+
+    if (PyObject_Length(args)!=0) {
+        PyErr_SetString(PyExc_Exception, "hessian_structure() takes no arguments");
+        return NULL;
+    }
+
+    dims[0]=CUTEst_nnzh;
+    MHi=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+    MHj=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+    Hi=(npy_integer *)PyArray_DATA(MHi);
+    Hj=(npy_integer *)PyArray_DATA(MHj);
+
+    if (CUTEst_ncon>0) {
+        CUTEST_CALL(CUTEST_cshp((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&nnzho, (integer *)&CUTEst_nnzh, (integer *)Hi, (integer *)Hj));
+    } else {
+        CUTEST_CALL(CUTEST_ushp((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&nnzho, (integer *)&CUTEst_nnzh, (integer *)Hi, (integer *)Hj));
+    }
+
+    /* Convert FORTRAN indices to C indices, move elements below the diagonal to the upper triangle */
+    for(i=0;i<CUTEst_nnzh;i++) {
+        if (Hi[i]>Hj[i]) {
+            tmp=Hi[i];
+            Hi[i]=Hj[i];
+            Hj[i]=tmp;
+        }
+        Hi[i]--;
+        Hj[i]--;
+    }
+
+    return Py_BuildValue("NN", MHi, MHj);
+}
+
+
+PyDoc_STRVAR(cutest_scons_values_doc,
+"Returns the values of constraints and the values of the nonzero elements\n"
+"of the sparse Jacobian of constraints at x.\n"
+"\n"
+"(c, Jv)=scons_values(x)\n"
+"\n"
+"Input\n"
+"x   -- 1D array of length n with the values of variables\n"
+"out -- keyword argument, 1D array of length nnzj to store Jv in (optional)\n"
+"\n"
+"Output\n"
+"c  -- 1D array of length m holding the values of constraints at x\n"
+"Jv -- 1D array of length nnzj holding the values of nonzero elements in the\n"
+"      sparse Jacobian of constraints at x, in the order given by\n"
+"      jacobian_structure()\n"
+"\n"
+"This function is not supposed to be called by the user. It is called by the\n"
+"wrapper function scons_values().\n"
+"\n"
+"CUTEst tools used: CUTEST_ccfsg\n"
+);
+
+static PyObject *cutest_scons_values(PyObject *self, PyObject *args, PyObject *kwargs) {
+    PyArrayObject *arg1, *Mc, *MJv;
+    PyObject *out=NULL;
+    doublereal *x, *c, *Jv;
+    npy_integer nnzjo;
+    npy_intp dims[1];
+    int allocated;
+    static char *kwlist[] = {"", "out", NULL};
+
+    if (!check_setup())
+        return NULL;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O$O", kwlist, &arg1, &out))
+        return NULL;
+
+    /* Check if x is double and of correct dimension */
+    if (!(PyArray_Check(arg1) && PyArray_ISFLOAT(arg1) && PyArray_TYPE(arg1)==NPY_DOUBLE && PyArray_NDIM(arg1)==1 && PyArray_DIM(arg1, 0)==CUTEst_nvar)) {
+        PyErr_SetString(PyExc_Exception, "Argument 1 must be a 1D double array of length nvar");
+        return NULL;
+    }
+
+    if (CUTEst_ncon==0) {
+        PyErr_SetString(PyExc_Exception, "scons_values() works only for constrained problems");
+        return NULL;
+    }
+
+    x=(npy_double *)PyArray_DATA(arg1);
+    dims[0]=CUTEst_nnzj;
+    if ((MJv=output_array(out, 1, dims, 0))==NULL)
+        return NULL;
+    Jv=(npy_double *)PyArray_DATA(MJv);
+    dims[0]=CUTEst_ncon;
+    Mc=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
+    c=(npy_double *)PyArray_DATA(Mc);
+
+    /* The indices are not needed (see jacobian_structure()), they are written to the scratch buffers */
+    CUTEST_CALL(
+        if ((allocated=alloc_workspace(&workJi, &workJfi, CUTEst_nnzj)))
+            CUTEST_ccfsg((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, c, (integer *)&nnzjo,
+                (integer *)&CUTEst_nnzj, Jv, (integer *)workJi, (integer *)workJfi, &somethingTrue));
+    if (!allocated) {
+        Py_DECREF(Mc);
+        Py_DECREF(MJv);
+        return PyErr_NoMemory();
+    }
+
+    return Py_BuildValue("NN", Mc, MJv);
+}
+
+
+PyDoc_STRVAR(cutest_sphess_values_doc,
+"Returns the values of the nonzero elements in the upper triangle of the\n"
+"sparse Hessian of the objective at x (unconstrained problems) or the sparse\n"
+"Hessian of the Lagrangian (constrained problems) at (x, v).\n"
+"\n"
+"Hv=sphess_values(x)    -- Hessian of objective (unconstrained problems)\n"
+"Hv=sphess_values(x, v) -- Hessian of Lagrangian (constrained problems)\n"
+"\n"
+"Input\n"
+"x   -- 1D array of length n with the values of variables\n"
+"v   -- 1D array of length m with the values of Lagrange multipliers\n"
+"out -- keyword argument, 1D array of length nnzh to store Hv in (optional)\n"
+"\n"
+"Output\n"
+"Hv -- 1D array of length nnzh holding the values of nonzero elements in the\n"
+"      upper triangle of the sparse Hessian, in the order given by\n"
+"      hessian_structure()\n"
+"\n"
+"This function is not supposed to be called by the user. It is called by the\n"
+"wrapper function sphess_values().\n"
+"\n"
+"CUTEst tools used: CUTEST_csh, CUTEST_ush\n"
+);
+
+static PyObject *cutest_sphess_values(PyObject *self, PyObject *args, PyObject *kwargs) {
+    PyArrayObject *arg1, *arg2, *MHv;
+    PyObject *out=NULL;
+    doublereal *x, *v=NULL, *Hv;
+    npy_integer nnzho;
+    npy_intp dims[1];
+    int allocated;
+    static char *kwlist[] = {"", "", "out", NULL};
+
+    if (!check_setup())
+        return NULL;
+
+    arg2=NULL;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O$O", kwlist, &arg1, &arg2, &out))
+        return NULL;
+
+    /* Check if x is double and of correct dimension */
+    if (!(PyArray_Check(arg1) && PyArray_ISFLOAT(arg1) && PyArray_TYPE(arg1)==NPY_DOUBLE && PyArray_NDIM(arg1)==1 && PyArray_DIM(arg1, 0)==CUTEst_nvar)) {
+        PyErr_SetString(PyExc_Exception, "Argument 1 must be a 1D double array of length nvar");
+        return NULL;
+    }
+
+    if (CUTEst_ncon>0) {
+        /* Check if v is double and of correct dimension */
+        if (arg2!=NULL) {
+            if (!(PyArray_Check(arg2) && PyArray_ISFLOAT(arg2) && PyArray_TYPE(arg2)==NPY_DOUBLE && PyArray_NDIM(arg2)==1 && PyArray_DIM(arg2, 0)==CUTEst_ncon)) {
+                PyErr_SetString(PyExc_Exception, "Argument 2 must be a 1D double array of length ncon");
+                return NULL;
+            }
+        } else {
+            PyErr_SetString(PyExc_Exception, "Argument 2 must be specified for constrained problems.");
+            return NULL;
+        }
+    }
+
+    x=(npy_double *)PyArray_DATA(arg1);
+    if (CUTEst_ncon>0)
+        v=(npy_double *)PyArray_DATA(arg2);
+    dims[0]=CUTEst_nnzh;
+    if ((MHv=output_array(out, 1, dims, 0))==NULL)
+        return NULL;
+    Hv=(npy_double *)PyArray_DATA(MHv);
+
+    /* The indices are not needed (see hessian_structure()), they are written to the scratch buffers */
+    CUTEST_CALL(
+        if ((allocated=alloc_workspace(&workHi, &workHj, CUTEst_nnzh))) {
+            if (CUTEst_ncon>0)
+                CUTEST_csh((integer *)&status, (integer *)&CUTEst_nvar, (integer *)&CUTEst_ncon, x, v, (integer *)&nnzho, (integer *)&CUTEst_nnzh,
+                    Hv, (integer *)workHi, (integer *)workHj);
+            else
+                CUTEST_ush((integer *)&status, (integer *)&CUTEst_nvar, x, (integer *)&nnzho, (integer *)&CUTEst_nnzh,
+                    Hv, (integer *)workHi, (integer *)workHj);
+        });
+    if (!allocated) {
+        Py_DECREF(MHv);
+        return PyErr_NoMemory();
+    }
+
+    return (PyObject *)MHv;
+}
+
+
 PyDoc_STRVAR(cutest_report_doc,
 "Reports usage statistics.\n"
 "\n"
@@ -2092,9 +2932,9 @@ static PyObject *cutest_report(PyObject *self, PyObject *args) {
     }
 
     if (CUTEst_ncon>0)
-        CUTEST_creport((integer *)&status, calls, time);
+        CUTEST_CALL(CUTEST_creport((integer *)&status, calls, time));
     else
-        CUTEST_ureport((integer *)&status, calls, time);
+        CUTEST_CALL(CUTEST_ureport((integer *)&status, calls, time));
 
     dict=PyDict_New();
     PyDict_SetItemString(dict, "f", PyLong_FromLong((long)(calls[0])));
@@ -2131,10 +2971,13 @@ static PyObject *cutest_terminate(PyObject *self, PyObject *args) {
         return NULL;
     }
 
-    if (CUTEst_ncon>0)
-        CUTEST_cterminate((integer *)&status);
-    else
-        CUTEST_uterminate((integer *)&status);
+    /* Free the scratch buffers along with the CUTEst workspace, so no evaluation can be using them */
+    CUTEST_CALL(
+        if (CUTEst_ncon>0)
+            CUTEST_cterminate((integer *)&status);
+        else
+            CUTEST_uterminate((integer *)&status);
+        free_workspace());
 
     /* Problem is no longer set up */
     setupCalled = 0;
@@ -2145,8 +2988,112 @@ static PyObject *cutest_terminate(PyObject *self, PyObject *args) {
 }
 
 
+PyDoc_STRVAR(cutest_compress_doc,
+"Converts a sparse matrix from coordinate (triplet) format to compressed format.\n"
+"\n"
+"(ptr, ind, val)=compress(major, minor, values, nmajor)\n"
+"\n"
+"Rows are used as major indices for the compressed sparse row (CSR) format,\n"
+"columns for the compressed sparse column (CSC) format.\n"
+"\n"
+"Input\n"
+"major  -- 1D integer array holding the major (row or column) index of each element\n"
+"minor  -- 1D integer array holding the minor (column or row) index of each element\n"
+"values -- 1D array holding the value of each element\n"
+"nmajor -- number of rows (or columns)\n"
+"\n"
+"Output\n"
+"ptr -- 1D integer array of length nmajor+1, elements of row (column) i are\n"
+"       ind[ptr[i]:ptr[i+1]] and val[ptr[i]:ptr[i+1]]\n"
+"ind -- 1D integer array holding the minor indices of the elements\n"
+"val -- 1D array holding the values of the elements\n"
+);
+
+static PyObject *cutest_compress(PyObject *self, PyObject *args) {
+    PyObject *arg1, *arg2, *arg3;
+    PyArrayObject *Mmajor, *Mminor, *Mvalues, *Mptr, *Mind, *Mval;
+    npy_integer *major, *minor, *ptr, *ind, *next;
+    npy_double *values, *val;
+    npy_intp dims[1];
+    npy_intp i, nnz;
+    int nmajor;
+
+    if (!PyArg_ParseTuple(args, "OOOi", &arg1, &arg2, &arg3, &nmajor))
+        return NULL;
+
+    Mmajor=(PyArrayObject *)PyArray_FROM_OTF(arg1, NPY_INTEGER, NPY_ARRAY_IN_ARRAY | NPY_ARRAY_FORCECAST);
+    Mminor=(PyArrayObject *)PyArray_FROM_OTF(arg2, NPY_INTEGER, NPY_ARRAY_IN_ARRAY | NPY_ARRAY_FORCECAST);
+    Mvalues=(PyArrayObject *)PyArray_FROM_OTF(arg3, NPY_DOUBLE, NPY_ARRAY_IN_ARRAY | NPY_ARRAY_FORCECAST);
+    if (Mmajor==NULL || Mminor==NULL || Mvalues==NULL) {
+        Py_XDECREF(Mmajor);
+        Py_XDECREF(Mminor);
+        Py_XDECREF(Mvalues);
+        return NULL;
+    }
+
+    nnz=PyArray_SIZE(Mmajor);
+    if (nmajor<0 || PyArray_NDIM(Mmajor)!=1 || PyArray_NDIM(Mminor)!=1 || PyArray_NDIM(Mvalues)!=1 ||
+            PyArray_SIZE(Mminor)!=nnz || PyArray_SIZE(Mvalues)!=nnz) {
+        PyErr_SetString(PyExc_Exception, "Arguments 1-3 must be 1D arrays of the same length");
+        goto fail;
+    }
+    major=(npy_integer *)PyArray_DATA(Mmajor);
+    minor=(npy_integer *)PyArray_DATA(Mminor);
+    values=(npy_double *)PyArray_DATA(Mvalues);
+    for(i=0;i<nnz;i++) {
+        if (major[i]<0 || major[i]>=nmajor) {
+            PyErr_SetString(PyExc_Exception, "Major index out of range");
+            goto fail;
+        }
+    }
+
+    dims[0]=nmajor+1;
+    Mptr=(PyArrayObject *)PyArray_ZEROS(1, dims, NPY_INTEGER, 0);
+    dims[0]=nnz;
+    Mind=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_INTEGER);
+    Mval=(PyArrayObject *)PyArray_SimpleNew(1, dims, NPY_DOUBLE);
+    ptr=(npy_integer *)PyArray_DATA(Mptr);
+    ind=(npy_integer *)PyArray_DATA(Mind);
+    val=(npy_double *)PyArray_DATA(Mval);
+
+    /* Count the elements of each row (column), then place each element at the next free
+       position of its row (column), keeping the order of the elements within a row (column). */
+    for(i=0;i<nnz;i++)
+        ptr[major[i]+1]++;
+    for(i=0;i<nmajor;i++)
+        ptr[i+1]+=ptr[i];
+    next=(npy_integer *)malloc((nmajor+1)*sizeof(npy_integer));
+    if (next==NULL) {
+        Py_DECREF(Mptr);
+        Py_DECREF(Mind);
+        Py_DECREF(Mval);
+        PyErr_NoMemory();
+        goto fail;
+    }
+    memcpy(next, ptr, (nmajor+1)*sizeof(npy_integer));
+    for(i=0;i<nnz;i++) {
+        ind[next[major[i]]]=minor[i];
+        val[next[major[i]]]=values[i];
+        next[major[i]]++;
+    }
+    free(next);
+
+    Py_DECREF(Mmajor);
+    Py_DECREF(Mminor);
+    Py_DECREF(Mvalues);
+    return Py_BuildValue("NNN", Mptr, Mind, Mval);
+
+fail:
+    Py_DECREF(Mmajor);
+    Py_DECREF(Mminor);
+    Py_DECREF(Mvalues);
+    return NULL;
+}
+
+
 /* Python Module */
 
+
 /* Module method table */
 static PyMethodDef _methods[] = {
     {"dims", cutest_dims, METH_VARARGS, cutest_dims_doc},
@@ -2154,25 +3101,35 @@ static PyMethodDef _methods[] = {
     {"varnames", cutest_varnames, METH_VARARGS, cutest_varnames_doc},
     {"connames", cutest_connames, METH_VARARGS, cutest_connames_doc},
     {"objcons", cutest_objcons, METH_VARARGS, cutest_objcons_doc},
-    {"obj", cutest_obj, METH_VARARGS, cutest_obj_doc},
-    {"grad", cutest_grad, METH_VARARGS, cutest_grad_doc},
-    {"cons", cutest_cons, METH_VARARGS, cutest_cons_doc},
+    {"objcons_batch", cutest_objcons_batch, METH_VARARGS, cutest_objcons_batch_doc},
+    {"obj", (PyCFunction)(void(*)(void))cutest_obj, METH_VARARGS | METH_KEYWORDS, cutest_obj_doc},
+    {"obj_batch", cutest_obj_batch, METH_VARARGS, cutest_obj_batch_doc},
+    {"grad", (PyCFunction)(void(*)(void))cutest_grad, METH_VARARGS | METH_KEYWORDS, cutest_grad_doc},
+    {"cons", (PyCFunction)(void(*)(void))cutest_cons, METH_VARARGS | METH_KEYWORDS, cutest_cons_doc},
+    {"cons_batch", cutest_cons_batch, METH_VARARGS, cutest_cons_batch_doc},
     {"lag", cutest_lag, METH_VARARGS, cutest_lag_doc},
     {"lagjac", cutest_lagjac, METH_VARARGS, cutest_lagjac_doc},
-    {"jprod", cutest_jprod, METH_VARARGS, cutest_jprod_doc},
-    {"hess", cutest_hess, METH_VARARGS, cutest_hess_doc},
-    {"ihess", cutest_ihess, METH_VARARGS, cutest_ihess_doc},
-    {"hprod", cutest_hprod, METH_VARARGS, cutest_hprod_doc},
+    {"jprod", (PyCFunction)(void(*)(void))cutest_jprod, METH_VARARGS | METH_KEYWORDS, cutest_jprod_doc},
+    {"jprod_many", cutest_jprod_many, METH_VARARGS, cutest_jprod_many_doc},
+    {"hess", (PyCFunction)(void(*)(void))cutest_hess, METH_VARARGS | METH_KEYWORDS, cutest_hess_doc},
+    {"ihess", (PyCFunction)(void(*)(void))cutest_ihess, METH_VARARGS | METH_KEYWORDS, cutest_ihess_doc},
+    {"hprod", (PyCFunction)(void(*)(void))cutest_hprod, METH_VARARGS | METH_KEYWORDS, cutest_hprod_doc},
+    {"hprod_many", cutest_hprod_many, METH_VARARGS, cutest_hprod_many_doc},
     {"gradhess", cutest_gradhess, METH_VARARGS, cutest_gradhess_doc},
     {"sobj", cutest_sobj, METH_VARARGS, cutest_sobj_doc},
     {"sgrad", cutest_sgrad, METH_VARARGS, cutest_sgrad_doc},
     {"scons", cutest_scons, METH_VARARGS, cutest_scons_doc},
     {"slagjac", cutest_slagjac, METH_VARARGS, cutest_slagjac_doc},
-    {"sphess", cutest_sphess, METH_VARARGS, cutest_sphess_doc},
-    {"isphess", cutest_isphess, METH_VARARGS, cutest_isphess_doc},
-    {"gradsphess", cutest_gradsphess, METH_VARARGS, cutest_gradsphess_doc},
+    {"sphess", (PyCFunction)(void(*)(void))cutest_sphess, METH_VARARGS | METH_KEYWORDS, cutest_sphess_doc},
+    {"isphess", (PyCFunction)(void(*)(void))cutest_isphess, METH_VARARGS | METH_KEYWORDS, cutest_isphess_doc},
+    {"gradsphess", (PyCFunction)(void(*)(void))cutest_gradsphess, METH_VARARGS | METH_KEYWORDS, cutest_gradsphess_doc},
+    {"jacobian_structure", cutest_jacobian_structure, METH_VARARGS, cutest_jacobian_structure_doc},
+    {"hessian_structure", cutest_hessian_structure, METH_VARARGS, cutest_hessian_structure_doc},
+    {"scons_values", (PyCFunction)(void(*)(void))cutest_scons_values, METH_VARARGS | METH_KEYWORDS, cutest_scons_values_doc},
+    {"sphess_values", (PyCFunction)(void(*)(void))cutest_sphess_values, METH_VARARGS | METH_KEYWORDS, cutest_sphess_values_doc},
     {"report", cutest_report, METH_VARARGS, cutest_report_doc},
     {"terminate", cutest_terminate, METH_VARARGS, cutest_terminate_doc},
+    {"compress", cutest_compress, METH_VARARGS, cutest_compress_doc},
     {NULL, NULL, 0, NULL}  /* Sentinel, marks the end of this structure */
 };
 
@@ -2189,6 +3146,9 @@ static struct PyModuleDef module = {
 /* Python module initialization */
 PyMODINIT_FUNC PyInit__pycutestitf(void) { // must be same as module name above
     import_array();  // for NumPy arrays
+    cutestLock = PyThread_allocate_lock();
+    if (cutestLock == NULL)
+        return PyErr_NoMemory();
     return PyModule_Create(&module);
 }
 """
@@ -0,0 +1,325 @@
+"""
+Cache statistics, compaction, eviction of least recently used problems, and export/import of cache bundles
+"""
+
+import os, shutil, sys
+import io
+import json
+import tarfile
+import sysconfig
+import time
+
+from .system_paths import get_cache_path
+from .build_interface import CACHE_SUBFOLDER, CORE_SUBFOLDER, MANIFEST_FILE, ACCESS_FILE, \
+    cache_entry_names, parse_cache_entry_name, compact_cache_entry, get_problem_directory, \
+    prepare_cache_holder, read_manifest, touch_cache_entry, cache_lock, get_build_directory, install_cache_entry
+from .install_scripts import get_core_key, get_interface_module_name, get_temp_suffix
+
+__all__ = ['cache_stats', 'prune_cache', 'compact_cache', 'export_cache', 'import_cache']
+
+# Description of the contents of a cache bundle (see export_cache), stored at the top of the archive
+BUNDLE_MANIFEST = 'pycutest_bundle.json'
+BUNDLE_FORMAT = 1
+
+
+def directory_size(path):
+    # Total size in bytes of all files below path (symbolic links are not followed)
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass  # removed while walking
+    return total
+
+
+def last_access(problemDir):
+    # Time a cache entry was last imported, or built if it has never been imported
+    for name in [ACCESS_FILE, MANIFEST_FILE]:
+        try:
+            return os.path.getmtime(os.path.join(problemDir, name))
+        except OSError:
+            continue
+    return os.path.getmtime(problemDir)
+
+
+def is_loaded(problemDir):
+    # A problem imported in this process keeps using its folder, so it must not be evicted
+    # (a module of the same name may have been imported from another cache)
+    module = sys.modules.get('%s.%s' % (CACHE_SUBFOLDER, os.path.basename(problemDir)))
+    moduleFile = getattr(module, '__file__', None)
+    if moduleFile is None:
+        return False
+    return os.path.realpath(os.path.dirname(moduleFile)) == os.path.realpath(problemDir)
+
+
+def cache_entries():
+    # Description of every problem folder in the cache, least recently used first
+    problem_loc = os.path.join(get_cache_path(), CACHE_SUBFOLDER)
+    entries = []
+    for dir in cache_entry_names():
+        problemDir = os.path.join(problem_loc, dir)
+        try:
+            problemName, sifParams = parse_cache_entry_name(dir)
+            entries.append({
+                'problemName': problemName,
+                'sifParams': sifParams,
+                'bytes': directory_size(problemDir),
+                'last_access': last_access(problemDir),
+                'loaded': is_loaded(problemDir),
+                'directory': problemDir,
+            })
+        except OSError:
+            continue  # removed while listing
+    entries.sort(key=lambda entry: entry['last_access'])
+    return entries
+
+
+def cache_stats():
+    """
+    Return statistics about the problems in the cache.
+
+    .. code-block:: python
+
+        stats = pycutest.cache_stats()
+        print('%d problems using %.1f MB' % (stats['num_problems'], stats['total_bytes'] / 1e6))
+
+    :return: dict with the cache location (``'path'``), number of cached problems (``'num_problems'``),
+        total size in bytes of the cache (``'total_bytes'``), size in bytes of the precompiled C interfaces (``'core_bytes'``),
+        and a list of all cached problems, least recently used first (``'entries'``). Each entry is a dict
+        with keys ``'problemName'``, ``'sifParams'``, ``'bytes'``, ``'last_access'`` (as a Unix timestamp),
+        ``'loaded'`` (imported in the current Python session) and ``'directory'``.
+    """
+    entries = cache_entries()
+    coreDir = os.path.join(get_cache_path(), CACHE_SUBFOLDER, CORE_SUBFOLDER)
+    core_bytes = directory_size(coreDir) if os.path.isdir(coreDir) else 0
+    return {
+        'path': os.path.join(get_cache_path(), CACHE_SUBFOLDER),
+        'num_problems': len(entries),
+        'total_bytes': sum([entry['bytes'] for entry in entries]) + core_bytes,
+        'core_bytes': core_bytes,
+        'entries': entries,
+    }
+
+
+def prune_cache(max_bytes=None, max_age=None):
+    """
+    Remove problems from the cache, least recently used first.
+
+    Problems not used (imported or built) for more than *max_age* seconds are removed first.
+    Then the least recently used problems are removed until the cache is no larger than *max_bytes*.
+    Problems imported in the current Python session are never removed.
+    Precompiled C interfaces for other Python, NumPy or CUTEst versions are removed as well.
+
+    .. code-block:: python
+
+        # Keep at most 2GB of problems, and nothing unused for more than 30 days
+        removed = pycutest.prune_cache(max_bytes=2 * 1024**3, max_age=30 * 24 * 3600)
+
+    :param max_bytes: maximum size of the cache in bytes (default = ``None``, i.e. no size limit)
+    :param max_age: maximum time in seconds since a problem was last used (default = ``None``, i.e. no age limit)
+    :return: list of (problemName, sifParams) tuples of the removed problems
+    """
+
+    # Precompiled C interfaces are only needed when building with the current toolchain
+    coreDir = os.path.join(get_cache_path(), CACHE_SUBFOLDER, CORE_SUBFOLDER)
+    if os.path.isdir(coreDir):
+        currentKey = get_core_key()
+        for key in os.listdir(coreDir):
+            if key != currentKey:
+                shutil.rmtree(os.path.join(coreDir, key), True)
+
+    stats = cache_stats()
+    total_bytes = stats['total_bytes']
+    now = time.time()
+    removed = []
+    for entry in stats['entries']:  # least recently used first
+        if entry['loaded']:
+            continue
+        too_old = max_age is not None and now - entry['last_access'] > max_age
+        too_big = max_bytes is not None and total_bytes > max_bytes
+        if not (too_old or too_big):
+            continue
+        with cache_lock(entry['directory']):
+            # Another process or thread may have removed or used the problem since the statistics were gathered
+            if not os.path.isdir(entry['directory']):
+                total_bytes -= entry['bytes']
+                continue
+            if is_loaded(entry['directory']):
+                continue
+            try:
+                accessed = last_access(entry['directory'])
+            except OSError:
+                continue
+            if accessed != entry['last_access'] and not (max_age is not None and now - accessed > max_age):
+                continue  # no longer the least recently used, and not too old
+            shutil.rmtree(entry['directory'], True)
+        total_bytes -= entry['bytes']
+        removed.append((entry['problemName'], entry['sifParams']))
+    return removed
+
+
+def compact_cache(archive_sources=False):
+    """
+    Remove all files not needed at runtime (Fortran sources, object files) from every cached problem.
+
+    Compacted problems can still be imported as usual. To compact problems as they are built instead,
+    use the *compact* option of :func:`import_problem` or :func:`build_problems`.
+
+    :param archive_sources: keep the Fortran sources of each problem in a compressed archive ``sources.tar.gz`` (default ``False``)
+    :return: number of bytes freed
+    """
+    problem_loc = os.path.join(get_cache_path(), CACHE_SUBFOLDER)
+    freed = 0
+    for dir in cache_entry_names():
+        problemDir = os.path.join(problem_loc, dir)
+        # Never compact an entry while it is being built, replaced or removed
+        with cache_lock(problemDir):
+            if not os.path.isdir(problemDir):
+                continue  # removed while waiting for the lock
+            try:
+                freed += compact_cache_entry(problemDir, archive_sources=archive_sources)
+            except OSError:
+                continue  # removed while compacting
+    return freed
+
+
+def get_platform_tags():
+    # A bundle can only be used where its interface modules can be loaded
+    return {
+        'platform': sysconfig.get_platform(),
+        'extSuffix': sysconfig.get_config_var('EXT_SUFFIX'),
+    }
+
+
+def export_cache(problems, path):
+    """
+    Pack cached problems into a single archive which can be unpacked into another cache with :func:`import_cache`.
+
+    Only the files needed to use each problem are exported (the compiled interface module, ``OUTSDIF.d``,
+    ``__init__.py`` and the build manifest). The archive also records the platform and toolchain the problems
+    were built with, so that it is only unpacked where the problems can be loaded.
+
+    .. code-block:: python
+
+        # On one machine: build the problems once and pack them
+        pycutest.build_problems(['ROSENBR', ('ARGLALE', {'N':100})])
+        pycutest.export_cache(['ROSENBR', ('ARGLALE', {'N':100})], 'problems.tar.gz')
+
+        # On every other machine (with the same Python, NumPy and CUTEst installation):
+        pycutest.import_cache('problems.tar.gz')
+
+    :param problems: list of problems to export, each given as a problem name or a (problemName, sifParams) tuple (``None`` exports all cached problems)
+    :param path: file name of the archive to create (a gzip compressed tar file)
+    :return: list of (problemName, sifParams) tuples of the exported problems
+    """
+    problem_loc = os.path.join(get_cache_path(), CACHE_SUBFOLDER)
+    if problems is None:
+        problemDirs = [(os.path.join(problem_loc, dir),) + parse_cache_entry_name(dir) for dir in cache_entry_names()]
+    else:
+        problemDirs = []
+        for problem in problems:
+            if isinstance(problem, str):
+                problemName, sifParams = problem, None
+            else:
+                problemName, sifParams = problem
+            problemDirs.append((get_problem_directory(problemName, sifParams=sifParams), problemName, sifParams))
+
+    runtimeFiles = ['__init__.py', 'OUTSDIF.d', get_interface_module_name(), MANIFEST_FILE]
+    entries = []
+    for (problemDir, problemName, sifParams) in problemDirs:
+        for name in runtimeFiles:
+            if not os.path.isfile(os.path.join(problemDir, name)):
+                raise RuntimeError("Problem %s is not cached or incomplete (missing %s), build it first" % (problemName, name))
+        manifest = read_manifest(problemDir)
+        entries.append({
+            'directory': os.path.basename(problemDir),
+            'problemName': problemName,
+            'sifParams': sifParams,
+            'key': manifest['key'] if manifest is not None else None,
+            'toolchain': manifest['toolchain'] if manifest is not None else None,
+        })
+
+    bundle = dict(get_platform_tags(), format=BUNDLE_FORMAT, created=time.time(), entries=entries)
+
+    # Write to a temporary file first, so a partially written archive is never left behind
+    tmpPath = path + get_temp_suffix()
+    try:
+        with tarfile.open(tmpPath, 'w:gz') as tar:
+            data = json.dumps(bundle, indent=2, sort_keys=True).encode()
+            info = tarfile.TarInfo(BUNDLE_MANIFEST)
+            info.size = len(data)
+            info.mtime = bundle['created']
+            tar.addfile(info, io.BytesIO(data))
+            for entry in entries:
+                problemDir = os.path.join(problem_loc, entry['directory'])
+                for name in runtimeFiles:
+                    tar.add(os.path.join(problemDir, name), arcname='%s/%s' % (entry['directory'], name))
+        os.replace(tmpPath, path)
+    except:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+    return [(entry['problemName'], entry['sifParams']) for entry in entries]
+
+
+def import_cache(path, overwrite=True):
+    """
+    Unpack an archive created by :func:`export_cache` into the cache.
+
+    The archive must have been created on the same platform with the same Python version,
+    otherwise a :class:`RuntimeError` is raised. Problems imported this way are used without
+    rebuilding as long as the SIF files, CUTEst library and compilers match those the archive
+    was built with (see the cache manifest described above); otherwise they are rebuilt when imported.
+
+    :param path: file name of the archive
+    :param overwrite: replace problems which are already cached (default ``True``)
+    :return: list of (problemName, sifParams) tuples of the problems added to the cache
+    """
+    with tarfile.open(path, 'r:*') as tar:
+        try:
+            bundle = json.load(tar.extractfile(BUNDLE_MANIFEST))
+        except KeyError:
+            raise RuntimeError("%s is not a PyCUTEst cache bundle" % path)
+        if bundle.get('format') != BUNDLE_FORMAT:
+            raise RuntimeError("Unsupported cache bundle format %s" % str(bundle.get('format')))
+        tags = get_platform_tags()
+        for tag in sorted(tags.keys()):
+            if bundle.get(tag) != tags[tag]:
+                raise RuntimeError("Cache bundle was built for %s %s, but this is %s" % (tag, bundle.get(tag), tags[tag]))
+
+        prepare_cache_holder()
+        problem_loc = os.path.join(get_cache_path(), CACHE_SUBFOLDER)
+        members = dict((member.name, member) for member in tar.getmembers() if member.isfile())
+
+        imported = []
+        for entry in bundle['entries']:
+            dir = entry['directory']
+            # Never write outside the cache, whatever the archive contains
+            if dir != os.path.basename(dir) or dir.startswith('.') or dir.startswith('_'):
+                raise RuntimeError("Invalid problem folder %s in cache bundle" % dir)
+            problemDir = os.path.join(problem_loc, dir)
+            if os.path.isdir(problemDir) and not overwrite:
+                continue
+
+            # Unpack into a temporary folder and move it into place when complete
+            with cache_lock(problemDir):
+                tmpDir = get_build_directory(problemDir)
+                shutil.rmtree(tmpDir, True)
+                os.mkdir(tmpDir)
+                try:
+                    for name, member in members.items():
+                        (memberDir, fileName) = name.split('/', 1) if '/' in name else ('', name)
+                        if memberDir != dir or '/' in fileName:
+                            continue
+                        src = tar.extractfile(member)
+                        with open(os.path.join(tmpDir, fileName), 'wb') as dst:
+                            shutil.copyfileobj(src, dst)
+                    touch_cache_entry(tmpDir)
+                    install_cache_entry(tmpDir, problemDir)
+                except:
+                    shutil.rmtree(tmpDir, True)
+                    raise
+            imported.append((entry['problemName'], entry['sifParams']))
+    return imported
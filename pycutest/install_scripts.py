@@ -1,100 +1,172 @@
 """
 Installation scripts for individual problems
-"""
-
-import sys
-
-from .system_paths import get_cutest_path, get_cutest_include_path, get_homebrew_gfortran_path
-from pycutest import __version__
-
-__all__ = ['get_setup_script']
-
-#
-# The setup.py script with a placeholder for platform-dependent part.
-#
-setupScript="""#!/usr/bin/env python
-# (C)2011 Arpad Buermen
-# (C)2025 Jaroslav Fowkes, Lindon Roberts
-# Licensed under GNU GPL V3
 
-#
-# Do not edit. This is a computer-generated file.
-#
+The interface module is built by calling the C compiler and the linker directly,
+using the same flags the running Python interpreter was built with (see :mod:`sysconfig`).
+"""
 
-import os
+import os, sys
+import hashlib
+import shlex
+import subprocess
+import sysconfig
+import threading
 
 import numpy as np
-from glob import glob
-from setuptools import setup, Extension, find_packages
-
-#
-# OS specific
-#
-
-%s
-
-#
-# End of OS specific
-#
-
-# Module
-module = Extension(
-    str('_pycutestitf'),
-    sources=[str('cutestitf.c')],
-    include_dirs=include_dirs,
-    define_macros=define_macros,
-    extra_objects=objFileList,
-    libraries=libraries,
-    library_dirs=library_dirs,
-    extra_link_args=extra_link_args,
-)
-
-# Settings
-setup(
-    name='PyCUTEst automatic test function interface builder',
-    version='%s',
-    description='Builds a CUTEst test function interface for Python.',
-    long_description='Builds a CUTEst test function interface for Python.',
-    author='Arpad Buermen, Jaroslav Fowkes, Lindon Roberts',
-    author_email='arpadb@fides.fe.uni-lj.si, fowkes@maths.ox.ac.uk, robertsl@maths.ox.ac.uk',
-    url='',
-    platforms='Linux',
-    license='GNU GPL',
-    packages=find_packages(),
-    ext_modules=[module],
-)
-"""
 
-#
-# Linux-specific part of setup.py
-#
-setupScriptLinux="""
-define_macros=[('LINUX', None)]
-include_dirs=[np.get_include(),'%s']
-objFileList=glob('*.o')
-objFileList.append('%s')
-libraries=['gfortran']
-library_dirs=[]
-extra_link_args=[]
-""" % (get_cutest_include_path(), get_cutest_path())
-
-#
-# Mac-specific part of setup.py
-#
-setupScriptMac="""
-import subprocess
-define_macros=[('LINUX', None)]
-include_dirs=[np.get_include(),'%s']
-objFileList=glob('*.o')
-objFileList.append('%s')
-libraries=['gfortran']
-library_dirs=['%s']
-extra_link_args=['-Wl,-no_compact_unwind']
-""" % (get_cutest_include_path(), get_cutest_path(), get_homebrew_gfortran_path())
-
-
-def get_setup_script():
-    if sys.platform == "linux":
-        return setupScript % (setupScriptLinux,__version__)
-    else:  # darwin (Mac)
-        return setupScript % (setupScriptMac,__version__)
+from .system_paths import use_integer_64, get_cutest_path, get_cutest_include_path, get_homebrew_gfortran_path
+from .c_interface import itf_c_source
+
+__all__ = ['FORTRAN_FLAGS', 'get_fortran_flags', 'get_c_flags', 'get_temp_suffix', 'get_core_key', 'get_toolchain_info', 'compile_core_object', 'link_interface_module']
+
+# Flags used to compile the Fortran files produced by sifdecode
+FORTRAN_FLAGS = ['-fPIC', '-O2']
+
+# ... and the C interface, in addition to those Python was built with
+C_FLAGS = ['-DLINUX']
+
+# Toolchain properties which are expensive to determine, computed once per process
+_toolchainCache = {}
+
+def get_temp_suffix():
+    # Suffix for temporary files which is unique to the calling process and thread
+    return '.%d-%d.tmp' % (os.getpid(), threading.get_ident())
+
+
+def get_fortran_flags():
+    # Fortran flags for the current integer size (64-bit integers must match the CUTEst library)
+    return FORTRAN_FLAGS + (['-fdefault-integer-8'] if use_integer_64() else [])
+
+
+def get_c_flags():
+    # C flags for the current integer size (INTEGER_64 selects 64-bit integers in cutest.h)
+    return C_FLAGS + (['-DINTEGER_64'] if use_integer_64() else [])
+
+
+def get_core_key():
+    # The compiled C interface only depends on its source, the Python and NumPy headers and the CUTEst header,
+    # so it can be shared by all problems built with the same combination of these
+    # (recomputed only if the C flags or the CUTEst header change)
+    cutestHeader = os.path.join(get_cutest_include_path(), 'cutest.h')
+    st = os.stat(cutestHeader)
+    stamp = (tuple(get_c_flags()), cutestHeader, st.st_size, st.st_mtime_ns)
+    if _toolchainCache.get('coreStamp') != stamp:
+        h = hashlib.sha256()
+        h.update(itf_c_source.encode())
+        h.update(sys.version.encode())
+        h.update(str(sysconfig.get_config_var('EXT_SUFFIX')).encode())
+        h.update(np.__version__.encode())
+        h.update(' '.join(get_c_flags()).encode())
+        with open(cutestHeader, 'rb') as f:
+            h.update(f.read())
+        _toolchainCache['coreStamp'] = stamp
+        _toolchainCache['coreKey'] = h.hexdigest()[:16]
+    return _toolchainCache['coreKey']
+
+
+def get_gfortran_version():
+    # First line of 'gfortran --version', or None if gfortran cannot be run
+    if 'gfortran' not in _toolchainCache:
+        try:
+            version = subprocess.check_output(['gfortran', '--version'], universal_newlines=True).splitlines()[0].strip()
+        except (OSError, subprocess.CalledProcessError, IndexError):
+            version = None
+        _toolchainCache['gfortran'] = version
+    return _toolchainCache['gfortran']
+
+
+def get_cutest_library_hash():
+    # Hash of the CUTEst library contents (recomputed only if the library file changes)
+    cutestPath = get_cutest_path()
+    st = os.stat(cutestPath)
+    stamp = (cutestPath, st.st_size, st.st_mtime_ns)
+    if _toolchainCache.get('cutestStamp') != stamp:
+        h = hashlib.sha256()
+        with open(cutestPath, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        _toolchainCache['cutestStamp'] = stamp
+        _toolchainCache['cutestHash'] = h.hexdigest()
+    return _toolchainCache['cutestHash']
+
+
+def get_toolchain_info():
+    """
+    Returns a dictionary describing the compilers, flags and libraries a problem interface is built with.
+    Two builds with the same toolchain info (and the same problem inputs) produce equivalent interfaces.
+    """
+    return {
+        'coreKey': get_core_key(),
+        'cCompiler': ' '.join([sysconfig.get_config_var('CC') or '', sysconfig.get_config_var('CFLAGS') or '',
+                               sysconfig.get_config_var('CCSHARED') or '']),
+        'linker': sysconfig.get_config_var('LDSHARED') or '',
+        'fortranCompiler': get_gfortran_version(),
+        'fortranFlags': get_fortran_flags(),
+        'cutestLibraryHash': get_cutest_library_hash(),
+        'platform': sysconfig.get_platform(),
+    }
+
+
+def compile_core_object(coreDir, quiet=True):
+    """
+    Compiles the generic C interface (cutestitf.c) into an object file in coreDir, unless it is already there.
+    Returns the path of the object file.
+    """
+    coreObject = os.path.join(coreDir, 'cutestitf.o')
+    if os.path.isfile(coreObject):
+        return coreObject
+
+    os.makedirs(coreDir, exist_ok=True)
+
+    # Write to temporary files first, so concurrent builds never see a partially written object
+    tmpSuffix = get_temp_suffix()
+    coreSource = os.path.join(coreDir, 'cutestitf.c')
+    f = open(coreSource + tmpSuffix, 'w')
+    f.write(itf_c_source)
+    f.close()
+    os.replace(coreSource + tmpSuffix, coreSource)
+
+    cmd = shlex.split(sysconfig.get_config_var('CC')) + shlex.split(sysconfig.get_config_var('CFLAGS') or '') + \
+          shlex.split(sysconfig.get_config_var('CCSHARED') or '') + \
+          get_c_flags() + ['-I' + sysconfig.get_paths()['include'], '-I' + np.get_include(), '-I' + get_cutest_include_path(),
+           '-c', coreSource, '-o', coreObject + tmpSuffix]
+    if not quiet:
+        print(' '.join(cmd))
+    if subprocess.call(cmd)!=0:
+        raise RuntimeError("Failed to compile the C interface")
+    os.replace(coreObject + tmpSuffix, coreObject)
+    return coreObject
+
+
+def get_interface_module_name():
+    # File name of the binary interface module, e.g. _pycutestitf.cpython-312-x86_64-linux-gnu.so
+    return '_pycutestitf' + sysconfig.get_config_var('EXT_SUFFIX')
+
+
+def link_interface_module(problemDir, objFileList, coreObject, quiet=True):
+    """
+    Links the problem's object files, the precompiled C interface and the CUTEst library
+    into the binary interface module in problemDir.
+    Returns the path of the interface module.
+    """
+    module = os.path.join(problemDir, get_interface_module_name())
+
+    libraryDirs = []
+    extraLinkArgs = []
+    if sys.platform != "linux":  # darwin (Mac)
+        libraryDirs.append(get_homebrew_gfortran_path())
+        extraLinkArgs.append('-Wl,-no_compact_unwind')
+
+    # Link to a temporary file first, so a failed link never leaves a broken module behind
+    tmpModule = module + get_temp_suffix()
+    cmd = shlex.split(sysconfig.get_config_var('LDSHARED')) + \
+          [os.path.join(problemDir, objFile) for objFile in objFileList] + [coreObject, get_cutest_path()] + \
+          ['-L' + libraryDir for libraryDir in libraryDirs] + ['-lgfortran'] + extraLinkArgs + ['-o', tmpModule]
+    if not quiet:
+        print(' '.join(cmd))
+    if subprocess.call(cmd)!=0:
+        if os.path.exists(tmpModule):
+            os.remove(tmpModule)
+        raise RuntimeError("Failed to link the Python interface module")
+    os.replace(tmpModule, module)
+    return module
@@ -2,58 +2,64 @@
 A class to store problem info, where we can set up the interface exactly how we wish
 """
 
+import threading
+
 import numpy as np
-from scipy.sparse import coo_matrix
+from scipy.sparse import coo_matrix, csr_matrix, csc_matrix
 
 __all__ = ['CUTEstProblem']
 
-def pad_vector(x, idx_free, idx_eq, val_eq):
-    # Pad a vector x using values from val_eq (i.e. fixed variables)
-    xfull = np.zeros((len(idx_free) + len(idx_eq),))
-    xfull[idx_free] = x
-    xfull[idx_eq] = val_eq[idx_eq]
-    return xfull
-
-
-def sparse_vec_extract_indices(v, idx):
-    # Return v[idx] where v is scipy.sparse.coo_matrix; want to return a coo_matrix too
-    return (v.tocsc()[0, idx]).tocoo()
-
+# Formats of sparse results (see CUTEstProblem.convert_sparse), 'upper' only for Hessians
+SPARSE_FORMATS = ['coo', 'csr', 'csc', 'triplets', 'upper']
 
-def sparse_mat_extract_columns(A, idx):
-    # Return A[:, idx] where A is scipy.sparse.coo_matrix; want to return a coo_matrix too
-    return (A.tocsc()[:, idx]).tocoo()
+def pad_rows(X, idx_free, idx_eq, val_eq):
+    # Pad every row of a 2D array X using values from val_eq (i.e. fixed variables)
+    Xfull = np.empty((X.shape[0], len(idx_free) + len(idx_eq)))
+    Xfull[:, idx_free] = X
+    Xfull[:, idx_eq] = val_eq[idx_eq]
+    return Xfull
 
 
-def sparse_mat_extract_rows(A, idx):
-    # Return A[idx, :] where A is scipy.sparse.coo_matrix; want to return a coo_matrix too
-    return (A.tocsc()[idx, :]).tocoo()
-
-
-def sparse_mat_extract_rows_and_columns(A, row_idx, col_idx):
-    # Return A[row_idx, col_idx] where A is scipy.sparse.coo_matrix; want to return a coo_matrix too
-    return ((A.tocsc()[:, col_idx]).tocsr()[row_idx, :]).tocoo()
+def sparse_remap(A, row_map, col_map, shape):
+    # Return A[row_idx, col_idx] where A is scipy.sparse.coo_matrix, as a coo_matrix of the given shape.
+    # Entry i of row_map/col_map is the new index of row/column i (-1 to drop it), row_map=None keeps all rows.
+    cols = col_map[A.col]
+    keep = cols >= 0
+    if row_map is None:
+        rows = A.row
+    else:
+        rows = row_map[A.row]
+        keep &= rows >= 0
+    return coo_matrix((A.data[keep], (rows[keep], cols[keep])), shape=shape)
 
 
 class CUTEstProblem(object):
     # CUTEstProblem instances
     _instances = {}
 
-    def __new__(cls, module, instname, drop_fixed_variables=True):
+    # All problems read their OUTSDIF.d through the same Fortran unit, so only one may be set up at a time
+    _setupLock = threading.Lock()
+
+    def __new__(cls, module, instname, drop_fixed_variables=True, shared=True):
         """
         Create new CUTEstProblem instance or return existing one if present,
         ensuring that CUTEST_[u|c]setup is only called once on the C module.
 
         We consider a CUTEstProblem to be the same instance if it has the same
         name and parameters, e.g. ARGLALE_N10 here called 'instname'.
+        Instances which are not shared (each with a private copy of the C module) are always new.
         """
-        # Check if CUTEstProblem instance already exists
-        if instname not in cls._instances:
-            module.info = module.setup() # setup CUTEst problem
-            cls._instances[instname] = object.__new__(cls)
-        return cls._instances[instname]
-
-    def __init__(self, module, instname, drop_fixed_variables=True):
+        with cls._setupLock:
+            if not shared:
+                module.info = module.setup() # setup CUTEst problem
+                return object.__new__(cls)
+            # Check if CUTEstProblem instance already exists
+            if instname not in cls._instances:
+                module.info = module.setup() # setup CUTEst problem
+                cls._instances[instname] = object.__new__(cls)
+            return cls._instances[instname]
+
+    def __init__(self, module, instname, drop_fixed_variables=True, shared=True):
         """
         Build a wrapper for a Python module containing the compiled CUTEst problem.
 
@@ -87,6 +93,7 @@ class CUTEstProblem(object):
 
         :param module: the module containing the Python interface
         :param drop_fixed_variables: a flag for whether to ignore fixed variables (i.e. n is smaller, etc.) [default=True]
+        :param shared: a flag for whether this instance is shared by all users of the module, or has a private copy of it [default=True]
         """
         self._instname = instname
         self._module = module
@@ -103,7 +110,7 @@ class CUTEstProblem(object):
         self.m = self._module.info['m']
         """ number of constraints """
 
-        self.x0 = self._module.info['x']
+        self.x0 = self._module.info['x'].copy()
         """ starting point for optimization routine (NumPy array of shape (self.n,)) """
 
         self.sifParams = self._module.info['sifparams']
@@ -112,7 +119,7 @@ class CUTEstProblem(object):
         self.sifOptions = self._module.info['sifoptions']
         """ list of extra options passed to sifdecode """
 
-        self.vartype = self._module.info['vartype']
+        self.vartype = self._module.info['vartype'].copy()
         """ array of variable types (NumPy array size n, entry vartype[i] indicates that x[i] is real(0), boolean(1), or integer(2)) """
 
         self.nnzh = self._module.info['nnzh']
@@ -127,10 +134,10 @@ class CUTEstProblem(object):
         self.nonlinear_vars_first = self._module.info['nvfirst']
         """ flag if all nonlinear variables are listed before linear variables """
 
-        self.bl = self._module.info['bl']
+        self.bl = self._module.info['bl'].copy()
         """ array of lower bounds on input (unconstrained -> -1e20), as NumPy array of shape (self.n,) """
 
-        self.bu = self._module.info['bu']
+        self.bu = self._module.info['bu'].copy()
         """ array of upper bounds on input (unconstrained -> 1e20), as NumPy array of shape (self.n,) """
 
         self.nnzj = self._module.info['nnzj'] if self.m > 0 else None
@@ -182,6 +189,17 @@ class CUTEstProblem(object):
             self.n = self.n_full
             self.remove_one_isphess_and_scons = False
 
+        # New index of each variable after removing fixed variables (-1 for fixed variables), for sparse results
+        self.idx_map = np.full((self.n_full,), -1, dtype=int)
+        self.idx_map[self.idx_free] = np.arange(self.n_free)
+
+        # Buffers of all variables reused by self.free_to_all(), one set per thread
+        self._buffers = threading.local()
+
+        # Sparsity patterns of Jacobian and Hessian (see self.sparse_structure()), computed when first needed
+        self._jacobian_structure = None
+        self._hessian_structure = None
+
         # Save the initial stats, so we can make sure they don't get counted in the final tally
         self.init_stats = self._module.report()
 
@@ -191,30 +209,147 @@ class CUTEstProblem(object):
         else:
             return "CUTEst problem %s (params %s) with %g variables and %g constraints" % (self.name, str(self.sifParams), self.n, self.m)
 
-    def all_to_free(self, x):
+    def all_to_free(self, x, axis=0):
         """
         Remove fixed variables from a vector of all variables.
 
-        :param x: vector of values of all variables
-        :return: vector of free variables only
+        :param x: vector of values of all variables (or array with all variables along the given axis)
+        :param axis: axis of x indexed by the variables
+        :return: vector of free variables only (x itself if there are no fixed variables to remove)
         """
-        if self.drop_fixed_vars:
-            return x[self.idx_free]
-        else:
+        if self.n_fixed == 0:
             return x
+        return x.take(self.idx_free, axis=axis)
+
+    def all_to_free_matrix(self, H):
+        """
+        Remove rows and columns of fixed variables from a square matrix over all variables.
+
+        :param H: matrix over all variables (e.g. a Hessian)
+        :return: matrix over free variables only
+        """
+        if self.n_fixed == 0:
+            return H
+        return H[np.ix_(self.idx_free, self.idx_free)]
+
+    def all_to_free_sparse(self, A, rows=False):
+        """
+        Remove fixed variables from a sparse vector or matrix over all variables.
+
+        :param A: scipy.sparse.coo_matrix with columns (and rows if rows=True) over all variables
+        :param rows: whether to remove fixed variables from the rows as well (e.g. for a Hessian)
+        :return: scipy.sparse.coo_matrix over free variables only (A itself if there are no fixed variables to remove)
+        """
+        if self.n_fixed == 0:
+            return A
+        if rows:
+            return sparse_remap(A, self.idx_map, self.idx_map, (self.n_free, self.n_free))
+        else:
+            return sparse_remap(A, None, self.idx_map, (A.shape[0], self.n_free))
+
+    def check_format(self, format, hessian=False):
+        """
+        Check the requested format of sparse results
+
+        :param format: one of 'coo', 'csr', 'csc', 'triplets' or 'upper'
+        :param hessian: whether the result includes a Hessian (the only case where 'upper' is allowed)
+        :return: raises RuntimeError if format is not supported
+        """
+        if format not in SPARSE_FORMATS or (format == 'upper' and not hessian):
+            allowed = SPARSE_FORMATS if hessian else SPARSE_FORMATS[:-1]
+            raise RuntimeError("Unknown sparse format %s (expect one of %s)" % (str(format), ', '.join(allowed)))
+        return
+
+    def convert_sparse(self, A, format):
+        """
+        Convert a sparse vector or matrix to the requested format.
+
+        Compressed formats are built by the C interface in a single pass over the elements.
+
+        :param A: scipy.sparse.coo_matrix
+        :param format: 'coo' or 'upper' (A itself), 'csr', 'csc' (scipy.sparse.csr_matrix or csc_matrix)
+            or 'triplets' (tuple (rows, cols, values) of 1D arrays)
+        :return: A in the requested format
+        """
+        if format == 'csr':
+            (ptr, ind, val) = self._module.compress(A.row, A.col, A.data, A.shape[0])
+            return csr_matrix((val, ind, ptr), shape=A.shape)
+        elif format == 'csc':
+            (ptr, ind, val) = self._module.compress(A.col, A.row, A.data, A.shape[1])
+            return csc_matrix((val, ind, ptr), shape=A.shape)
+        elif format == 'triplets':
+            return A.row, A.col, A.data
+        else:
+            return A
+
+    def sparse_structure(self, cols, rows, hessian=False):
+        """
+        Remove fixed variables from a sparsity pattern over all variables.
+
+        * *cols* -- column index of each nonzero element
+        * *rows* -- row index of each nonzero element
+        * *hessian* -- whether rows are indexed by the variables as well
+
+        Returns a tuple (rows, cols, keep) of read-only arrays, where keep selects the elements
+        of free variables from the values in the order of the pattern (None if there are no fixed variables to remove).
+        """
+        if self.n_fixed == 0:
+            keep = None
+        else:
+            new_cols = self.idx_map[cols]
+            new_rows = self.idx_map[rows] if hessian else rows
+            keep = np.nonzero((new_cols >= 0) & (new_rows >= 0))[0]
+            rows, cols = new_rows[keep], new_cols[keep]
+        for a in [rows, cols, keep]:
+            if a is not None:
+                a.setflags(write=False)
+        return rows, cols, keep
 
     def free_to_all(self, x, use_zeros=False):
         """
         Append fixed variables to a vector of free variables.
 
+        Without fixed variables, x is passed through (as a contiguous float64 array, copied only if needed).
+        Otherwise the free variables are written to a buffer of the calling thread, which is reused by the next call:
+        the result must not be kept or modified.
+
         :param x: vector of values of free variables
         :param use_zeros: If True, pad with zeros, otherwise with fixed values of input vector
         :return: vector of values of all variables
         """
-        if self.drop_fixed_vars:
-            return pad_vector(x, self.idx_free, self.idx_eq, np.zeros((self.n_full,)) if use_zeros else self.bl_full)
-        else:
-            return x
+        if self.n_fixed == 0:
+            return np.ascontiguousarray(x, dtype=np.float64)
+        name = 'zeros' if use_zeros else 'fixed'
+        xfull = getattr(self._buffers, name, None)
+        if xfull is None:  # the entries of fixed variables are set once and never overwritten
+            xfull = np.zeros((self.n_full,)) if use_zeros else self.bl_full.copy()
+            setattr(self._buffers, name, xfull)
+        xfull[self.idx_free] = x
+        return xfull
+
+    def free_to_all_batch(self, X):
+        """
+        Append fixed variables to every row of an array of free variables.
+
+        :param X: array of values of free variables, one point per row
+        :return: C contiguous array of values of all variables, one point per row
+        """
+        if self.n_fixed == 0:
+            return np.ascontiguousarray(X, dtype=np.float64)
+        return pad_rows(X, self.idx_free, self.idx_eq, self.bl_full)
+
+    def free_to_all_columns(self, P):
+        """
+        Append zeros for fixed variables to every column of an array of directions in the free variables.
+
+        :param P: array of directions in the free variables, one per column
+        :return: FORTRAN contiguous array of directions in all variables, one per column
+        """
+        if self.n_fixed == 0:
+            return np.asfortranarray(P, dtype=np.float64)
+        Pfull = np.zeros((self.n_full, P.shape[1]), order='F')
+        Pfull[self.idx_free, :] = P
+        return Pfull
 
     def check_input_x(self, x):
         """
@@ -227,6 +362,69 @@ class CUTEstProblem(object):
             raise RuntimeError("x has wrong shape (got %s, expect (%g,))" % (x.shape, self.n))
         return
 
+    def check_input_X(self, X):
+        """
+        Check X (a batch of points, one per row) has correct dimensions
+
+        :param X: input array
+        :return: raises RuntimeError if X has wrong dimensions
+        """
+        if X.ndim != 2 or X.shape[1] != self.n:
+            raise RuntimeError("X has wrong shape (got %s, expect (k,%g))" % (X.shape, self.n))
+        return
+
+    def check_input_P(self, P, nrows=None):
+        """
+        Check P (a block of vectors, one per column) has correct dimensions
+
+        :param P: input array
+        :param nrows: expected number of rows (default=None -> self.n)
+        :return: raises RuntimeError if P has wrong dimensions
+        """
+        nrows = self.n if nrows is None else nrows
+        if P.ndim != 2 or P.shape[0] != nrows:
+            raise RuntimeError("P has wrong shape (got %s, expect (%g,k))" % (P.shape, nrows))
+        return
+
+    def check_output(self, out, shape, fortran=False, reduced=False):
+        """
+        Check an output array has correct dimensions, and whether CUTEst can write results to it directly
+
+        :param out: output array
+        :param shape: expected shape of out
+        :param fortran: whether CUTEst writes the result as a FORTRAN style (column major) array
+        :param reduced: whether fixed variables are removed from the result returned by CUTEst
+        :return: True if out can be passed to the C interface, False if the result must be copied into out
+            (raises RuntimeError if out has wrong shape)
+        """
+        if out.shape != shape:
+            raise RuntimeError("out has wrong shape (got %s, expect %s)" % (out.shape, shape))
+        if reduced and self.n_fixed > 0:
+            return False
+        return out.dtype == np.float64 and out.flags.writeable and (out.flags.f_contiguous if fortran else out.flags.c_contiguous)
+
+    def evaluate_into(self, out, shape, func, args, fortran=False, reduce=None):
+        """
+        Call a function of the C interface returning a single array, and write the result to out if given.
+
+        * *out* -- output array (None to return a newly allocated array)
+        * *shape* -- expected shape of out
+        * *func* -- function of the C interface
+        * *args* -- tuple of arguments of func
+        * *fortran* -- whether func returns a FORTRAN style (column major) array
+        * *reduce* -- function removing fixed variables from the result of func (None if the result has no fixed variables to remove)
+        """
+        if out is not None and self.check_output(out, shape, fortran=fortran, reduced=reduce is not None):
+            func(*args, out=out)
+            return out
+        result = func(*args)
+        if reduce is not None:
+            result = reduce(result)
+        if out is None:
+            return result
+        out[...] = result
+        return out
+
     def check_input_v(self, v):
         """
         Check v (Lagrange multiplier) has correct dimensions (or None for unconstrained problems)
@@ -281,7 +479,33 @@ class CUTEstProblem(object):
             c = None
         return f, c
 
-    def obj(self, x, gradient=False):
+    def objcons_batch(self, X):
+        """
+        Evaluate objective and constraints at many points.
+
+        .. code-block:: python
+
+            # objective and constraints at each row of X
+            f, C = problem.objcons_batch(X)
+
+        For unconstrained problems, C is None.
+
+        The loop over the points runs in C, so this is much faster than calling :meth:`objcons` for each point.
+
+        This calls CUTEst routine CUTEst_cfn.
+
+        :param X: input points, one per row
+        :type X: numpy.ndarray with shape (k, n)
+        :return: tuple (f, C) of objective and constraint values (one row per point) at each row of X
+        :rtype: (numpy.ndarray(k,), numpy.ndarray(k, m))
+        """
+        self.check_input_X(X)
+        f, C = self._module.objcons_batch(self.free_to_all_batch(X))
+        if self.m <= 0:  # unconstrained problems
+            C = None
+        return f, C
+
+    def obj(self, x, gradient=False, out=None):
         """
         Evaluate the objective (and optionally its gradient).
 
@@ -291,6 +515,8 @@ class CUTEstProblem(object):
             f    = problem.obj(x)
             # objective and gradient
             f, g = problem.obj(x, gradient=True)
+            # objective and gradient, with gradient written to existing array g
+            f, g = problem.obj(x, gradient=True, out=g)
 
         This calls CUTEst routine CUTEST_uofg or CUTEST_cofg.
 
@@ -298,18 +524,57 @@ class CUTEstProblem(object):
         :type x: numpy.ndarray with shape (n,)
         :param gradient: whether to return objective and gradient, or just objective (default=False; i.e. objective only)
         :type gradient: bool, optional
+        :param out: array to write the gradient to (default=None -> return a new array; only allowed if gradient=True)
+        :type out: numpy.ndarray with shape (n,), optional
         :return: objective value f, or tuple (f,g) of objective and gradient at x
         :rtype: float or (float, numpy.ndarray(n,))
         """
         self.check_input_x(x)
         if gradient:
+            if out is not None and self.check_output(out, (self.n,), reduced=True):
+                f, g = self._module.obj(self.free_to_all(x), 1, out=out)
+                return f, out
             f, g = self._module.obj(self.free_to_all(x), 1)
-            return f, self.all_to_free(g)
+            if out is None:
+                return f, self.all_to_free(g)
+            out[...] = self.all_to_free(g)
+            return f, out
         else:
+            if out is not None:
+                raise RuntimeError("out cannot be used without gradient")
             f = self._module.obj(self.free_to_all(x))
             return f
 
-    def grad(self, x, index=None):
+    def obj_batch(self, X, gradient=False):
+        """
+        Evaluate the objective (and optionally its gradient) at many points.
+
+        .. code-block:: python
+
+            # objective at each row of X
+            f    = problem.obj_batch(X)
+            # objective and gradient at each row of X
+            f, G = problem.obj_batch(X, gradient=True)
+
+        The loop over the points runs in C, so this is much faster than calling :meth:`obj` for each point.
+
+        This calls CUTEst routine CUTEST_uofg or CUTEST_cofg.
+
+        :param X: input points, one per row
+        :type X: numpy.ndarray with shape (k, n)
+        :param gradient: whether to return objective and gradient, or just objective (default=False; i.e. objective only)
+        :type gradient: bool, optional
+        :return: objective values f, or tuple (f,G) of objective values and gradients (one per row) at each row of X
+        :rtype: numpy.ndarray(k,) or (numpy.ndarray(k,), numpy.ndarray(k, n))
+        """
+        self.check_input_X(X)
+        if gradient:
+            f, G = self._module.obj_batch(self.free_to_all_batch(X), 1)
+            return f, self.all_to_free(G, axis=1)
+        else:
+            return self._module.obj_batch(self.free_to_all_batch(X))
+
+    def grad(self, x, index=None, out=None):
         """
         Evaluate the gradient of the objective function or gradient of the i-th constraint.
 
@@ -326,17 +591,19 @@ class CUTEstProblem(object):
         :type x: numpy.ndarray with shape (n,)
         :param index: which constraint to evaluate. Must be in 0..self.m-1.
         :type index: int, optional
+        :param out: array to write the gradient to (default=None -> return a new array)
+        :type out: numpy.ndarray with shape (n,), optional
         :return: gradient of objective or gradient of i-th constraint at x
         :rtype: numpy.ndarray(n,)
         """
         self.check_input_x(x)
         if index is None:
-            g = self._module.grad(self.free_to_all(x))
+            args = (self.free_to_all(x),)
         else:
-            g = self._module.grad(self.free_to_all(x), index)
-        return self.all_to_free(g)
+            args = (self.free_to_all(x), index)
+        return self.evaluate_into(out, (self.n,), self._module.grad, args, reduce=self.all_to_free)
 
-    def cons(self, x, index=None, gradient=False):
+    def cons(self, x, index=None, gradient=False, out=None):
         """
         Evaluate the constraints (and optionally their Jacobian or gradient).
 
@@ -350,6 +617,8 @@ class CUTEstProblem(object):
             c, J   = problem.cons(x, gradient=True)
             # i-th constraint and its gradient
             ci, Ji = problem.cons(x, index=i, gradient=True)
+            # constraints and Jacobian, written to existing arrays c and J
+            c, J   = problem.cons(x, gradient=True, out=(c, J))
 
         For unconstrained problems, this returns None.
 
@@ -363,6 +632,10 @@ class CUTEstProblem(object):
         :type index: int, optional
         :param gradient: whether to return constraint(s) and gradient/Jacobian, or just constraint (default=False; i.e. constraint only)
         :type gradient: bool, optional
+        :param out: array to write the constraints to, or tuple of arrays to write the constraints and Jacobian to if gradient=True,
+            or array to write the gradient to if index is given and gradient=True (default=None -> return new arrays).
+            For the fastest evaluation, the Jacobian should be a FORTRAN style (column major) array.
+        :type out: numpy.ndarray with shape (m,), or tuple (numpy.ndarray(m,), numpy.ndarray(m,n)), or numpy.ndarray with shape (n,), optional
         :return: value of constraint(s), and Jacobian or gradient of constraint(s) at x
         :rtype: numpy.ndarray(m,) or float or (numpy.ndarray(m,), numpy.ndarray(m,n)) or (float, numpy.ndarray(n,))
         """
@@ -371,23 +644,67 @@ class CUTEstProblem(object):
         self.check_input_x(x)
         if gradient:
             if index is None:
-                c, J = self._module.cons(self.free_to_all(x), True)
-                return c, J[:, self.idx_free]
+                (cout, Jout) = out if out is not None else (None, None)
+                kwargs = {}
+                if cout is not None and self.check_output(cout, (self.m,)):
+                    kwargs['out'] = cout
+                if Jout is not None and self.check_output(Jout, (self.m, self.n), fortran=True, reduced=True):
+                    kwargs['jout'] = Jout
+                c, J = self._module.cons(self.free_to_all(x), True, **kwargs)
+                if cout is not None and 'out' not in kwargs:
+                    cout[...] = c
+                    c = cout
+                if Jout is not None and 'jout' not in kwargs:
+                    Jout[...] = self.all_to_free(J, axis=1)
+                    J = Jout
+                return c, (J if Jout is not None else self.all_to_free(J, axis=1))
             else:
                 assert 0 <= index <= self.m - 1, "Invalid constraint index %g (must be in 0..%g)" % (index, self.m-1)
+                if out is not None and self.check_output(out, (self.n,), reduced=True):
+                    ci, Ji = self._module.cons(self.free_to_all(x), True, index, jout=out)
+                    return ci[0], out
                 ci, Ji = self._module.cons(self.free_to_all(x), True, index)
                 ci = ci[0]  # convert from 1x1 NumPy array to float
-                return ci, self.all_to_free(Ji)
+                if out is None:
+                    return ci, self.all_to_free(Ji)
+                out[...] = self.all_to_free(Ji)
+                return ci, out
         else:
             if index is None:
-                c = self._module.cons(self.free_to_all(x))
-                return c
+                return self.evaluate_into(out, (self.m,), self._module.cons, (self.free_to_all(x),))
             else:
+                if out is not None:
+                    raise RuntimeError("out cannot be used for a single constraint value")
                 assert 0 <= index <= self.m - 1, "Invalid constraint index %g (must be in 0..%g)" % (index, self.m - 1)
                 ci = self._module.cons(self.free_to_all(x), False, index)
                 ci = ci[0]  # convert from 1x1 NumPy array to float
                 return ci
 
+    def cons_batch(self, X):
+        """
+        Evaluate the constraints at many points.
+
+        .. code-block:: python
+
+            # constraints at each row of X
+            C = problem.cons_batch(X)
+
+        For unconstrained problems, this returns None.
+
+        The loop over the points runs in C, so this is much faster than calling :meth:`cons` for each point.
+
+        This calls CUTEst routine CUTEST_ccfg.
+
+        :param X: input points, one per row
+        :type X: numpy.ndarray with shape (k, n)
+        :return: values of constraints (one row per point) at each row of X
+        :rtype: numpy.ndarray(k, m)
+        """
+        if self.m <= 0:
+            return None
+        self.check_input_X(X)
+        return self._module.cons_batch(self.free_to_all_batch(X))
+
     def lag(self, x, v, gradient=False):
         """
         Evaluate Lagrangian function value and its gradient if requested.
@@ -458,11 +775,11 @@ class CUTEstProblem(object):
             self.check_input_v(v)
             g, J = self._module.lagjac(self.free_to_all(x), v)
         if self.m > 0:
-            return self.all_to_free(g), J[:, self.idx_free]
+            return self.all_to_free(g), self.all_to_free(J, axis=1)
         else:
             return self.all_to_free(g), None
 
-    def jprod(self, p, transpose=False, x=None):
+    def jprod(self, p, transpose=False, x=None, out=None):
         """
         Evaluate product of constraint Jacobian with a vector p
 
@@ -487,6 +804,8 @@ class CUTEstProblem(object):
         :type transpose: bool, optional
         :param x: input vector for Jacobian (default=None -> use last computed Jacobian)
         :type x: numpy.ndarray with shape (n,), optional
+        :param out: array to write the product to (default=None -> return a new array)
+        :type out: numpy.ndarray with shape (m,) or (n,) if transpose=True, optional
         :return: Jacobian-vector product J(x)*p or J(x).T*p if transpose=True
         :rtype: numpy.ndarray(m,) or numpy.ndarray(n,) if transpose=True
         """
@@ -497,13 +816,62 @@ class CUTEstProblem(object):
         else:
             self.check_input_x(p)
         if x is None:
-            r = self._module.jprod(transpose, p if transpose else self.free_to_all(p, use_zeros=True))
+            args = (transpose, p if transpose else self.free_to_all(p, use_zeros=True))
+        else:
+            self.check_input_x(x)
+            args = (transpose, p if transpose else self.free_to_all(p, use_zeros=True), self.free_to_all(x))
+        if transpose:
+            return self.evaluate_into(out, (self.n,), self._module.jprod, args, reduce=self.all_to_free)
+        else:
+            return self.evaluate_into(out, (self.m,), self._module.jprod, args)
+
+    def jprod_many(self, P, transpose=False, x=None):
+        """
+        Evaluate products of constraint Jacobian with many vectors (the columns of P)
+
+        .. code-block:: python
+
+            # evaluate J*P where J is the last computed Jacobian
+            R = problem.jprod_many(P)
+            # evaluate J.T*P where J is the last computed Jacobian
+            R = problem.jprod_many(P, transpose=True)
+            # evaluate Jacobian at x, and return J(x)*P
+            R = problem.jprod_many(P, x=x)
+            # evaluate Jacobian at x, and return J(x).T*P
+            R = problem.jprod_many(P, transpose=True, x=x)
+
+        For unconstrained problems, R is None.
+
+        The Jacobian is evaluated at most once and reused for all columns of P,
+        so this is much faster than calling :meth:`jprod` for each column.
+
+        This calls CUTEst routine CUTEST_cjprod.
+
+        :param P: vectors to be multiplied by the Jacobian of constraints, one per column
+        :type P: numpy.ndarray with shape (n,k) or (m,k) if transpose=True
+        :param transpose: if True, multiply by transpose of Jacobian (J.T*P)
+        :type transpose: bool, optional
+        :param x: input vector for Jacobian (default=None -> use last computed Jacobian)
+        :type x: numpy.ndarray with shape (n,), optional
+        :return: Jacobian-vector products J(x)*P or J(x).T*P if transpose=True
+        :rtype: numpy.ndarray(m,k) or numpy.ndarray(n,k) if transpose=True
+        """
+        if self.m <= 0:
+            return None
+        if transpose:
+            self.check_input_P(P, nrows=self.m)
+            Pfull = np.asfortranarray(P, dtype=float)
+        else:
+            self.check_input_P(P)
+            Pfull = self.free_to_all_columns(P)
+        if x is None:
+            R = self._module.jprod_many(transpose, Pfull)
         else:
             self.check_input_x(x)
-            r = self._module.jprod(transpose, p if transpose else self.free_to_all(p, use_zeros=True), self.free_to_all(x))
-        return self.all_to_free(r) if transpose else r
+            R = self._module.jprod_many(transpose, Pfull, self.free_to_all(x))
+        return self.all_to_free(R) if transpose else R
 
-    def hess(self, x, v=None):
+    def hess(self, x, v=None, out=None):
         """
         Evaluate the Hessian of the objective or Lagrangian.
         For constrained problems, the Hessian is L_{x,x}(x,v).
@@ -529,6 +897,9 @@ class CUTEstProblem(object):
         :type x: numpy.ndarray with shape (n,)
         :param v: vector of Lagrange multipliers (must be specified for constrained problems)
         :type v: numpy.ndarray with shape (m,), optional
+        :param out: array to write the Hessian to (default=None -> return a new array).
+            For the fastest evaluation, this should be a FORTRAN style (column major) array.
+        :type out: numpy.ndarray with shape (n,n), optional
         :return: Hessian of objective (unconstrained) or Lagrangian (constrained) at x
         :rtype: numpy.ndarray(n,n)
         """
@@ -536,15 +907,13 @@ class CUTEstProblem(object):
         if self.m > 0:
             assert v is not None, "CUTEstProblem.hess: v must be specified for constrained problems. For the objective Hessian, use problem.ihess(x)"
             self.check_input_v(v)
-            H = self._module.hess(self.free_to_all(x), v)
+            args = (self.free_to_all(x), v)
         else:
             assert v is None, "CUTEstProblem.hess: v must be None for unconstrained problems"
-            H = self._module.hess(self.free_to_all(x))
-        # 2d indexing with lists is a bit strange in Python
-        # https://stackoverflow.com/questions/4257394/slicing-of-a-numpy-2d-array-or-how-do-i-extract-an-mxm-submatrix-from-an-nxn-ar
-        return H[self.idx_free][:, self.idx_free]
+            args = (self.free_to_all(x),)
+        return self.evaluate_into(out, (self.n, self.n), self._module.hess, args, fortran=True, reduce=self.all_to_free_matrix)
 
-    def ihess(self, x, cons_index=None):
+    def ihess(self, x, cons_index=None, out=None):
         """
         Evaluate the Hessian of the objective or the i-th constraint.
 
@@ -563,18 +932,21 @@ class CUTEstProblem(object):
         :type x: numpy.ndarray with shape (n,)
         :param cons_index: index of constraint (default is None -> use objective). Must be in 0..self.m-1.
         :type cons_index: int, optional
+        :param out: array to write the Hessian to (default=None -> return a new array).
+            For the fastest evaluation, this should be a FORTRAN style (column major) array.
+        :type out: numpy.ndarray with shape (n,n), optional
         :return: Hessian of objective or a single constraint at x
         :rtype: numpy.ndarray(n,n)
         """
         self.check_input_x(x)
         if cons_index is None:
-            H = self._module.ihess(self.free_to_all(x))
+            args = (self.free_to_all(x),)
         else:
             assert 0 <= cons_index <= self.m - 1, "Invalid constraint index %g (must be in 0..%g)" % (cons_index, self.m - 1)
-            H = self._module.ihess(self.free_to_all(x), cons_index)
-        return H[self.idx_free][:, self.idx_free]
+            args = (self.free_to_all(x), cons_index)
+        return self.evaluate_into(out, (self.n, self.n), self._module.ihess, args, fortran=True, reduce=self.all_to_free_matrix)
 
-    def hprod(self, p, x=None, v=None):
+    def hprod(self, p, x=None, v=None, out=None):
         """
         Calculate Hessian-vector product H*p, where H is Hessian of objective (unconstrained) or Lagrangian (constrained).
         For constrained problems, the Hessian is L_{x,x}(x,v).
@@ -601,6 +973,8 @@ class CUTEstProblem(object):
         :type x: numpy.ndarray with shape (n,), optional
         :param v: vector of Lagrange multipliers (must be specified for constrained problems)
         :type v: numpy.ndarray with shape (m,), optional
+        :param out: array to write the product to (default=None -> return a new array)
+        :type out: numpy.ndarray with shape (n,), optional
         :return: Hessian-vector product H*p
         :rtype: numpy.ndarray(n,)
         """
@@ -609,17 +983,68 @@ class CUTEstProblem(object):
             if x is not None:
                 self.check_input_x(x)
                 self.check_input_v(v)
-                r = self._module.hprod(self.free_to_all(p, use_zeros=True), self.free_to_all(x), v)
+                args = (self.free_to_all(p, use_zeros=True), self.free_to_all(x), v)
             else:
-                r = self._module.hprod(self.free_to_all(p, use_zeros=True))
+                args = (self.free_to_all(p, use_zeros=True),)
         else:
             self.check_input_v(v)
             if x is not None:
                 self.check_input_x(x)
-                r = self._module.hprod(self.free_to_all(p, use_zeros=True), self.free_to_all(x))
+                args = (self.free_to_all(p, use_zeros=True), self.free_to_all(x))
             else:
-                r = self._module.hprod(self.free_to_all(p, use_zeros=True))
-        return r[self.idx_free]
+                args = (self.free_to_all(p, use_zeros=True),)
+        return self.evaluate_into(out, (self.n,), self._module.hprod, args, reduce=self.all_to_free)
+
+    def hprod_many(self, P, x=None, v=None):
+        """
+        Calculate Hessian-vector products H*P with many vectors (the columns of P),
+        where H is Hessian of objective (unconstrained) or Lagrangian (constrained).
+        For constrained problems, the Hessian is L_{x,x}(x,v).
+
+        .. code-block:: python
+
+            # use last computed Hessian to compute H*P
+            R = problem.hprod_many(P)
+            # use Hessian of Lagrangian L_{x,x}(x,v) to compute H*P (constrained only)
+            R = problem.hprod_many(P, x=x, v=v)
+            # use Hessian of objective at x to compute H*P (unconstrained only)
+            R = problem.hprod_many(P, x=x)
+
+        For unconstrained problems, v must be None.
+        For constrained problems, v must be specified.
+
+        The Hessian is evaluated at most once and reused for all columns of P,
+        so this is much faster than calling :meth:`hprod` for each column.
+
+        This calls CUTEst routine CUTEST_chprod or CUTEST_uhprod
+
+        Note: in CUTEst, the sign convention is such that the Lagrangian = objective + lagrange_multipliers * constraints
+
+        :param P: vectors to be multiplied by the Hessian, one per column
+        :type P: numpy.ndarray with shape (n,k)
+        :param x: input vector for the Hessian
+        :type x: numpy.ndarray with shape (n,), optional
+        :param v: vector of Lagrange multipliers (must be specified for constrained problems)
+        :type v: numpy.ndarray with shape (m,), optional
+        :return: Hessian-vector products H*P
+        :rtype: numpy.ndarray(n,k)
+        """
+        self.check_input_P(P)
+        if self.m > 0:
+            if x is not None:
+                self.check_input_x(x)
+                self.check_input_v(v)
+                R = self._module.hprod_many(self.free_to_all_columns(P), self.free_to_all(x), v)
+            else:
+                R = self._module.hprod_many(self.free_to_all_columns(P))
+        else:
+            self.check_input_v(v)
+            if x is not None:
+                self.check_input_x(x)
+                R = self._module.hprod_many(self.free_to_all_columns(P), self.free_to_all(x))
+            else:
+                R = self._module.hprod_many(self.free_to_all_columns(P))
+        return self.all_to_free(R)
 
     def gradhess(self, x, v=None, gradient_of_lagrangian=True):
         """
@@ -657,10 +1082,10 @@ class CUTEstProblem(object):
         self.check_input_v(v)
         if self.m > 0:
             g, J, H = self._module.gradhess(self.free_to_all(x), v, gradient_of_lagrangian)
-            return self.all_to_free(g), J[:, self.idx_free], H[self.idx_free][:, self.idx_free]
+            return self.all_to_free(g), self.all_to_free(J, axis=1), self.all_to_free_matrix(H)
         else:
             g, H = self._module.gradhess(self.free_to_all(x))
-            return self.all_to_free(g), H[self.idx_free][:, self.idx_free]
+            return self.all_to_free(g), self.all_to_free_matrix(H)
 
     # sobj() wrapper (private)
     def __sobj(self, x, gradFlag=False):
@@ -688,7 +1113,7 @@ class CUTEstProblem(object):
             f=self._module.sobj(x)
             return f
 
-    def sobj(self, x, gradient=False):
+    def sobj(self, x, gradient=False, format='coo'):
         """
         Evaluate the objective (and optionally its sparse gradient).
 
@@ -699,7 +1124,7 @@ class CUTEstProblem(object):
             # objective and gradient
             f, g = problem.obj(x, gradient=True)
 
-        The vector g is of type scipy.sparse.coo_matrix.
+        The vector g is of type scipy.sparse.coo_matrix, unless another format is requested.
         For unconstrained problems, g is formed from a dense matrix due to CUTEst limitations.
 
         For small problems, problem.obj returns dense matrices.
@@ -710,20 +1135,23 @@ class CUTEstProblem(object):
         :type x: numpy.ndarray with shape (n,)
         :param gradient: whether to return objective and gradient, or just objective (default=False; i.e. objective only)
         :type gradient: bool, optional
+        :param format: format of g, one of 'coo', 'csr', 'csc' or 'triplets' (default='coo')
+        :type format: str, optional
         :return: objective value f, or tuple (f,g) of objective and sparse gradient at x
         :rtype: float or (float, scipy.sparse.coo_matrix(n,))
         """
         self.check_input_x(x)
+        self.check_format(format)
         if self.m <= 0: # unconstrained problem (convert dense obj)
             if gradient:
                 f, g = self.obj(x, True) # fixed/free variables already handled
-                return f, coo_matrix(g)  # inefficient but CUTEst gives us no choice
+                return f, self.convert_sparse(coo_matrix(g), format)  # inefficient but CUTEst gives us no choice
             else:
                 return self.obj(x)
         else: # constrained problem (use sobj wrapper)
             if gradient:
                 f, g = self.__sobj(self.free_to_all(x), True)
-                return f, sparse_vec_extract_indices(g, self.idx_free)
+                return f, self.convert_sparse(self.all_to_free_sparse(g), format)
             else:
                 f = self.__sobj(self.free_to_all(x))
                 return f
@@ -753,7 +1181,7 @@ class CUTEstProblem(object):
             (gi, gv)=self._module.sgrad(x, i)
         return coo_matrix((gv, (np.zeros(len(gv)), gi)), shape=(1, self.n_full))
 
-    def sgrad(self, x, index=None):
+    def sgrad(self, x, index=None, format='coo'):
         """
         Evaluate the sparse gradient of the objective function or sparse gradient of the i-th constraint.
 
@@ -764,7 +1192,7 @@ class CUTEstProblem(object):
             # gradient of i-th constraint
             g = problem.grad(x, index=i)
 
-        The vector g is of type scipy.sparse.coo_matrix.
+        The vector g is of type scipy.sparse.coo_matrix, unless another format is requested.
         For unconstrained problems, g is formed from a dense matrix due to CUTEst limitations.
 
         For small problems, problem.grad returns dense matrices.
@@ -775,16 +1203,19 @@ class CUTEstProblem(object):
         :type x: numpy.ndarray with shape (n,)
         :param index: which constraint to evaluate. Must be in 0..self.m-1.
         :type index: int, optional
+        :param format: format of g, one of 'coo', 'csr', 'csc' or 'triplets' (default='coo')
+        :type format: str, optional
         :return: sparse gradient of objective or sparse gradient of i-th constraint at x
         :rtype: scipy.sparse.coo_matrix(n,)
         """
         self.check_input_x(x)
+        self.check_format(format)
         if self.m <= 0: # unconstrained problem (convert dense grad)
             g = self.grad(x, index) # fixed/free variables already handled
-            return coo_matrix(g)   # inefficient but CUTEst gives us no choice
+            return self.convert_sparse(coo_matrix(g), format)   # inefficient but CUTEst gives us no choice
         else: # constrained problem (use sgrad wrapper)
             g = self.__sgrad(self.free_to_all(x), index)
-            return sparse_vec_extract_indices(g, self.idx_free)
+            return self.convert_sparse(self.all_to_free_sparse(g), format)
 
     # scons() wrapper
     def __scons(self, x, i=None):
@@ -814,7 +1245,7 @@ class CUTEstProblem(object):
             (c, gi, gv)=self._module.scons(x, i)
             return (c, coo_matrix((gv, (np.zeros(len(gv)), gi)), shape=(1, self.n_full)))
 
-    def scons(self, x, index=None, gradient=False):
+    def scons(self, x, index=None, gradient=False, format='coo'):
         """
         Evaluate the constraints (and optionally their sparse Jacobian or gradient).
 
@@ -829,7 +1260,7 @@ class CUTEstProblem(object):
             # i-th constraint and its sparse gradient
             ci, Ji = problem.scons(x, index=i, gradient=True)
 
-        The matrix J or vector Ji is of type scipy.sparse.coo_matrix.
+        The matrix J or vector Ji is of type scipy.sparse.coo_matrix, unless another format is requested.
 
         For unconstrained problems, this returns None.
 
@@ -843,16 +1274,19 @@ class CUTEstProblem(object):
         :type index: int, optional
         :param gradient: whether to return constraint(s) and gradient/Jacobian, or just constraint (default=False; i.e. constraint only)
         :type gradient: bool, optional
+        :param format: format of J or Ji, one of 'coo', 'csr', 'csc' or 'triplets' (default='coo')
+        :type format: str, optional
         :return: value of constraint(s), and sparse Jacobian or gradient of constraint(s) at x
         :rtype: numpy.ndarray(m,) or float or (numpy.ndarray(m,), scipy.sparse.coo_matrix(m,n)) or (float, scipy.sparse.coo_matrix(n,))
         """
         if self.m <= 0:
             return None
         self.check_input_x(x)
+        self.check_format(format)
         if index is None:
             c, J = self.__scons(self.free_to_all(x))
             if gradient:
-                return c, sparse_mat_extract_columns(J, self.idx_free)
+                return c, self.convert_sparse(self.all_to_free_sparse(J), format)
             else:
                 return c
         else:
@@ -860,7 +1294,7 @@ class CUTEstProblem(object):
             ci, Ji = self.__scons(self.free_to_all(x), index)
             ci = ci[0]  # convert from 1x1 NumPy array to float
             if gradient:
-                return ci, sparse_vec_extract_indices(Ji, self.idx_free)
+                return ci, self.convert_sparse(self.all_to_free_sparse(Ji), format)
             else:
                 return ci
 
@@ -894,7 +1328,7 @@ class CUTEstProblem(object):
             coo_matrix((Jv, (Jfi, Ji)), shape=(self.m, self.n_full))
         )
 
-    def slagjac(self, x, v=None):
+    def slagjac(self, x, v=None, format='coo'):
         """
         Evaluate sparse gradient of objective or Lagrangian, and sparse Jacobian of constraints.
 
@@ -905,7 +1339,7 @@ class CUTEstProblem(object):
             # Lagrangian gradient and Jacobian
             g, J = problem.slagjac(x, v=v)
 
-        The vector g and matrix J are of type scipy.sparse.coo_matrix.
+        The vector g and matrix J are of type scipy.sparse.coo_matrix, unless another format is requested.
 
         For unconstrained problems, J is None.
 
@@ -919,22 +1353,26 @@ class CUTEstProblem(object):
         :type x: numpy.ndarray with shape (n,)
         :param v: vector of Lagrange multipliers
         :type v: numpy.ndarray with shape (m,), optional
+        :param format: format of g and J, one of 'coo', 'csr', 'csc' or 'triplets' (default='coo')
+        :type format: str, optional
         :return: sparse gradient of objective or Lagrangian, and sparse Jacobian of constraints
         :rtype: (scipy.sparse.coo_matrix(n,), scipy.sparse.coo_matrix(m,n))
         """
         self.check_input_x(x)
+        self.check_format(format)
         if v is None:
             g, J = self.__slagjac(self.free_to_all(x))
         else:
             self.check_input_v(v)
             g, J = self.__slagjac(self.free_to_all(x), v)
         if self.m > 0:
-            return sparse_vec_extract_indices(g, self.idx_free), sparse_mat_extract_columns(J, self.idx_free)
+            return self.convert_sparse(self.all_to_free_sparse(g), format), \
+                   self.convert_sparse(self.all_to_free_sparse(J), format)
         else:
-            return sparse_vec_extract_indices(g, self.idx_free), None
+            return self.convert_sparse(self.all_to_free_sparse(g), format), None
 
     # sphess() wrapper (private)
-    def __sphess(self, x, v=None):
+    def __sphess(self, x, v=None, upper=False):
         """Returns the sparse Hessian of the objective at x (unconstrained problems)
         or the sparse Hessian of the Lagrangian (constrained problems) at (x, v).
 
@@ -942,8 +1380,9 @@ class CUTEstProblem(object):
         H=__sphess(x, v) -- Hessian of Lagrangian (constrained problems)
 
         Input
-        x -- 1D array of length n with the values of variables
-        v -- 1D array of length m with the values of Lagrange multipliers
+        x     -- 1D array of length n with the values of variables
+        v     -- 1D array of length m with the values of Lagrange multipliers
+        upper -- boolean flag. If True only the upper triangle of the Hessian is returned. Default is False
 
         Output
         H -- a scipy.sparse.coo_matrix of size n_full-by-n_full holding the sparse Hessian
@@ -953,12 +1392,12 @@ class CUTEstProblem(object):
         """
 
         if v is None:
-            (Hi, Hj, Hv)=self._module.sphess(x)
+            (Hi, Hj, Hv)=self._module.sphess(x, upper=upper)
         else:
-            (Hi, Hj, Hv)=self._module.sphess(x, v)
+            (Hi, Hj, Hv)=self._module.sphess(x, v, upper=upper)
         return coo_matrix((Hv, (Hi, Hj)), shape=(self.n_full, self.n_full))
 
-    def sphess(self, x, v=None):
+    def sphess(self, x, v=None, format='coo'):
         """
         Evaluate sparse Hessian of objective or Lagrangian.
         For constrained problems, the Hessian is L_{x,x}(x,v).
@@ -974,7 +1413,7 @@ class CUTEstProblem(object):
         For constrained problems, v must be specified.
         To evaluate the Hessian of the objective for constrained problems use isphess()
 
-        The matrix H is of type scipy.sparse.coo_matrix.
+        The matrix H is of type scipy.sparse.coo_matrix, unless another format is requested.
 
         For small problems, problem.hess returns dense matrices.
 
@@ -986,21 +1425,24 @@ class CUTEstProblem(object):
         :type x: numpy.ndarray with shape (n,)
         :param v: vector of Lagrange multipliers (must be specified for constrained problems)
         :type v: numpy.ndarray with shape (m,), optional
+        :param format: format of H, one of 'coo', 'csr', 'csc', 'triplets' or 'upper' (default='coo')
+        :type format: str, optional
         :return: sparse Hessian of objective (unconstrained) or Lagrangian (constrained) at x
         :rtype: scipy.sparse.coo_matrix(n,n)
         """
         self.check_input_x(x)
+        self.check_format(format, hessian=True)
         if self.m > 0:
             assert v is not None, "CUTEstProblem.sphess: v must be specified for constrained problems. For the objective Hessian, use problem.isphess(x)"
             self.check_input_v(v)
-            H = self.__sphess(self.free_to_all(x), v)
+            H = self.__sphess(self.free_to_all(x), v, format == 'upper')
         else:
             assert v is None, "CUTEstProblem.sphess: v must be None for unconstrained problems"
-            H = self.__sphess(self.free_to_all(x), v)
-        return sparse_mat_extract_rows_and_columns(H, self.idx_free, self.idx_free)
+            H = self.__sphess(self.free_to_all(x), v, format == 'upper')
+        return self.convert_sparse(self.all_to_free_sparse(H, rows=True), format)
 
     # isphess() wrapper (private)
-    def __isphess(self, x, i=None):
+    def __isphess(self, x, i=None, upper=False):
         """Returns the sparse Hessian of the objective or the sparse Hessian of i-th
         constraint at x.
 
@@ -1008,8 +1450,9 @@ class CUTEstProblem(object):
         H=__isphess(x, i) -- Hessian of i-th constraint
 
         Input
-        x -- 1D array of length n with the values of variables
-        i -- integer holding the index of constraint (between 0 and m-1)
+        x     -- 1D array of length n with the values of variables
+        i     -- integer holding the index of constraint (between 0 and m-1)
+        upper -- boolean flag. If True only the upper triangle of the Hessian is returned. Default is False
 
         Output
         H -- a scipy.sparse.coo_matrix of size n_full-by-n_full holding the sparse Hessian
@@ -1019,12 +1462,12 @@ class CUTEstProblem(object):
         """
 
         if i is None:
-            (Hi, Hj, Hv)=self._module.isphess(x)
+            (Hi, Hj, Hv)=self._module.isphess(x, upper=upper)
         else:
-            (Hi, Hj, Hv)=self._module.isphess(x, i)
+            (Hi, Hj, Hv)=self._module.isphess(x, i, upper=upper)
         return coo_matrix((Hv, (Hi, Hj)), shape=(self.n_full, self.n_full))
 
-    def isphess(self, x, cons_index=None):
+    def isphess(self, x, cons_index=None, format='coo'):
         """
         Evaluate the sparse Hessian of the objective or the i-th constraint.
 
@@ -1035,7 +1478,7 @@ class CUTEstProblem(object):
             # Hessian of the i-th constraint
             H = problem.isphess(x, cons_index=i)
 
-        The matrix H is of type scipy.sparse.coo_matrix.
+        The matrix H is of type scipy.sparse.coo_matrix, unless another format is requested.
 
         For small problems, problem.ihess returns dense matrices.
 
@@ -1045,20 +1488,23 @@ class CUTEstProblem(object):
         :type x: numpy.ndarray with shape (n,)
         :param cons_index: index of constraint (default is None -> use objective). Must be in 0..self.m-1.
         :type cons_index: int, optional
+        :param format: format of H, one of 'coo', 'csr', 'csc', 'triplets' or 'upper' (default='coo')
+        :type format: str, optional
         :return: sparse Hessian of objective or a single constraint at x
         :rtype: scipy.sparse.coo_matrix(n,n)
         """
         self.check_input_x(x)
+        self.check_format(format, hessian=True)
         if cons_index is None:
-            H = self.__isphess(self.free_to_all(x))
+            H = self.__isphess(self.free_to_all(x), upper=format == 'upper')
         else:
             assert 0 <= cons_index <= self.m - 1, "Invalid constraint index %g (must be in 0..%g)" % (
             cons_index, self.m - 1)
-            H = self.__isphess(self.free_to_all(x), cons_index)
-        return sparse_mat_extract_rows_and_columns(H, self.idx_free, self.idx_free)
+            H = self.__isphess(self.free_to_all(x), cons_index, format == 'upper')
+        return self.convert_sparse(self.all_to_free_sparse(H, rows=True), format)
 
     # gradsphess() wrapper (private)
-    def __gradsphess(self, x, v=None, lagrFlag=False):
+    def __gradsphess(self, x, v=None, lagrFlag=False, upper=False):
         """Returns the sparse Hessian of the Lagrangian, the sparse Jacobian of
         constraints, and the gradient of the objective or Lagrangian.
 
@@ -1071,6 +1517,8 @@ class CUTEstProblem(object):
         lagrFlag -- boolean flag. If False the gradient of the objective is returned,
                     if True the gradient of the Lagrangian is returned.
                     Default is False
+        upper    -- boolean flag. If True only the upper triangle of the Hessian is returned.
+                    Default is False
 
         Output
         g -- a scipy.sparse.coo_matrix of size 1-by-n_full holding the gradient of objective at x or
@@ -1084,17 +1532,17 @@ class CUTEstProblem(object):
         """
 
         if v is None:
-            (g, Hi, Hj, Hv)=self._module.gradsphess(x)
+            (g, Hi, Hj, Hv)=self._module.gradsphess(x, upper=upper)
             return (coo_matrix(g), coo_matrix((Hv, (Hi, Hj)), shape=(self.n_full, self.n_full)))
         else:
-            (gi, gv, Ji, Jfi, Jv, Hi, Hj, Hv)=self._module.gradsphess(x, v, lagrFlag)
+            (gi, gv, Ji, Jfi, Jv, Hi, Hj, Hv)=self._module.gradsphess(x, v, lagrFlag, upper=upper)
             return (
                 coo_matrix((gv, (np.zeros(len(gv)), gi)), shape=(1, self.n_full)),
                 coo_matrix((Jv, (Jfi, Ji)), shape=(self.m, self.n_full)),
                 coo_matrix((Hv, (Hi, Hj)), shape=(self.n_full, self.n_full))
             )
 
-    def gradsphess(self, x, v=None, gradient_of_lagrangian=True):
+    def gradsphess(self, x, v=None, gradient_of_lagrangian=True, format='coo'):
         """
         Evaluate the sparse gradient of objective or Lagrangian, sparse Jacobian of constraints, and sparse Hessian of objective or Lagrangian.
         For constrained problems, the gradient is L_{x}(x,v) and the Hessian is L_{x,x}(x,v).
@@ -1111,7 +1559,7 @@ class CUTEstProblem(object):
         For constrained problems, v must be specified, and the Hessian of the Lagrangian is always returned.
         For Hessian of the objective, use problem.ihess().
 
-        The vector g and matrices J and H are of type scipy.sparse.coo_matrix.
+        The vector g and matrices J and H are of type scipy.sparse.coo_matrix, unless another format is requested.
 
         For small problems, problem.gradhess returns dense matrices.
 
@@ -1125,19 +1573,170 @@ class CUTEstProblem(object):
         :type v: numpy.ndarray with shape (m,), optional
         :param gradient_of_lagrangian: for constrained problems, return gradient of objective or Lagrangian?
         :type gradient_of_lagrangian: bool, optional
+        :param format: format of g, J and H, one of 'coo', 'csr', 'csc', 'triplets' or 'upper' (default='coo').
+            With 'upper', g and J are returned as scipy.sparse.coo_matrix.
+        :type format: str, optional
         :return: sparse gradient of objective or Lagrangian, (sparse Jacobian of constraints), and sparse Hessian of objective or Lagrangian at x
         :rtype: (scipy.sparse.coo_matrix(n,), scipy.sparse.coo_matrix(n,n)) or (scipy.sparse.coo_matrix(n,), scipy.sparse.coo_matrix(m,n), scipy.sparse.coo_matrix(n,n)
         """
         self.check_input_x(x)
         self.check_input_v(v)
+        self.check_format(format, hessian=True)
+        if self.m > 0:
+            g, J, H = self.__gradsphess(self.free_to_all(x), v, gradient_of_lagrangian, format == 'upper')
+            return self.convert_sparse(self.all_to_free_sparse(g), format), \
+                   self.convert_sparse(self.all_to_free_sparse(J), format), \
+                   self.convert_sparse(self.all_to_free_sparse(H, rows=True), format)
+        else:
+            g, H = self.__gradsphess(self.free_to_all(x), upper=format == 'upper')
+            return self.convert_sparse(self.all_to_free_sparse(g), format), \
+                   self.convert_sparse(self.all_to_free_sparse(H, rows=True), format)
+
+    def jacobian_structure(self, one_based=False):
+        """
+        Get the sparsity pattern of the Jacobian of the constraints.
+
+        .. code-block:: python
+
+            rows, cols = problem.jacobian_structure()
+            # 1-based indices, e.g. for a Fortran solver
+            rows, cols = problem.jacobian_structure(one_based=True)
+
+        The pattern is computed once and cached, and gives the position of the values returned by scons_values.
+        A sparse solver can use it to analyse the Jacobian once, and then only update values.
+
+        For unconstrained problems, this returns None.
+
+        This calls CUTEst routine CUTEST_csjp.
+
+        :param one_based: return 1-based (FORTRAN) instead of 0-based indices (default False)
+        :type one_based: bool
+        :return: row and column indices of the nonzero elements of the Jacobian
+        :rtype: (numpy.ndarray(nnzj,), numpy.ndarray(nnzj,)) of integers
+        """
+        if self.m <= 0:
+            return None
+        if self._jacobian_structure is None:
+            (Ji, Jfi) = self._module.jacobian_structure()
+            self._jacobian_structure = self.sparse_structure(Ji, Jfi)
+        (rows, cols) = self._jacobian_structure[:2]
+        if one_based:
+            return rows + 1, cols + 1
+        return rows, cols
+
+    def scons_values(self, x, out=None):
+        """
+        Evaluate the constraints and the values of the nonzero elements of their sparse Jacobian.
+
+        .. code-block:: python
+
+            rows, cols = problem.jacobian_structure()
+            # constraints and values of the Jacobian, in the order of rows/cols
+            c, Jv = problem.scons_values(x)
+            # or write the values of the Jacobian to an existing array
+            c, Jv = problem.scons_values(x, out=Jv)
+
+        The Jacobian is J = scipy.sparse.coo_matrix((Jv, (rows, cols)), shape=(m, n)).
+
+        For unconstrained problems, this returns None.
+
+        This calls CUTEst routine CUTEST_ccfsg.
+
+        :param x: input vector
+        :type x: numpy.ndarray with shape (n,)
+        :param out: array to write the values of the Jacobian to (default=None, i.e. return a new array)
+        :type out: numpy.ndarray with shape (nnzj,), optional
+        :return: value of constraints, and values of the nonzero elements of the Jacobian at x
+        :rtype: (numpy.ndarray(m,), numpy.ndarray(nnzj,))
+        """
+        if self.m <= 0:
+            return None
+        self.check_input_x(x)
+        rows = self.jacobian_structure()[0]
+        keep = self._jacobian_structure[2]
+        if out is not None and self.check_output(out, rows.shape, reduced=True):
+            return self._module.scons_values(self.free_to_all(x), out=out)
+        c, Jv = self._module.scons_values(self.free_to_all(x))
+        if keep is not None:
+            Jv = Jv[keep]
+        if out is None:
+            return c, Jv
+        out[...] = Jv
+        return c, out
+
+    def hessian_structure(self, one_based=False):
+        """
+        Get the sparsity pattern of the upper triangle of the Hessian of the objective (unconstrained problems)
+        or the Lagrangian (constrained problems).
+
+        .. code-block:: python
+
+            rows, cols = problem.hessian_structure()
+            # 1-based indices, e.g. for a Fortran solver
+            rows, cols = problem.hessian_structure(one_based=True)
+
+        The pattern is computed once and cached, and gives the position of the values returned by sphess_values.
+        A sparse solver can use it to analyse the Hessian once, and then only update values.
+        Only the upper triangle is given (rows[k] <= cols[k]).
+
+        This calls CUTEst routine CUTEST_cshp or CUTEST_ushp.
+
+        :param one_based: return 1-based (FORTRAN) instead of 0-based indices (default False)
+        :type one_based: bool
+        :return: row and column indices of the nonzero elements of the upper triangle of the Hessian
+        :rtype: (numpy.ndarray(nnzh,), numpy.ndarray(nnzh,)) of integers
+        """
+        if self._hessian_structure is None:
+            (Hi, Hj) = self._module.hessian_structure()
+            self._hessian_structure = self.sparse_structure(Hj, Hi, hessian=True)
+        (rows, cols) = self._hessian_structure[:2]
+        if one_based:
+            return rows + 1, cols + 1
+        return rows, cols
+
+    def sphess_values(self, x, v=None, out=None):
+        """
+        Evaluate the values of the nonzero elements of the upper triangle of the sparse Hessian of objective or Lagrangian.
+
+        .. code-block:: python
+
+            rows, cols = problem.hessian_structure()
+            # values of the Hessian of objective (unconstrained problems), in the order of rows/cols
+            Hv = problem.sphess_values(x)
+            # values of the Hessian of Lagrangian (constrained problems)
+            Hv = problem.sphess_values(x, v)
+            # or write the values to an existing array
+            Hv = problem.sphess_values(x, v, out=Hv)
+
+        The upper triangle of the Hessian is H = scipy.sparse.coo_matrix((Hv, (rows, cols)), shape=(n, n)).
+
+        For unconstrained problems, v must be None.
+        For constrained problems, v must be specified.
+
+        This calls CUTEst routine CUTEST_csh or CUTEST_ush.
+
+        Note: in CUTEst, the sign convention is such that the Lagrangian = objective + lagrange_multipliers * constraints
+
+        :param x: input vector
+        :type x: numpy.ndarray with shape (n,)
+        :param v: vector of Lagrange multipliers (must be specified for constrained problems)
+        :type v: numpy.ndarray with shape (m,), optional
+        :param out: array to write the values to (default=None, i.e. return a new array)
+        :type out: numpy.ndarray with shape (nnzh,), optional
+        :return: values of the nonzero elements of the upper triangle of the Hessian at x
+        :rtype: numpy.ndarray(nnzh,)
+        """
+        self.check_input_x(x)
+        rows = self.hessian_structure()[0]
+        keep = self._hessian_structure[2]
+        reduce = None if keep is None else (lambda Hv: Hv[keep])
         if self.m > 0:
-            g, J, H = self.__gradsphess(self.free_to_all(x), v, gradient_of_lagrangian)
-            return sparse_vec_extract_indices(g, self.idx_free), \
-                   sparse_mat_extract_columns(J, self.idx_free), \
-                   sparse_mat_extract_rows_and_columns(H, self.idx_free, self.idx_free)
+            assert v is not None, "CUTEstProblem.sphess_values: v must be specified for constrained problems"
+            self.check_input_v(v)
+            return self.evaluate_into(out, rows.shape, self._module.sphess_values, (self.free_to_all(x), v), reduce=reduce)
         else:
-            g, H = self.__gradsphess(self.free_to_all(x))
-            return sparse_vec_extract_indices(g, self.idx_free), sparse_mat_extract_rows_and_columns(H, self.idx_free, self.idx_free)
+            assert v is None, "CUTEstProblem.sphess_values: v must be None for unconstrained problems"
+            return self.evaluate_into(out, rows.shape, self._module.sphess_values, (self.free_to_all(x),), reduce=reduce)
 
     def report(self):
         """
@@ -1184,6 +1783,7 @@ class CUTEstProblem(object):
         """
         Delete CUTEstProblem instance and clear CUTEst problem memory.
         """
-        del self._instances[self._instname]
+        if self._instances.get(self._instname) is self:
+            del self._instances[self._instname]
         self._module.terminate()
 
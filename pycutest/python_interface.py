@@ -23,13 +23,18 @@ dims       -- get problem dimensions
 varnames   -- get names of problem's variables
 connames   -- get names of problem's constraints
 objcons    -- objective and constraints
+objcons_batch -- objective and constraints at many points
 obj        -- objective and objective gradient
+obj_batch  -- objective and objective gradient at many points
 cons       -- constraints and constraints gradients/Jacobian
+cons_batch -- constraints at many points
 lagjac     -- gradient of objective/Lagrangian and constraints Jacobian
 jprod      -- product of constraints Jacobian with a vector
+jprod_many -- products of constraints Jacobian with many vectors
 hess       -- Hessian of objective/Lagrangian
 ihess      -- Hessian of objective/constraint
 hprod      -- product of Hessian of objective/Lagrangian with a vector
+hprod_many -- products of Hessian of objective/Lagrangian with many vectors
 gradhess   -- gradient and Hessian of objective (unconstrained problems) or
                gradient of objective/Lagrangian, Jacobian of constraints and
                Hessian of Lagrangian (constrained problems)
@@ -40,25 +45,35 @@ isphess    -- sparse Hessian of objective/constraint
 gradsphess -- gradient and sparse Hessian of objective (unconstrained probl.)
                or gradient of objective/Lagrangian, sparse Jacobian of
                constraints and sparse Hessian of Lagrangian (constrained probl.)
+jacobian_structure -- sparsity pattern of constraints Jacobian
+hessian_structure  -- sparsity pattern of Hessian of objective/Lagrangian
+scons_values  -- constraints and values of sparse Jacobian of constraints
+sphess_values -- values of sparse Hessian of objective/Lagrangian
 report     -- get usage statistics
 terminate  -- clear problem memory
+compress   -- convert a sparse matrix from coordinate to compressed format
 \"\"\"
 
 from ._pycutestitf import *
 from . import _pycutestitf
 
-def setup():
+def setup(itf=None):
     \"\"\"
     Set up the problem and get problem information.
 
-    info=setup()
+    info=setup(itf)
 
+    itf  -- binary interface module to set up, defaults to the one in this folder
+            (another copy of it holds an independent instance of the problem)
     info -- dictionary with the summary of test function's properties (see getinfo())
     \"\"\"
     import os
 
-    # Get the directory where the binary module (and OUTSDIF.d) are found.
-    (_directory, _module)=os.path.split(_pycutestitf.__file__)
+    if itf is None:
+        itf=_pycutestitf
+
+    # Get the directory where OUTSDIF.d is found (the folder of this file).
+    _directory=os.path.dirname(os.path.abspath(__file__))
 
     # Problem info structure and dimension
     info=None
@@ -70,15 +85,14 @@ def setup():
     lfirst=[lfirst]
     nvfirst=[nvfirst]
 
-    # Remember current directory and go to module directory where OUTSDIF.d is located
-    fromDir=os.getcwd()
-    os.chdir(_directory)
+    # OUTSDIF.d is located in the module directory (pass its full path, the working directory is left alone)
+    dataFile=os.path.join(_directory, 'OUTSDIF.d')
 
     # Get problem dimension
-    (n, m)=_pycutestitf.dims()
+    (n, m)=itf.dims(dataFile)
 
     # Set up the problem and get basic information
-    info=_pycutestitf.setup(efirst, lfirst, nvfirst)
+    info=itf.setup(efirst, lfirst, nvfirst, dataFile)
 
     # Store constraint and variable ordering information
     if m>0:
@@ -90,9 +104,6 @@ def setup():
     info['sifparams']=[sifParams]
     info['sifoptions']=[sifOptions]
 
-    # Go back to initial directory
-    os.chdir(fromDir)
-
     return info
 
 """
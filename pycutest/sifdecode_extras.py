@@ -4,9 +4,12 @@ Wrapper to other SIF information - classifications, available parameters
 
 import os, re
 import subprocess
-from glob import iglob
+import hashlib
+import json
 
-from .system_paths import get_sifdecoder_path, get_mastsif_path
+from .system_paths import get_sifdecoder_path, get_mastsif_path, get_cache_path
+from .build_interface import CACHE_SUBFOLDER, prepare_cache_holder
+from .install_scripts import get_temp_suffix
 
 __all__ = ['print_available_sif_params', 'problem_properties', 'find_problems']
 
@@ -79,11 +82,81 @@ def print_available_sif_params(problemName):
 # Problem classifications
 classification=None
 
+# Default SIF parameters of each problem
+defaultParams=None
+
+# Classification strings and default SIF parameters of all SIF files are kept in this file in the cache
+# (inside CACHE_SUBFOLDER), so that only new or modified SIF files are scanned by later processes
+SIF_INDEX_FILE = 'sif_index.json'
+SIF_INDEX_FORMAT = 1
+
+# SIF parameter definitions, commented out unless they give the default value
+sifParamPattern=re.compile('^(\\*?)\\s*(IE|RE)\\s+(\\S+)\\s+(\\S+)\\s+\\$-PARAMETER', re.IGNORECASE)
+classificationPattern=re.compile('\\s*\\*\\s*classification\\s*', re.IGNORECASE)
+
+
+def scan_sif_file(data):
+    # Classification string (None if missing) and dictionary of default SIF parameters of the contents of a SIF file
+    cf=None
+    params={}
+    for line in data.decode('latin-1').splitlines():
+        m=sifParamPattern.match(line)
+        if m:
+            if not m.group(1):
+                try:
+                    if m.group(2).upper()=='IE':
+                        params[m.group(3)]=int(m.group(4))
+                    else:
+                        params[m.group(3)]=float(m.group(4).replace('D', 'e').replace('d', 'e'))
+                except ValueError:
+                    pass  # value given by an expression, not a constant
+            continue
+        if cf is None:
+            m=classificationPattern.match(line)
+            if m:
+                cf=line[m.end():].strip()
+    return cf, params
+
+
+def get_sif_index_path():
+    # Location of the SIF file index in the cache
+    return os.path.join(get_cache_path(), CACHE_SUBFOLDER, SIF_INDEX_FILE)
+
+
+def read_sif_index(mastsifPath):
+    # Entries of the SIF file index for the given MASTSIF folder, or an empty dictionary if there is no valid index
+    try:
+        with open(get_sif_index_path()) as f:
+            index=json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(index, dict) or index.get('format')!=SIF_INDEX_FORMAT or index.get('mastsif')!=mastsifPath:
+        return {}
+    return index.get('problems', {})
+
+
+def write_sif_index(mastsifPath, problems):
+    # Write to a temporary file first, so other processes never read a partially written index
+    try:
+        prepare_cache_holder()
+        indexFile=get_sif_index_path()
+        tmpFile=indexFile + get_temp_suffix()
+        with open(tmpFile, 'w') as f:
+            json.dump({'format': SIF_INDEX_FORMAT, 'mastsif': mastsifPath, 'problems': problems}, f, sort_keys=True)
+        os.replace(tmpFile, indexFile)
+    except OSError:
+        pass  # e.g. read-only cache, the index is rebuilt by the next process
+
 
 def update_classifications(verbose=False):
     """
     Updates the list of problem classifications from SIF files.
-    Collects the CUTEst problem classification strings.
+    Collects the CUTEst problem classification strings and default SIF parameters.
+
+    The results are stored in an index in the cache (:data:`SIF_INDEX_FILE`), together with the
+    modification time, size and SHA-256 hash of each SIF file. Only SIF files which are not in the
+    index, or whose modification time or size changed, are read again. A file whose contents are
+    unchanged (same hash) is not scanned again.
 
     * *verbose* -- if set to ``True``, prints output as files are scanned
 
@@ -135,42 +208,52 @@ def update_classifications(verbose=False):
 
     *M* (integer or ``V``) - number of constraints, ``V`` = can be set by user
     """
-    global classification
+    global classification, defaultParams
 
-    classification={}
-    # Get a list of files in the MASTSIF folder
-    it = iglob(os.path.join(get_mastsif_path(), '*.SIF'))
-
-    p=re.compile('\\s*\\*\\s*classification\\s*', re.IGNORECASE)
-    for fileName in it:
-        # Extract problem name
-        head, problemName=os.path.split(fileName)
-        problemName=problemName[:-4]
-
-        # Open and scan
-        fh=open(fileName, 'r')
-
-        while True:
-            line=fh.readline()
-            if not line:
-                break
-            # Match
-            m=p.match(line)
-            if m:
-                # Found a match
-                cf=line[m.end():].strip()
+    mastsifPath=os.path.abspath(get_mastsif_path())
+    oldProblems=read_sif_index(mastsifPath)
+    problems={}
+    changed=False
 
-                # Report
-                if verbose:
-                    print("%8s: %s" % (problemName, cf))
+    # Go through the SIF files in the MASTSIF folder
+    for entry in os.scandir(mastsifPath):
+        if not entry.name.endswith('.SIF'):
+            continue
+        problemName=entry.name[:-4]
+        try:
+            st=entry.stat()
+            old=oldProblems.get(problemName)
+            if old is not None and old.get('mtime')==st.st_mtime_ns and old.get('size')==st.st_size:
+                problems[problemName]=old
+                continue
 
-                # Process
-                classification[problemName]=cf
+            # New or modified file, scan it unless only its modification time changed
+            with open(entry.path, 'rb') as f:
+                data=f.read()
+        except OSError:
+            continue  # removed while scanning
+        sha=hashlib.sha256(data).hexdigest()
+        if old is not None and old.get('sha256')==sha:
+            problems[problemName]=dict(old, mtime=st.st_mtime_ns, size=st.st_size)
+        else:
+            cf, params=scan_sif_file(data)
+            problems[problemName]={'mtime': st.st_mtime_ns, 'size': st.st_size, 'sha256': sha,
+                                   'classification': cf, 'sifParams': params}
+        changed=True
 
-                # Done with file
-                break
-        # Close file
-        fh.close()
+    if changed or len(problems)!=len(oldProblems):
+        write_sif_index(mastsifPath, problems)
+
+    classification={}
+    defaultParams={}
+    for problemName in sorted(problems.keys()):
+        cf=problems[problemName]['classification']
+        if cf is not None:
+            # Report
+            if verbose:
+                print("%8s: %s" % (problemName, cf))
+            classification[problemName]=cf
+        defaultParams[problemName]=problems[problemName]['sifParams']
 
 
 """
@@ -214,6 +297,7 @@ def problem_properties(problemName):
     * internal -- ``True`` if problem has internal variables
     * n -- number of variables ('variable' = can be set by the user)
     * m -- number of constraints ('variable' = can be set by the user)
+    * sifParams -- dictionary of the default values of the SIF parameters (empty if the problem has none)
 
     :param problemName: problem name
     :return: dict
@@ -249,6 +333,8 @@ def problem_properties(problemName):
         data['m'] = None
         # print("Error finding constraint properties for %s" % problemName)
 
+    data['sifParams']=dict(defaultParams.get(problemName, {}))
+
     return data
 
 
@@ -5,7 +5,7 @@ Depending on the platform, find the correct paths to the CUTEst installation
 import os, sys
 from glob import glob
 
-__all__ = ['check_platform', 'get_cutest_path', 'get_cutest_include_path', 'get_sifdecoder_path', 'get_mastsif_path', 'get_homebrew_gfortran_path', 'get_cache_path']
+__all__ = ['check_platform', 'use_integer_64', 'get_cutest_path', 'get_cutest_include_path', 'get_sifdecoder_path', 'get_mastsif_path', 'get_homebrew_gfortran_path', 'get_cache_path']
 
 
 base_dir = os.getcwd()
@@ -30,7 +30,25 @@ def check_environment_vars_exist(vars):
     return
 
 
+def use_integer_64():
+    # Build against a CUTEst library with 64-bit integers (set PYCUTEST_INT64=1)
+    return os.environ.get('PYCUTEST_INT64', '0').lower() in ['1', 'true', 'yes', 'on']
+
+
 def get_cutest_path():
+    if use_integer_64():
+        # Only the new build system provides 64-bit integer libraries (named libcutest_double_64.a)
+        cutest_paths = [os.path.join(os.environ['CUTEST'], 'lib')] if 'CUTEST' in os.environ else []
+        if sys.platform == 'darwin':  # Mac
+            cutest_paths += [os.path.join(homebrew_prefix, 'opt', 'cutest', 'lib'), os.path.join(homebrew_prefix, 'lib')]
+        else:  # Linux
+            cutest_paths += [os.path.join(os.path.abspath(os.sep), 'usr', 'local', 'lib')]
+        for cutest_path in cutest_paths:
+            cutest_path = os.path.join(cutest_path, 'libcutest_double_64.a')
+            if os.path.isfile(cutest_path):
+                return cutest_path
+        # Raise error if cutest library not found
+        raise RuntimeError('Could not find CUTEST library with 64-bit integers (libcutest_double_64.a) - has CUTEST been built with 64-bit integers?')
     if sys.platform == 'darwin':  # Mac
         # First try environment variables for old build system (library is named libcutest.a)
         if 'CUTEST' in os.environ and 'MYARCH' in os.environ:
@@ -1,6 +1,12 @@
 import math as ma
+import os
+import sys
+import contextlib
+import tempfile
 import numpy as np
+from scipy.sparse import coo_matrix
 import pycutest
+from pycutest.build_interface import build_problem, CACHE_SUBFOLDER
 import unittest
 
 # All problems used here: ALLINITU (unconstrained), ALLINITC (constrained), ARWHEAD, ARWHDNE, NGONE, BOX2
@@ -10,6 +16,34 @@ def array_compare(x, y, thresh=1e-8):
     return np.max(np.abs(x - y)) < thresh
 
 
+@contextlib.contextmanager
+def temporary_cache():
+    # Functions acting on the whole cache are tested on an empty cache, never on the user's cache.
+    # Problems imported from the user's cache are hidden meanwhile, so problems are imported from the empty cache.
+    old_cache = os.environ.get('PYCUTEST_CACHE')
+    old_modules = dict((name, module) for (name, module) in sys.modules.items() if name.split('.')[0] == CACHE_SUBFOLDER)
+    old_instances = dict(pycutest.CUTEstProblem._instances)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ['PYCUTEST_CACHE'] = tmpdir
+        sys.path.insert(0, tmpdir)
+        for name in old_modules:
+            del sys.modules[name]
+        pycutest.CUTEstProblem._instances.clear()
+        try:
+            yield tmpdir
+        finally:
+            if old_cache is None:
+                del os.environ['PYCUTEST_CACHE']
+            else:
+                os.environ['PYCUTEST_CACHE'] = old_cache
+            sys.path.remove(tmpdir)
+            for name in [name for name in sys.modules if name.split('.')[0] == CACHE_SUBFOLDER]:
+                del sys.modules[name]
+            sys.modules.update(old_modules)
+            pycutest.CUTEstProblem._instances.clear()
+            pycutest.CUTEstProblem._instances.update(old_instances)
+
+
 def allinit_obj(x):  # ALLINIT* objective
     return np.array([
 	x[2]-1 + x[0]**2 + x[1]**2 + (x[2]+x[3])**2 + ma.sin(x[2])**2 + x[0]**2*x[1]**2 + x[3]-3 +
@@ -75,6 +109,129 @@ class TestParamError(unittest.TestCase):
         self.assertRaises(RuntimeError, pycutest.import_problem, prob, sifParams=bad_params)
 
 
+class TestBuildProblems(unittest.TestCase):
+    def runTest(self):
+        probs = [('ALLINITU', None), ('ARWHEAD', {'N':100}), ('NGONE', {'HNS': 4})]
+        for (p, sifParams) in probs:
+            pycutest.clear_cache(p, sifParams=sifParams)
+        results = pycutest.build_problems(probs, workers=2)
+        self.assertEqual([(p, sifParams) for (p, sifParams, error) in results], probs, msg="Wrong build results order")
+        self.assertIsNone(results[0][2], msg="ALLINITU build failed")
+        self.assertIsNone(results[1][2], msg="ARWHEAD build failed")
+        self.assertIsNotNone(results[2][2], msg="NGONE build with bad parameters succeeded")
+        all_probs = pycutest.all_cached_problems()
+        self.assertTrue(('ALLINITU', None) in all_probs, msg="ALLINITU not cached")
+        self.assertTrue(('ARWHEAD', {'N':100}) in all_probs, msg="ARWHEAD not cached")
+
+
+class TestConcurrentBuild(unittest.TestCase):
+    def runTest(self):
+        pycutest.clear_cache('ARWHEAD', sifParams={'N':300})
+        results = pycutest.build_problems([('ARWHEAD', {'N':300})] * 4, workers=4)
+        self.assertTrue(all([error is None for (p, sifParams, error) in results]), msg="Concurrent builds failed")
+        self.assertEqual(pycutest.all_cached_problems().count(('ARWHEAD', {'N':300})), 1, msg="ARWHEAD not cached once")
+        p = pycutest.import_problem('ARWHEAD', sifParams={'N':300})
+        self.assertEqual(p.n, 300, msg="Wrong n")
+
+
+class TestCompactCache(unittest.TestCase):
+    def runTest(self):
+        pycutest.clear_cache('ARWHEAD', sifParams={'N':100})
+        p = pycutest.import_problem('ARWHEAD', sifParams={'N':100}, compact=True, archive_sources=True)
+        self.assertEqual(p.n, 100, msg="Wrong n")
+        self.assertTrue(np.isfinite(p.obj(p.x0)), msg="Compacted problem cannot be evaluated")
+        with temporary_cache():
+            results = pycutest.build_problems([('ARWHEAD', {'N':100})])
+            self.assertIsNone(results[0][2], msg="ARWHEAD build failed")
+            self.assertGreater(pycutest.compact_cache(), 0, msg="Nothing freed by compacting")
+            self.assertEqual(pycutest.compact_cache(), 0, msg="Compacting twice freed space")
+            self.assertEqual(pycutest.all_cached_problems(), [('ARWHEAD', {'N':100})], msg="Compacted problem not cached")
+
+
+class TestExportImportCache(unittest.TestCase):
+    def runTest(self):
+        probs = [('ALLINITU', None), ('ARWHEAD', {'N':100})]
+        results = pycutest.build_problems(probs)
+        self.assertTrue(all([error is None for (p, sifParams, error) in results]), msg="Build failed")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            bundle = os.path.join(tmpdir, 'problems.tar.gz')
+            self.assertEqual(pycutest.export_cache(probs, bundle), probs, msg="Wrong problems exported")
+            pycutest.clear_cache('ARWHEAD', sifParams={'N':100})
+            self.assertEqual(pycutest.import_cache(bundle), probs, msg="Wrong problems imported")
+        all_probs = pycutest.all_cached_problems()
+        for (p, sifParams) in probs:
+            self.assertTrue((p, sifParams) in all_probs, msg="%s not cached after import" % p)
+        p = pycutest.import_problem('ARWHEAD', sifParams={'N':100})
+        self.assertEqual(p.n, 100, msg="Wrong n")
+        self.assertTrue(np.isfinite(p.obj(p.x0)), msg="Imported problem cannot be evaluated")
+
+
+class TestPruneCache(unittest.TestCase):
+    def runTest(self):
+        with temporary_cache():
+            p = pycutest.import_problem('ALLINITU')  # imported problems are never pruned
+            results = pycutest.build_problems(['ALLINITU', ('ARWHEAD', {'N':200})])
+            self.assertTrue(all([error is None for (name, sifParams, error) in results]), msg="Build failed")
+            stats = pycutest.cache_stats()
+            entries = [(e['problemName'], e['sifParams']) for e in stats['entries']]
+            self.assertTrue(('ARWHEAD', {'N':200}) in entries, msg="ARWHEAD not in cache stats")
+            self.assertEqual(stats['num_problems'], 2, msg="Wrong number of problems")
+            self.assertTrue(min([e['bytes'] for e in stats['entries']]) > 0, msg="Empty cache entry")
+            removed = pycutest.prune_cache(max_bytes=0)
+            self.assertTrue(('ARWHEAD', {'N':200}) in removed, msg="ARWHEAD not pruned")
+            self.assertFalse(('ALLINITU', None) in removed, msg="Imported problem ALLINITU pruned")
+            all_probs = pycutest.all_cached_problems()
+            self.assertFalse(('ARWHEAD', {'N':200}) in all_probs, msg="Found ARWHEAD in cached problems")
+            self.assertTrue(('ALLINITU', None) in all_probs, msg="ALLINITU not cached")
+
+
+class TestBuildOptions(unittest.TestCase):
+    def runTest(self):
+        # Problems built with different ordering flags are cached and imported separately
+        p1 = pycutest.import_problem('ALLINITC')
+        p2 = pycutest.import_problem('ALLINITC', efirst=True)
+        self.assertIsNot(p1, p2, msg="Same instance for different efirst")
+        self.assertFalse(p1.eq_cons_first, msg="Wrong eq_cons_first")
+        self.assertTrue(p2.eq_cons_first, msg="Wrong eq_cons_first")
+        # ... so switching between them does not rebuild either
+        self.assertFalse(build_problem('ALLINITC'), msg="ALLINITC rebuilt")
+        self.assertFalse(build_problem('ALLINITC', efirst=True), msg="ALLINITC (efirst) rebuilt")
+        self.assertIs(pycutest.import_problem('ALLINITC', efirst=True), p2, msg="New instance for same efirst")
+
+
+class TestFixedVariablePadding(unittest.TestCase):
+    def runTest(self):
+        # Without fixed variables, contiguous float64 vectors are passed through unchanged
+        p = pycutest.import_problem('ALLINITU')
+        x = np.arange(4)+1.0
+        self.assertIs(p.free_to_all(x), x, msg="x not passed through")
+        self.assertIs(p.all_to_free(x), x, msg="x not passed through")
+        self.assertTrue(array_compare(p.free_to_all(np.arange(4)), np.arange(4)), msg="Integer x not converted")
+        # ... but the problem attributes are copies, so editing them does not affect other instances
+        x0 = p.x0.copy()
+        p.x0 += 10.0
+        p.bl[0] = 0.0
+        p2 = pycutest.import_problem('ALLINITU', new_instance=True)
+        self.assertTrue(array_compare(p2.x0, x0), msg="x0 shared between instances")
+        self.assertTrue(np.all(p2.bl < 0.0), msg="bl shared between instances")
+        p.x0 -= 10.0
+        # ALLINITC has fixed x[3] == 2
+        p = pycutest.import_problem('ALLINITC')
+        xfull = p.free_to_all(np.ones((3,)))
+        self.assertTrue(array_compare(xfull, np.array([1.0, 1.0, 1.0, 2.0])), msg="Wrong padding with fixed values")
+        self.assertTrue(array_compare(p.free_to_all(np.arange(3)), np.array([0.0, 1.0, 2.0, 2.0])), msg="Wrong padding with fixed values")
+        self.assertTrue(array_compare(p.free_to_all(np.ones((3,)), use_zeros=True), np.array([1.0, 1.0, 1.0, 0.0])), msg="Wrong padding with zeros")
+        self.assertTrue(array_compare(p.all_to_free(np.arange(4)), np.arange(3)), msg="Wrong removal of fixed variables")
+        self.assertTrue(array_compare(p.all_to_free(np.ones((2, 4)), axis=1), np.ones((2, 3))), msg="Wrong removal of fixed variables")
+        A = np.arange(16.0).reshape((4, 4))
+        H = p.all_to_free_sparse(coo_matrix(A), rows=True)
+        self.assertEqual(H.shape, (3, 3), msg="Wrong shape of sparse matrix")
+        self.assertTrue(array_compare(H.toarray(), A[:3, :3]), msg="Wrong removal of fixed variables from sparse matrix")
+        J = p.all_to_free_sparse(coo_matrix(A[:2, :]))
+        self.assertEqual(J.shape, (2, 3), msg="Wrong shape of sparse matrix")
+        self.assertTrue(array_compare(J.toarray(), A[:2, :3]), msg="Wrong removal of fixed variables from sparse matrix")
+
+
 class TestALLINITU(unittest.TestCase):
     def runTest(self):
         pycutest.clear_cache('ALLINITU')
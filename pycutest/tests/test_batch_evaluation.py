@@ -0,0 +1,100 @@
+import numpy as np
+import pycutest
+import unittest
+
+# All problems used here: ALLINITU (unconstrained), ALLINITC (constrained, with fixed variables)
+
+def array_compare(x, y, thresh=1e-8):
+    return np.max(np.abs(x - y)) < thresh
+
+class testObjBatch(unittest.TestCase):
+    def runTest(self):
+        for (problemName, drop_fixed) in [('ALLINITU', True), ('ALLINITC', True), ('ALLINITC', False)]:
+            p = pycutest.import_problem(problemName, drop_fixed_variables=drop_fixed)
+            X = np.vstack([p.x0, np.ones((p.n,)), -np.ones((p.n,)), np.arange(p.n)+1.0])
+
+            f = p.obj_batch(X)
+            self.assertEqual(f.shape, (X.shape[0],), msg="Wrong obj_batch f shape")
+            f, G = p.obj_batch(X, gradient=True)
+            self.assertEqual(G.shape, X.shape, msg="Wrong obj_batch G shape")
+            for i in range(X.shape[0]):
+                fi, gi = p.obj(X[i, :], gradient=True)
+                self.assertAlmostEqual(f[i], fi, places=12, msg="Wrong obj_batch f value (%s)" % problemName)
+                self.assertTrue(array_compare(G[i, :], gi, thresh=1e-12), msg="Wrong obj_batch G value (%s)" % problemName)
+
+            # Views which are not C contiguous are accepted as well
+            f = p.obj_batch(np.asfortranarray(X))
+            self.assertAlmostEqual(f[-1], p.obj(X[-1, :]), places=12, msg="Wrong obj_batch f value for Fortran ordered X")
+
+            self.assertRaises(RuntimeError, p.obj_batch, X[:, :-1])
+            self.assertRaises(RuntimeError, p.obj_batch, X[0, :])
+
+class testConsBatch(unittest.TestCase):
+    def runTest(self):
+        for (problemName, drop_fixed) in [('ALLINITU', True), ('ALLINITC', True), ('ALLINITC', False)]:
+            p = pycutest.import_problem(problemName, drop_fixed_variables=drop_fixed)
+            X = np.vstack([p.x0, np.ones((p.n,)), -np.ones((p.n,)), np.arange(p.n)+1.0])
+
+            f, C = p.objcons_batch(X)
+            self.assertEqual(f.shape, (X.shape[0],), msg="Wrong objcons_batch f shape")
+            if p.m == 0:
+                self.assertIsNone(C, msg="objcons_batch C should be None")
+                self.assertIsNone(p.cons_batch(X), msg="cons_batch should be None")
+                continue
+            self.assertEqual(C.shape, (X.shape[0], p.m), msg="Wrong objcons_batch C shape")
+            C2 = p.cons_batch(X)
+            self.assertEqual(C2.shape, (X.shape[0], p.m), msg="Wrong cons_batch C shape")
+            for i in range(X.shape[0]):
+                fi, ci = p.objcons(X[i, :])
+                self.assertAlmostEqual(f[i], fi, places=12, msg="Wrong objcons_batch f value (%s)" % problemName)
+                self.assertTrue(array_compare(C[i, :], ci, thresh=1e-12), msg="Wrong objcons_batch C value (%s)" % problemName)
+                self.assertTrue(array_compare(C2[i, :], p.cons(X[i, :]), thresh=1e-12), msg="Wrong cons_batch C value (%s)" % problemName)
+
+            self.assertRaises(RuntimeError, p.cons_batch, X[:, :-1])
+
+class testHprodMany(unittest.TestCase):
+    def runTest(self):
+        for (problemName, drop_fixed) in [('ALLINITU', True), ('ALLINITC', True), ('ALLINITC', False)]:
+            p = pycutest.import_problem(problemName, drop_fixed_variables=drop_fixed)
+            P = np.vstack([np.ones((p.n,)), -0.5*np.arange(p.n), np.arange(p.n)+1.0]).T
+            x = np.arange(p.n)+1.0
+            v = np.ones((p.m,)) if p.m > 0 else None
+
+            R = p.hprod_many(P, x=x, v=v)
+            self.assertEqual(R.shape, P.shape, msg="Wrong hprod_many R shape")
+            for j in range(P.shape[1]):
+                self.assertTrue(array_compare(R[:, j], p.hprod(P[:, j], x=x, v=v)), msg="Wrong hprod_many R value (%s)" % problemName)
+
+            # Reuse the last computed Hessian
+            R = p.hprod_many(P)
+            for j in range(P.shape[1]):
+                self.assertTrue(array_compare(R[:, j], p.hprod(P[:, j])), msg="Wrong hprod_many R value with last Hessian (%s)" % problemName)
+
+            self.assertRaises(RuntimeError, p.hprod_many, P[:-1, :], x=x, v=v)
+
+class testJprodMany(unittest.TestCase):
+    def runTest(self):
+        for drop_fixed in [True, False]:
+            p = pycutest.import_problem('ALLINITC', drop_fixed_variables=drop_fixed)
+            P = np.vstack([np.ones((p.n,)), -0.5*np.arange(p.n), np.arange(p.n)+1.0]).T
+            Q = np.vstack([np.ones((p.m,)), -2.0*np.ones((p.m,))]).T
+            x = np.arange(p.n)+1.0
+
+            R = p.jprod_many(P, x=x)
+            self.assertEqual(R.shape, (p.m, P.shape[1]), msg="Wrong jprod_many R shape")
+            for j in range(P.shape[1]):
+                self.assertTrue(array_compare(R[:, j], p.jprod(P[:, j], x=x)), msg="Wrong jprod_many R value")
+            R = p.jprod_many(Q, transpose=True, x=x)
+            self.assertEqual(R.shape, (p.n, Q.shape[1]), msg="Wrong jprod_many R shape (transpose)")
+            for j in range(Q.shape[1]):
+                self.assertTrue(array_compare(R[:, j], p.jprod(Q[:, j], transpose=True, x=x)), msg="Wrong jprod_many R value (transpose)")
+
+            # Reuse the last computed Jacobian
+            R = p.jprod_many(P)
+            for j in range(P.shape[1]):
+                self.assertTrue(array_compare(R[:, j], p.jprod(P[:, j])), msg="Wrong jprod_many R value with last Jacobian")
+
+            self.assertRaises(RuntimeError, p.jprod_many, P, transpose=True, x=x)
+
+        p = pycutest.import_problem('ALLINITU')
+        self.assertIsNone(p.jprod_many(np.ones((p.n, 2))), msg="jprod_many should be None")
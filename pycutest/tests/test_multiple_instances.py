@@ -36,3 +36,45 @@ class testCUTEstProblemInstances(unittest.TestCase):
         self.assertTrue(array_compare(p2.x0, np.ones((10,))), msg="Wrong x0")
         p2 = pycutest.import_problem('ARGLALE', sifParams={'N':10})
         self.assertTrue(array_compare(p2.x0, np.ones((10,))), msg="Wrong x0")
+
+
+class testCUTEstNewInstances(unittest.TestCase):
+    def runTest(self):
+        # independent instances of the same problem have their own state and counters
+        p = pycutest.import_problem('ROSENBR')
+        p1 = pycutest.import_problem('ROSENBR', new_instance=True)
+        p2 = pycutest.import_problem('ROSENBR', new_instance=True)
+        self.assertFalse(p1 is p2, msg="New instances are the same")
+        self.assertFalse(p1 is p, msg="New instance is the shared instance")
+        self.assertTrue(pycutest.import_problem('ROSENBR') is p, msg="Shared instance changed")
+        f0 = p.report()['f']
+        for i in range(3):
+            p1.obj(p1.x0)
+        p2.obj(p2.x0)
+        self.assertEqual(p1.report()['f'], 3, msg="Wrong number of evaluations for first instance")
+        self.assertEqual(p2.report()['f'], 1, msg="Wrong number of evaluations for second instance")
+        self.assertEqual(p.report()['f'], f0, msg="Shared instance counted other evaluations")
+        self.assertTrue(array_compare(p1.obj(p1.x0), p2.obj(p2.x0)), msg="Instances disagree")
+        itf = p1._module._pycutestitf
+        del p1
+        self.assertEqual(p2.report()['f'], 2, msg="Deleting an instance changed another")
+        # the copy of the deleted instance is reused, with fresh state
+        p3 = pycutest.import_problem('ROSENBR', new_instance=True)
+        self.assertTrue(p3._module._pycutestitf is itf, msg="Private module not reused")
+        self.assertEqual(p3.report()['f'], 0, msg="Reused instance kept its evaluations")
+        self.assertTrue(array_compare(p3.obj(p3.x0), p2.obj(p2.x0)), msg="Reused instance disagrees")
+
+
+class testCUTEstThreadedEvaluation(unittest.TestCase):
+    def runTest(self):
+        # evaluate independent instances (and the shared one) from several threads at once
+        from concurrent.futures import ThreadPoolExecutor
+        problems = [pycutest.import_problem('ARGLALE', sifParams={'N':10}, new_instance=True) for i in range(4)]
+        problems.append(pycutest.import_problem('ARGLALE', sifParams={'N':10}))
+        xs = [problems[0].x0 + 0.1 * i for i in range(20)]
+        expected = [problems[0].obj(x) for x in xs]
+        with ThreadPoolExecutor(max_workers=len(problems)) as executor:
+            results = list(executor.map(lambda p: [p.obj(x) for x in xs], problems))
+        for result in results:
+            self.assertTrue(array_compare(np.array(result), np.array(expected)), msg="Wrong values from threads")
+        self.assertEqual(problems[1].report()['f'], len(xs), msg="Wrong number of evaluations")
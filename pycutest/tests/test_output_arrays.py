@@ -0,0 +1,50 @@
+import numpy as np
+import pycutest
+import unittest
+
+# All problems used here: ALLINITU (unconstrained), ALLINITC (constrained, with fixed variables)
+
+def array_compare(x, y, thresh=1e-8):
+    return np.max(np.abs(x - y)) < thresh
+
+class testOutputArrays(unittest.TestCase):
+    def runTest(self):
+        for (problemName, drop_fixed) in [('ALLINITU', True), ('ALLINITC', True), ('ALLINITC', False)]:
+            p = pycutest.import_problem(problemName, drop_fixed_variables=drop_fixed)
+            x = np.arange(p.n)+1.0
+            v = np.ones((p.m,)) if p.m > 0 else None
+            for order in ['C', 'F']:  # results are copied into C ordered matrices
+                g = np.empty((p.n,))
+                f, g2 = p.obj(x, gradient=True, out=g)
+                self.assertIs(g2, g, msg="obj did not return out")
+                self.assertTrue(array_compare(g, p.obj(x, gradient=True)[1]), msg="Wrong obj g value (%s)" % problemName)
+                self.assertRaises(RuntimeError, p.obj, x, out=g)
+                self.assertIs(p.grad(x, out=g), g, msg="grad did not return out")
+                self.assertTrue(array_compare(g, p.grad(x)), msg="Wrong grad value (%s)" % problemName)
+                H = np.empty((p.n, p.n), order=order)
+                self.assertIs(p.hess(x, v=v, out=H), H, msg="hess did not return out")
+                self.assertTrue(array_compare(H, p.hess(x, v=v)), msg="Wrong hess value (%s)" % problemName)
+                self.assertIs(p.ihess(x, out=H), H, msg="ihess did not return out")
+                self.assertTrue(array_compare(H, p.ihess(x)), msg="Wrong ihess value (%s)" % problemName)
+                r = np.empty((p.n,))
+                self.assertIs(p.hprod(x, x=x, v=v, out=r), r, msg="hprod did not return out")
+                self.assertTrue(array_compare(r, p.hprod(x, x=x, v=v)), msg="Wrong hprod value (%s)" % problemName)
+                if p.m > 0:
+                    c = np.empty((p.m,))
+                    J = np.empty((p.m, p.n), order=order)
+                    c2, J2 = p.cons(x, gradient=True, out=(c, J))
+                    self.assertIs(c2, c, msg="cons did not return out")
+                    self.assertIs(J2, J, msg="cons did not return out")
+                    c3, J3 = p.cons(x, gradient=True)
+                    self.assertTrue(array_compare(c, c3), msg="Wrong cons c value (%s)" % problemName)
+                    self.assertTrue(array_compare(J, J3), msg="Wrong cons J value (%s)" % problemName)
+                    self.assertIs(p.cons(x, out=c), c, msg="cons did not return out")
+                    self.assertTrue(array_compare(c, c3), msg="Wrong cons c value (%s)" % problemName)
+                    r = np.empty((p.m,))
+                    self.assertIs(p.jprod(x, x=x, out=r), r, msg="jprod did not return out")
+                    self.assertTrue(array_compare(r, J3.dot(x)), msg="Wrong jprod value (%s)" % problemName)
+                    r = np.empty((p.n,))
+                    self.assertIs(p.jprod(v, transpose=True, x=x, out=r), r, msg="jprod did not return out")
+                    self.assertTrue(array_compare(r, J3.T.dot(v)), msg="Wrong jprod value (%s)" % problemName)
+
+            self.assertRaises(RuntimeError, p.grad, x, out=np.empty((p.n+1,)))
@@ -1,8 +1,9 @@
 import os
 import pycutest
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
-# All problems used here: SCURLY20
+# All problems used here: SCURLY20, ARWHEAD
 
 class testCUTEstRestoreCWD(unittest.TestCase):
     def runTest(self):
@@ -17,3 +18,17 @@ class testCUTEstRestoreCWD(unittest.TestCase):
             print("Problem failed as expected, testing restoration of cwd...")
         print(os.getcwd())
         print()
+
+
+class testCUTEstThreadedImport(unittest.TestCase):
+    def runTest(self):
+        # build and import different problems from several threads at once, the cwd must never change
+        probs = [('ARWHEAD', {'N': 50}), ('ARWHEAD', {'N': 60}), ('ARWHEAD', {'N': 70}), ('ARWHEAD', {'N': 50})]
+        for (p, sifParams) in probs:
+            pycutest.clear_cache(p, sifParams=sifParams)
+        cwd = os.getcwd()
+        with ThreadPoolExecutor(max_workers=len(probs)) as executor:
+            problems = list(executor.map(lambda prob: pycutest.import_problem(prob[0], sifParams=prob[1]), probs))
+        self.assertEqual(os.getcwd(), cwd, msg="cwd changed")
+        self.assertEqual([p.n for p in problems], [50, 60, 70, 50], msg="Wrong problem dimensions")
+        self.assertTrue(problems[0] is problems[3], msg="Same problem imported twice")
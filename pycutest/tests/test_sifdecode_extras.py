@@ -1,6 +1,7 @@
 import pycutest
 import unittest
-import io, sys  # to catch stdout
+import io, os, sys  # to catch stdout
+from pycutest import sifdecode_extras
 
 # All problems used here: ARGLALE, ROSENBR, BRATU2D
 
@@ -189,3 +190,16 @@ class TestFindProblems(unittest.TestCase):
         varcons = pycutest.find_problems(userM=True)
         for p in ['ARGLALE', 'BRATU2D']:
             self.assertTrue(p in varcons, msg="Variable-constraint problems doesn't contain %s" % p)
+
+
+class TestClassificationIndex(unittest.TestCase):
+    def runTest(self):
+        # Default SIF parameters (uncommented $-PARAMETER lines, see above)
+        self.assertEqual(pycutest.problem_properties('ARGLALE')['sifParams'], {'N':200, 'M':400}, msg="Wrong default parameters for ARGLALE")
+        self.assertEqual(pycutest.problem_properties('BRATU2D')['sifParams'], {'P':72, 'LAMBDA':4.0}, msg="Wrong default parameters for BRATU2D")
+        self.assertEqual(pycutest.problem_properties('ROSENBR')['sifParams'], {}, msg="Wrong default parameters for ROSENBR")
+        # The index is stored in the cache and gives the same results when read back
+        self.assertTrue(os.path.isfile(sifdecode_extras.get_sif_index_path()), msg="SIF index not written")
+        classification = dict(sifdecode_extras.classification)
+        sifdecode_extras.update_classifications()
+        self.assertEqual(sifdecode_extras.classification, classification, msg="Classifications changed when read from index")
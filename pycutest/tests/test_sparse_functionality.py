@@ -246,3 +246,78 @@ class TestSparseConstrainedFixed(unittest.TestCase):
                 self.assertTrue(array_compare(gdense, g.toarray(), thresh=10 ** (-places)), msg="gradsphess g wrong 2")
                 self.assertTrue(array_compare(Jdense, J.toarray(), thresh=10 ** (-places)), msg="gradsphess J wrong 2")
                 self.assertTrue(array_compare(Hdense, H.toarray(), thresh=10 ** (-places)), msg="gradsphess H wrong 2")
+
+
+class TestSparseFormats(unittest.TestCase):
+    def runTest(self):
+        for (problemName, sifParams) in [('ARWHEAD', {'N':100}), ('ARWHDNE', {'N':100}), ('BOX2', None), ('ZIGZAG', {'T':10})]:
+            p = pycutest.import_problem(problemName, sifParams=sifParams)
+            x = np.sin(np.arange(p.n)) - np.cos(np.arange(p.n))
+            v = np.arange(p.m) + 1.0 if p.m > 0 else None
+            Hdense = p.hess(x, v=v)
+            gdense = p.grad(x)
+            for fmt in ['csr', 'csc']:
+                H = p.sphess(x, v=v, format=fmt)
+                self.assertEqual(H.format, fmt, msg="sphess H has wrong format (%s)" % problemName)
+                self.assertTrue(array_compare(Hdense, H.toarray()), msg="sphess H wrong, format %s (%s)" % (fmt, problemName))
+                g = p.sgrad(x, format=fmt)
+                self.assertEqual(g.format, fmt, msg="sgrad g has wrong format (%s)" % problemName)
+                self.assertTrue(array_compare(gdense, g.toarray()), msg="sgrad g wrong, format %s (%s)" % (fmt, problemName))
+                if p.m > 0:
+                    c, J = p.scons(x, gradient=True, format=fmt)
+                    self.assertEqual(J.format, fmt, msg="scons J has wrong format (%s)" % problemName)
+                    self.assertTrue(array_compare(p.cons(x, gradient=True)[1], J.toarray()), msg="scons J wrong, format %s (%s)" % (fmt, problemName))
+            # triplets
+            rows, cols, vals = p.sphess(x, v=v, format='triplets')
+            H = np.zeros((p.n, p.n))
+            np.add.at(H, (rows, cols), vals)
+            self.assertTrue(array_compare(Hdense, H), msg="sphess H wrong, format triplets (%s)" % problemName)
+            # upper triangle
+            H = p.sphess(x, v=v, format='upper')
+            self.assertTrue(np.all(H.row <= H.col), msg="sphess H not upper triangular (%s)" % problemName)
+            self.assertTrue(array_compare(np.triu(Hdense), H.toarray()), msg="sphess H wrong, format upper (%s)" % problemName)
+            H = p.isphess(x, format='upper')
+            self.assertTrue(array_compare(np.triu(p.ihess(x)), H.toarray()), msg="isphess H wrong, format upper (%s)" % problemName)
+            H = p.gradsphess(x, v=v, format='upper')[-1]
+            self.assertTrue(array_compare(np.triu(Hdense), H.toarray()), msg="gradsphess H wrong, format upper (%s)" % problemName)
+            # 'upper' is only available for Hessians
+            self.assertRaises(RuntimeError, p.sgrad, x, format='upper')
+            self.assertRaises(RuntimeError, p.sphess, x, v=v, format='dense')
+
+
+class TestSparseStructure(unittest.TestCase):
+    def runTest(self):
+        for (problemName, sifParams) in [('ARWHEAD', {'N':100}), ('ARWHDNE', {'N':100}), ('BOX2', None), ('ZIGZAG', {'T':10})]:
+            p = pycutest.import_problem(problemName, sifParams=sifParams)
+            v = np.arange(p.m) + 1.0 if p.m > 0 else None
+            rows, cols = p.hessian_structure()
+            self.assertTrue(np.all(rows <= cols), msg="hessian_structure not upper triangular (%s)" % problemName)
+            self.assertIs(p.hessian_structure()[0], rows, msg="hessian_structure not cached (%s)" % problemName)
+            rows1, cols1 = p.hessian_structure(one_based=True)
+            self.assertTrue(np.all(rows1 == rows + 1) and np.all(cols1 == cols + 1), msg="hessian_structure one_based wrong (%s)" % problemName)
+            out = np.zeros(rows.shape)
+            for x in [p.x0, np.sin(np.arange(p.n)) - np.cos(np.arange(p.n))]:
+                Hv = p.sphess_values(x, v=v)
+                H = np.zeros((p.n, p.n))
+                np.add.at(H, (rows, cols), Hv)
+                self.assertTrue(array_compare(np.triu(p.hess(x, v=v)), H), msg="sphess_values wrong (%s)" % problemName)
+                self.assertIs(p.sphess_values(x, v=v, out=out), out, msg="sphess_values out not returned (%s)" % problemName)
+                self.assertTrue(array_compare(Hv, out), msg="sphess_values out wrong (%s)" % problemName)
+            if p.m == 0:
+                self.assertIsNone(p.jacobian_structure(), msg="jacobian_structure is not None (%s)" % problemName)
+                self.assertIsNone(p.scons_values(p.x0), msg="scons_values is not None (%s)" % problemName)
+                continue
+            rows, cols = p.jacobian_structure()
+            rows1, cols1 = p.jacobian_structure(one_based=True)
+            self.assertTrue(np.all(rows1 == rows + 1) and np.all(cols1 == cols + 1), msg="jacobian_structure one_based wrong (%s)" % problemName)
+            out = np.zeros(rows.shape)
+            for x in [p.x0, np.sin(np.arange(p.n)) - np.cos(np.arange(p.n))]:
+                c, Jv = p.scons_values(x)
+                cdense, Jdense = p.cons(x, gradient=True)
+                J = np.zeros((p.m, p.n))
+                np.add.at(J, (rows, cols), Jv)
+                self.assertTrue(array_compare(cdense, c), msg="scons_values c wrong (%s)" % problemName)
+                self.assertTrue(array_compare(Jdense, J), msg="scons_values J wrong (%s)" % problemName)
+                c, Jv2 = p.scons_values(x, out=out)
+                self.assertIs(Jv2, out, msg="scons_values out not returned (%s)" % problemName)
+                self.assertTrue(array_compare(Jv, out), msg="scons_values out wrong (%s)" % problemName)